@@ -1,4 +1,5 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, Response, stream_with_context
+import numpy as np
 import pandas as pd
 import joblib, os, requests
 from datetime import datetime, timedelta
@@ -8,10 +9,31 @@ import sys
 import config
 from firebase_init import init_firebase
 from firebase_admin import firestore
+import metrics
+import compression
+from circuit_breaker import firestore_breaker, is_outage
+from instrumented_firestore import connection_state, heaviest_queries, instrument, route_profile
+from render_cache import bump_data_version, cached_page, set_page_source
+from season_export import EXPORT_COLUMNS, ExportFilters, export_csv_file, export_firestore
+from season_import import SeasonImportError, SeasonWriteError, import_seasons
+from user_store import get_user_store
+from weather_index import get_weather_index
+from province_locator import get_province_locator
+from climate_interpolation import as_records, get_climate_interpolator
+from yield_risk import get_risk_simulator, simulate_risk
+from fanout import Fanout
+from season_journal import get_season_journal, new_doc_id, start_season_journal
+from season_model import UNKNOWN_CROP, UNKNOWN_PROVINCE, as_season, season_columns, seasons_from_frame
+from season_replica import get_season_replica, note_season_write, season_replica_status, start_season_replica
+from weather_series import SeriesQueryError, get_series_store
+from scenario_sweep import grid_from_args, model_version, surface_json
+from yield_engine import calculate_yield, calculate_yields, generate_decision_support
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = config.SECRET_KEY
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=1)
+metrics.init_app(app)
+compression.init_app(app)
 
 # =========================================================
 #               ERROR HANDLERS & TIMEOUT
@@ -74,299 +96,248 @@ def login_required(f):
 # ----------------- LOAD MODEL -----------------
 MODEL_PATH = os.path.join(os.path.dirname(__file__), "data", "yield_model.pkl")
 model = joblib.load(MODEL_PATH) if os.path.exists(MODEL_PATH) else None
+MODEL_VERSION = model_version(MODEL_PATH) if model is not None else None
+
+# ----------------- LOAD WEATHER INDEX -----------------
+# Nạp chuỗi NASA theo tỉnh một lần khi khởi động -> request không phải đọc file
+weather_index = get_weather_index()
+print(f"✅ Weather index: {len(weather_index.provinces)} tỉnh, {len(weather_index)} bản ghi (tỉnh, năm).")
+
+# ----------------- LOAD PROVINCE LOCATOR -----------------
+# BallTree (haversine) trên tâm 63 tỉnh: tọa độ bất kỳ -> tỉnh gần nhất
+province_locator = get_province_locator()
 
 # ----------------- INIT FIREBASE -----------------
+# Không kết nối lúc import: server nhiều worker nạp app ở tiến trình master rồi fork, mà kênh gRPC
+# không dùng chung được qua fork -> mỗi tiến trình tự gọi init_storage() (create_app / hook post_fork,
+# hoặc request đầu tiên của tiến trình nếu server không gọi hook)
 db = None
-if config.USE_FIREBASE:
-    try:
-        db = init_firebase()
-        print("✅ Firebase initialized.")
-    except Exception as e:
+_storage_pid = None
+
+
+def init_storage(client=None):
+    """Kết nối Firestore cho tiến trình hiện tại; client: Firestore client có sẵn (load test, emulator)"""
+    global db, _storage_pid
+    _storage_pid = os.getpid()
+    if client is not None:
+        db = instrument(client)
+    elif config.USE_FIREBASE:
+        try:
+            db = instrument(init_firebase())
+            print(f"✅ Firebase initialized (pid {_storage_pid}).")
+        except Exception as e:
+            db = None
+            print("❌ Firebase init failed:", e)
+    else:
         db = None
-        print("❌ Firebase init failed:", e)
+    # Bản sao seasons (nếu bật) phải khởi động sau fork: listener chạy trong thread của worker
+    replica = start_season_replica(db)
+    if replica is not None and not replica.wait_synced(config.SEASON_REPLICA_SYNC_TIMEOUT):
+        print("⚠️ Season replica chưa đồng bộ xong, tạm đọc Firestore trực tiếp")
+    # Journal write-behind (nếu bật): thread commit của worker luôn dùng client hiện tại
+    start_season_journal(lambda: db)
+    return db
+
+
+@app.before_request
+def ensure_storage():
+    if config.USE_FIREBASE and _storage_pid != os.getpid():
+        init_storage()
 
 # ----------------- HELPER PATHS -----------------
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 USERS_CSV = os.path.join(DATA_DIR, "users.csv")
 SEASONS_CSV = os.path.join(DATA_DIR, "seasons.csv")
 WEATHER_CSV = os.path.join(DATA_DIR, "weather_all_vn_annual_2000-2030.csv")
+PROVINCES_CSV = os.path.join(DATA_DIR, "vietnam_provinces_latlon.csv")
+
+# users.csv cũ còn mật khẩu dạng chữ -> hash ngay khi khởi động thay vì chờ chạy --compact bằng tay
+_legacy_passwords = get_user_store(USERS_CSV).compact_legacy()
+if _legacy_passwords:
+    print(f"🔐 Đã hash {_legacy_passwords} mật khẩu dạng chữ còn trong users.csv")
 
 # =========================================================
 #               CORE FUNCTIONS
 # =========================================================
 
-# ----------------- YIELD CALCULATION FUNCTION -----------------
-def calculate_yield(season_data):
+# ----------------- PROVINCE LIST (FORM) -----------------
+def load_province_names():
+    """Danh sách tỉnh cho form chỉnh sửa mùa vụ"""
+    return list(pd.read_csv(PROVINCES_CSV)['Province']) if os.path.exists(PROVINCES_CSV) else []
+
+# ----------------- GHI / ĐỌC MÙA VỤ (FIRESTORE) -----------------
+def write_season(doc_id, op, data=None):
     """
-    Tính toán năng suất tự động dựa trên:
-    - Giống cây trồng (crop)
-    - Diện tích (area)
-    - Thời gian trồng (sow_date, harvest_date)
-    - Phân bón (fertilizer)
-    - Tỉnh thành (province) - ảnh hưởng thời tiết
+    Ghi một mùa vụ lên Firestore: op = "set" | "update" | "delete"; doc_id=None -> mùa vụ mới.
+    Bật write-behind -> chỉ ghi vào journal cục bộ rồi trả về ngay, thread nền commit lên Firestore.
+    Trả về id của mùa vụ.
     """
-    try:
-        # Base yield by crop type (tấn/ha)
-        base_yields = {
-            "lúa": 5.5,
-            "ngô": 4.8,
-            "hoa hướng dương": 2.5,
-            "cà phê": 2.2,
-            "cao su": 1.8,
-            "chè": 3.2,
-            "tiêu": 3.0,
-            "điều": 1.5,
-            "mía": 60.0,
-            "lạc": 2.2,
-            "đậu tương": 2.0
-        }
-        
-        crop = season_data.get("crop", "").strip().lower()
-        area = float(season_data.get("area", 1))
-        fertilizer = season_data.get("fertilizer", "").strip().lower()
-        
-        # Base yield từ loại cây trồng
-        base_yield = base_yields.get(crop, 4.0)
-        
-        # Tính thời gian sinh trưởng
-        sow_date_str = season_data.get("sow_date")
-        harvest_date_str = season_data.get("harvest_date")
-        
-        growth_days = 90  # mặc định 90 ngày
-        
-        if sow_date_str and harvest_date_str:
-            try:
-                sow_date = datetime.strptime(sow_date_str, "%Y-%m-%d")
-                harvest_date = datetime.strptime(harvest_date_str, "%Y-%m-%d")
-                growth_days = (harvest_date - sow_date).days
-                growth_days = max(60, min(180, growth_days))
-            except:
-                growth_days = 90
-        
-        # Hệ số thời gian sinh trưởng
-        if growth_days < 80:
-            growth_factor = 0.7
-        elif growth_days < 100:
-            growth_factor = 0.9
-        elif growth_days < 120:
-            growth_factor = 1.0
-        elif growth_days < 150:
-            growth_factor = 1.1
-        else:
-            growth_factor = 1.2
-        
-        # Hệ số phân bón
-        fertilizer_factors = {
-            "hữu cơ": 1.2,
-            "vô cơ": 1.1,
-            "npk": 1.15,
-            "phân chuồng": 1.18,
-            "không": 0.8
-        }
-        
-        fertilizer_factor = 1.0
-        for fert_type, factor in fertilizer_factors.items():
-            if fert_type in fertilizer:
-                fertilizer_factor = factor
-                break
-        
-        # Hệ số vùng miền
-        region_factors = {
-            "an giang": 1.3, "đồng tháp": 1.25, "long an": 1.2,
-            "hà nội": 1.1, "bắc ninh": 1.05, "hưng yên": 1.05,
-            "đắk lắk": 1.0, "đắk nông": 0.95, "gia lai": 0.95,
-            "bắc kạn": 0.9, "cao bằng": 0.85, "hà giang": 0.85
-        }
-        
-        province = season_data.get("province", "").strip().lower()
-        region_factor = 1.0
-        for region, factor in region_factors.items():
-            if region in province:
-                region_factor = factor
-                break
-        
-        # Tính năng suất cuối cùng (tấn/ha)
-        final_yield_per_ha = base_yield * growth_factor * fertilizer_factor * region_factor
-        
-        # Áp dụng cho diện tích cụ thể (tổng sản lượng)
-        total_yield = final_yield_per_ha * area
-        
-        return round(total_yield, 2)
-        
-    except Exception as e:
-        print(f"Lỗi tính năng suất: {e}")
-        return None
+    doc_id = doc_id or new_doc_id()
+    journal = get_season_journal()
+    if journal is not None:
+        return journal.enqueue(doc_id, op, data)
+    ref = db.collection("seasons").document(doc_id)
+    if op == "set":
+        ref.set(data)
+    elif op == "update":
+        ref.update(data)
+    else:
+        ref.delete()
+    note_season_write(doc_id, data, merge=op == "update", delete=op == "delete")
+    return doc_id
+
 
-# ----------------- DECISION SUPPORT FUNCTION -----------------
-def generate_decision_support(season_data, predicted_yield):
+def load_seasons(rows, limit=None, order_by=None):
     """
-    Tạo dữ liệu hỗ trợ ra quyết định với báo cáo, khuyến nghị và phân tích
+    [(id, dict | Season)] đọc từ Firestore / bản sao -> [Season], kèm thay đổi write-behind còn chờ.
+    Đây là chỗ duy nhất document được parse (bản sao đã giữ sẵn Season nên không parse lại).
     """
+    journal = get_season_journal()
+    if journal is not None:
+        rows = journal.overlay(rows, limit=limit, order_by=order_by)
+    elif limit is not None:
+        rows = rows[:limit]
+    return [as_season(data, doc_id) for doc_id, data in rows]
+
+
+def write_behind_status():
+    """Trạng thái journal cho /api/health: None nếu tắt"""
+    journal = get_season_journal()
+    if journal is None:
+        return None
+    pending, oldest = journal.backlog()
+    return {"pending": pending, "oldest_seconds": round(oldest, 1)}
+
+
+def read_season(doc_id, fan=None):
+    """Một mùa vụ (Season) hoặc None: bản sao trong bộ nhớ / Firestore (qua fan nếu có), kèm thay đổi còn chờ"""
+    replica = get_season_replica()
+    if replica is not None:
+        season = replica.get(doc_id)
+    else:
+        get = db.collection("seasons").document(doc_id).get
+        doc = fan.submit("season", get).result("season") if fan is not None else get()
+        season = as_season(doc.to_dict(), doc_id) if doc.exists else None
+    journal = get_season_journal()
+    return journal.overlay_one(doc_id, season) if journal is not None else season
+
+def csv_row(df, season_id):
+    """Nhãn dòng của mùa vụ trong seasons.csv (id = chỉ số dòng); None nếu id không phải số hoặc không tồn tại"""
     try:
-        crop = season_data.get("crop", "").strip().lower()
-        area = float(season_data.get("area", 1))
-        province = season_data.get("province", "")
-        fertilizer = season_data.get("fertilizer", "")
-        
-        # Tính toán các chỉ số
-        yield_per_ha = predicted_yield / area if area > 0 else 0
-        
-        # Phân loại năng suất
-        if yield_per_ha >= 6:
-            yield_category = "Rất cao"
-            yield_color = "text-green-600"
-            yield_bg = "bg-green-100"
-        elif yield_per_ha >= 4:
-            yield_category = "Cao"
-            yield_color = "text-green-500"
-            yield_bg = "bg-green-50"
-        elif yield_per_ha >= 2:
-            yield_category = "Trung bình"
-            yield_color = "text-yellow-600"
-            yield_bg = "bg-yellow-50"
-        else:
-            yield_category = "Thấp"
-            yield_color = "text-red-600"
-            yield_bg = "bg-red-50"
-        
-        # Khuyến nghị theo loại cây trồng
-        crop_recommendations = {
-            "lúa": [
-                "🌾 Bón thúc đợt 1: 7-10 ngày sau sạ",
-                "💧 Duy trì mực nước 3-5cm trong giai đoạn đẻ nhánh",
-                "🛡️ Phòng trừ sâu bệnh: đạo ôn, rầy nâu",
-                "📅 Thu hoạch khi 85-90% hạt chín vàng"
-            ],
-            "ngô": [
-                "🌱 Bón lót phân chuồng + lân trước khi gieo",
-                "💦 Tưới đủ ẩm giai đoạn trỗ cờ phun râu",
-                "🪲 Phòng trừ sâu đục thân, bệnh khô vằn",
-                "🌽 Thu hoạch khi hạt cứng, râu chuyển nâu"
-            ],
-            "cà phê": [
-                "🌿 Tỉa cành tạo tán sau thu hoạch",
-                "💧 Tưới nước đầy đủ mùa khô",
-                "🍂 Bón phân NPK cân đối theo giai đoạn",
-                "☀️ Che bóng hợp lý tránh nắng gắt"
-            ]
-        }
-        
-        # Khuyến nghị chung
-        general_recommendations = [
-            "📊 Theo dõi thời tiết thường xuyên để điều chỉnh lịch chăm sóc",
-            "🌱 Kiểm tra độ ẩm đất trước khi tưới nước",
-            "🔍 Thăm đồng thường xuyên để phát hiện sâu bệnh sớm",
-            "📝 Ghi chép nhật ký đồng ruộng để cải thiện vụ sau"
-        ]
-        
-        # Cảnh báo dựa trên điều kiện
-        warnings = []
-        if not fertilizer or "không" in fertilizer.lower():
-            warnings.append("⚠️ Chưa sử dụng phân bón - có thể ảnh hưởng năng suất")
-        
-        # Phân tích lợi nhuận ước tính
-        crop_prices = {
-            "lúa": 7000, "ngô": 6000, "cà phê": 45000, "cao su": 35000,
-            "chè": 25000, "tiêu": 80000, "điều": 30000, "mía": 1000,
-            "lạc": 20000, "đậu tương": 15000
-        }
-        
-        price_per_kg = crop_prices.get(crop, 10000)
-        estimated_revenue = predicted_yield * 1000 * price_per_kg
-        
-        # Chi phí ước tính (VND/ha)
-        cost_per_ha = {
-            "lúa": 15000000, "ngô": 18000000, "cà phê": 25000000,
-            "cao su": 15000000, "chè": 20000000, "default": 15000000
-        }
-        
-        cost = cost_per_ha.get(crop, cost_per_ha["default"]) * area
-        estimated_profit = estimated_revenue - cost
-        
-        # Tạo dữ liệu biểu đồ (mẫu)
-        growth_stages = [
-            {"stage": "Gieo trồng", "progress": 100, "tasks": ["Làm đất", "Gieo hạt"]},
-            {"stage": "Phát triển", "progress": 65, "tasks": ["Bón thúc", "Tưới nước"]},
-            {"stage": "Ra hoa", "progress": 30, "tasks": ["Bón phân", "Phun thuốc"]},
-            {"stage": "Thu hoạch", "progress": 0, "tasks": ["Chuẩn bị thu", "Bảo quản"]}
-        ]
-        
-        return {
-            "yield_per_ha": round(yield_per_ha, 2),
-            "yield_category": yield_category,
-            "yield_color": yield_color,
-            "yield_bg": yield_bg,
-            "crop_recommendations": crop_recommendations.get(crop, general_recommendations),
-            "general_recommendations": general_recommendations,
-            "warnings": warnings,
-            "estimated_revenue": f"{estimated_revenue:,.0f}",
-            "estimated_profit": f"{estimated_profit:,.0f}",
-            "cost": f"{cost:,.0f}",
-            "growth_stages": growth_stages,
-            "profit_margin": round((estimated_profit / estimated_revenue * 100) if estimated_revenue > 0 else 0, 1),
-            "price_per_kg": f"{price_per_kg:,.0f}"
-        }
-        
-    except Exception as e:
-        print(f"Lỗi tạo hỗ trợ quyết định: {e}")
+        row = int(season_id)
+    except (TypeError, ValueError):
         return None
+    return row if row in df.index else None
+
+# ----------------- AUTO YIELD PAGE -----------------
+def render_auto_yield(season, season_id):
+    """
+    Trang dự đoán năng suất: mô phỏng rủi ro chạy song song với dự đoán + hỗ trợ quyết định.
+    Mô phỏng có hạn chót riêng; quá hạn thì trang vẫn hiển thị, chỉ thiếu thẻ rủi ro.
+    """
+    fan = Fanout()
+    fan.submit("risk", simulate_risk, season, timeout=config.RISK_SIMULATION_TIMEOUT, default=None)
+    predicted_yield = calculate_yield(season)
+    decision_support = generate_decision_support(season, predicted_yield)
+    return render_template("auto_yield.html",
+                           season=season,
+                           season_id=season_id,
+                           predicted_yield=predicted_yield,
+                           decision_support=decision_support,
+                           risk=fan.result("risk"))
 
 # ----------------- CALCULATE PRODUCTIVITY FOR STATS -----------------
 def calculate_productivity(season_data):
     """
     Tính năng suất cho thống kê (tấn/ha)
     """
-    try:
-        actual_yield = season_data.get("actual_yield", 0)
-        area = season_data.get("area", 1)
-        
-        if actual_yield and area and area > 0:
-            return float(actual_yield) / float(area)
-        return 0.0
-    except:
-        return 0.0
-
-# ----------------- FIREBASE WITH RETRY -----------------
-def get_firestore_with_retry():
-    """Kết nối Firebase với retry mechanism"""
-    max_retries = 2
-    timeout_seconds = 10
-    
-    for attempt in range(max_retries):
-        try:
-            if config.USE_FIREBASE:
-                if db is None:
-                    print(f"🔄 Attempt {attempt + 1} to initialize Firebase...")
-                    db_retry = init_firebase()
-                    if db_retry:
-                        print("✅ Firebase initialized with retry")
-                        return db_retry
-                else:
-                    # Test connection với timeout
-                    print(f"🔄 Attempt {attempt + 1} to test Firebase connection...")
-                    test_ref = db.collection("seasons").limit(1)
-                    list(test_ref.stream())  # Test query nhỏ
-                    print("✅ Firebase connection test passed")
-                    return db
-            else:
-                return None
-                
-        except Exception as e:
-            print(f"❌ Firebase attempt {attempt + 1} failed: {str(e)[:100]}...")
-            if attempt < max_retries - 1:
-                import time
-                time.sleep(1)  # Chờ 1 giây trước khi retry
-            else:
-                print("🚨 All Firebase connection attempts failed")
-                return None
-    
-    return None
+    return as_season(season_data).productivity
+
+# ----------------- OVERVIEW STATISTICS -----------------
+def aggregate_season_stats(seasons_data):
+    """
+    Tổng hợp thống kê cho trang /overview: tổng diện tích, top tỉnh theo diện tích,
+    phân bố cây trồng và top 3 tỉnh có năng suất cao nhất theo từng cây trồng.
+    Nhận list Season / dict, DataFrame CSV hoặc SeasonColumns; tính trên dạng cột
+    (pd.factorize giữ thứ tự xuất hiện, np.bincount cộng theo nhóm).
+    """
+    columns = season_columns(seasons_data)
+    area = np.nan_to_num(columns.area)  # thiếu diện tích -> 0
+    names = np.where(columns.province == "", UNKNOWN_PROVINCE, columns.province)
+    crops = np.where(columns.crop_key == "", UNKNOWN_CROP, columns.crop_key)
+    stats = {"total_area": float(area.sum())}
+
+    # Thống kê theo tỉnh (gom theo khóa chuẩn, hiển thị tên gặp đầu tiên)
+    province_codes, province_keys = pd.factorize(columns.province_key)
+    first_row = np.unique(province_codes, return_index=True)[1]
+    area_by_province = np.bincount(province_codes, weights=area, minlength=len(province_keys))
+    top = np.argsort(-area_by_province, kind="stable")[:5]
+    stats["top_provinces"] = [(names[first_row[i]], float(area_by_province[i])) for i in top]
+
+    # Thống kê theo cây trồng
+    crop_codes, crop_names = pd.factorize(crops)
+    stats["crop_distribution"] = dict(zip(crop_names, np.bincount(crop_codes).tolist()))
+
+    # Thống kê năng suất theo tỉnh và cây trồng (chỉ mùa vụ có actual_yield và diện tích > 0)
+    productive = np.flatnonzero((columns.actual_yield > 0) & (area > 0))
+    pair_codes, pairs = pd.factorize(crop_codes[productive] * len(province_keys) + province_codes[productive])
+    total_area = np.bincount(pair_codes, weights=area[productive], minlength=len(pairs))
+    total_yield = np.bincount(pair_codes, weights=columns.actual_yield[productive], minlength=len(pairs))
+    crop_province_stats = {}
+    for pair, pair_area, pair_yield in zip(pairs.tolist(), total_area.tolist(), total_yield.tolist()):
+        crop, province = divmod(pair, len(province_keys))
+        crop_province_stats.setdefault(crop_names[crop], []).append({
+            "province": names[first_row[province]],
+            "total_area": pair_area,
+            "total_yield": pair_yield,
+            "productivity": pair_yield / pair_area,
+        })
+
+    # Top 3 tỉnh theo năng suất giảm dần cho mỗi loại cây
+    stats["top_provinces_by_crop"] = {
+        crop: sorted(provinces, key=lambda x: x["productivity"], reverse=True)[:3]
+        for crop, provinces in crop_province_stats.items()
+    }
+
+    return stats, crop_province_stats
+
+# ----------------- FIREBASE HAY STORE CỤC BỘ -----------------
+def firestore_mode():
+    """Firestore là kho mùa vụ chính (USE_FIREBASE và đã kết nối); False = chế độ CSV offline"""
+    return bool(config.USE_FIREBASE) and db is not None
+
+
+def use_firestore():
+    """
+    Trang danh sách / thống kê đọc được từ Firestore (hoặc bản sao seasons trong bộ nhớ) lúc này không.
+    Firestore lỗi liên tục -> circuit breaker mở -> False ngay (không chờ timeout). Khi Firestore là kho chính
+    (firestore_mode), data/seasons.csv KHÔNG phải bản sao của nó -> route báo "dữ liệu tạm thời không khả dụng"
+    (DATA_UNAVAILABLE_MSG, export trả 503) chứ không đọc CSV. Ghi và các route theo id mùa vụ đi theo
+    firestore_mode(): journal write-behind nhận thay đổi, không có journal thì báo lỗi ngay.
+    """
+    if not firestore_mode():
+        return False
+    return firestore_breaker.allow() or get_season_replica() is not None
+
+
+DATA_UNAVAILABLE_MSG = "⚠️ Firestore tạm thời không khả dụng: chưa hiển thị được dữ liệu mùa vụ. Vui lòng thử lại sau."
+
+
+def storage_error_message(error, action):
+    """Thông báo flash khi đọc/ghi mùa vụ lỗi; Firestore gián đoạn (mạch mở, timeout) -> nói rõ là chưa thực hiện"""
+    if is_outage(error):
+        return f"⚠️ Firestore tạm thời không khả dụng nên chưa {action}. Vui lòng thử lại sau."
+    return f"❌ Lỗi khi {action}: {error}"
+
+
+# Trang render từ CSV (chế độ offline) và từ Firestore được cache riêng
+set_page_source(lambda: "firestore" if use_firestore() else "csv")
 
 # ----------------- OPTIMIZED FIREBASE QUERY -----------------
 def safe_firebase_query(collection_name, limit=50, order_by=None):
-    """Thực hiện query Firebase an toàn với timeout"""
+    """Thực hiện query Firebase (collection mùa vụ) an toàn với timeout; trả về [Season]"""
     try:
-        if not config.USE_FIREBASE or db is None:
+        if not use_firestore():
             return []
             
         collection_ref = db.collection(collection_name)
@@ -378,39 +349,8 @@ def safe_firebase_query(collection_name, limit=50, order_by=None):
         # Giới hạn số lượng documents
         collection_ref = collection_ref.limit(limit)
         
-        # Lấy documents
-        docs = list(collection_ref.stream())
-        
-        # Xử lý dữ liệu
-        results = []
-        for doc in docs:
-            try:
-                record = doc.to_dict()
-                record["id"] = doc.id
-                
-                # Xử lý số liệu an toàn
-                if record.get("actual_yield"):
-                    try:
-                        record["actual_yield"] = float(record["actual_yield"])
-                    except:
-                        record["actual_yield"] = 0.0
-                else:
-                    record["actual_yield"] = 0.0
-                    
-                if record.get("area"):
-                    try:
-                        record["area"] = float(record["area"])
-                    except:
-                        record["area"] = 0.0
-                else:
-                    record["area"] = 0.0
-                
-                results.append(record)
-            except Exception as doc_error:
-                print(f"⚠️ Lỗi xử lý document {doc.id}: {doc_error}")
-                continue
-                
-        return results
+        # Lấy documents và parse một lần thành Season (số liệu sai kiểu -> None)
+        return [as_season(doc.to_dict(), doc.id) for doc in collection_ref.stream()]
         
     except Exception as e:
         print(f"❌ Lỗi Firebase query: {e}")
@@ -425,25 +365,42 @@ def safe_firebase_query(collection_name, limit=50, order_by=None):
 def index():
     total = 0
     recent = []
-    if config.USE_FIREBASE and db is not None:
+    if use_firestore():
         try:
-            docs = db.collection("seasons").order_by("created_at", direction=firestore.Query.DESCENDING).limit(5).stream()
-            for d in docs:
-                recent.append(d.to_dict())
-            total = len(list(db.collection("seasons").limit(1000).stream()))
+            replica = get_season_replica()
+            if replica is not None:
+                recent = replica.recent(5)
+                total = replica.count()
+            else:
+                # Hai query độc lập chạy song song
+                fan = Fanout()
+                fan.submit("recent", lambda: [(d.id, d.to_dict()) for d in db.collection("seasons")
+                                              .order_by("created_at", direction=firestore.Query.DESCENDING)
+                                              .limit(5).stream()])
+                fan.submit("total", lambda: len(list(db.collection("seasons").limit(1000).stream())))
+                recent = fan.result("recent")
+                total = fan.result("total")
+            recent = load_seasons(recent, limit=5, order_by="created_at")
+            journal = get_season_journal()
+            if journal is not None:
+                total = max(0, total + journal.count_delta())
         except Exception as e:
             print("Lỗi đọc Firestore:", e)
             total = 0
+            flash(DATA_UNAVAILABLE_MSG if is_outage(e) else f"Lỗi đọc dữ liệu mùa vụ: {str(e)[:100]}", "warning")
+    elif firestore_mode():
+        flash(DATA_UNAVAILABLE_MSG, "warning")
     else:
         if os.path.exists(SEASONS_CSV):
             df = pd.read_csv(SEASONS_CSV)
             total = len(df)
-            recent = df.sort_values("created_at", ascending=False).head(5).to_dict(orient="records")
+            recent = seasons_from_frame(df.sort_values("created_at", ascending=False).head(5))
     return render_template("index.html", total=total, recent=recent)
 
 # ---------- OVERVIEW (OPTIMIZED) ----------
 @app.route("/overview")
 @login_required
+@cached_page
 def overview():
     stats = {
         "total_seasons": 0,
@@ -455,161 +412,82 @@ def overview():
     }
     
     # ✅ XỬ LÝ DỮ LIỆU MÙA VỤ - TỐI ƯU HÓA
-    seasons_data = []
+    # Firestore: [Season] (parse một lần); CSV: DataFrame. Thống kê tính trên dạng cột (SeasonColumns).
+    seasons = []
+    df = None
+    columns = None
+    from_firestore = use_firestore()
+    SEASONS_CSV_PATH = os.path.join(DATA_DIR, "seasons.csv")
     
-    if config.USE_FIREBASE and db is not None:
+    if from_firestore:
         try:
-            # Lấy tất cả seasons
-            seasons_ref = db.collection("seasons")
-            docs = list(seasons_ref.stream())
-            stats["total_seasons"] = len(docs)
-            
-            for doc in docs:
-                data = doc.to_dict()
-                data["id"] = doc.id
-                seasons_data.append(data)
+            # Lấy tất cả seasons (từ bản sao trong bộ nhớ nếu có)
+            replica = get_season_replica()
+            if replica is not None:
+                docs = replica.all()
+            else:
+                docs = [(doc.id, doc.to_dict()) for doc in db.collection("seasons").stream()]
+            seasons = load_seasons(docs)
+            stats["total_seasons"] = len(seasons)
+            columns = season_columns(seasons)
                 
         except Exception as e:
             print("Lỗi đọc thống kê Firestore:", e)
+            flash(DATA_UNAVAILABLE_MSG if is_outage(e) else f"Lỗi đọc thống kê: {str(e)[:100]}", "warning")
+    elif firestore_mode():
+        # Firestore gián đoạn: thống kê để trống kèm cảnh báo (flash -> trang không được cache)
+        flash(DATA_UNAVAILABLE_MSG, "warning")
     else:
-        # CSV fallback - tối ưu hóa
-        SEASONS_CSV_PATH = os.path.join(DATA_DIR, "seasons.csv")
+        # Chế độ CSV - dựng thẳng dạng cột từ DataFrame, không tạo dict từng dòng
         if os.path.exists(SEASONS_CSV_PATH):
             try:
                 df = pd.read_csv(SEASONS_CSV_PATH)
                 stats["total_seasons"] = len(df)
-                seasons_data = df.to_dict(orient="records")
+                columns = season_columns(df)
             except Exception as e:
                 print("Lỗi đọc file CSV mùa vụ:", e)
     
     # ✅ TỰ ĐỘNG TÍNH NĂNG SUẤT CHO CÁC MÙA VỤ CHƯA CÓ DỮ LIỆU
-    if seasons_data:
+    if columns is not None and len(columns):
         auto_calculated_count = 0
-        for season in seasons_data:
-            # Kiểm tra nếu chưa có actual_yield nhưng có đủ thông tin để tính toán
-            if (not season.get("actual_yield") and 
-                season.get("crop") and 
-                season.get("area") and 
-                float(season.get("area", 0)) > 0):
-                
-                predicted_yield = calculate_yield(season)
-                if predicted_yield is not None:
-                    try:
-                        if config.USE_FIREBASE and db is not None:
-                            doc_ref = db.collection("seasons").document(season["id"])
-                            doc_ref.update({
-                                "actual_yield": round(predicted_yield, 2),
-                                "yield_calculated_at": datetime.utcnow().isoformat(),
-                                "yield_source": "auto_overview"
-                            })
-                        else:
-                            # Cập nhật trong CSV
-                            SEASONS_CSV_PATH = os.path.join(DATA_DIR, "seasons.csv")
-                            if os.path.exists(SEASONS_CSV_PATH):
-                                df = pd.read_csv(SEASONS_CSV_PATH)
-                                # Tìm và cập nhật bản ghi
-                                for idx, row in df.iterrows():
-                                    if (str(row.get("farmer_name")) == str(season.get("farmer_name")) and 
-                                        str(row.get("crop")) == str(season.get("crop")) and 
-                                        str(row.get("province")) == str(season.get("province"))):
-                                        df.at[idx, "actual_yield"] = round(predicted_yield, 2)
-                                        df.at[idx, "yield_calculated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                                        df.at[idx, "yield_source"] = "auto_overview"
-                                        break
-                                df.to_csv(SEASONS_CSV_PATH, index=False, encoding="utf-8-sig")
-                        
-                        auto_calculated_count += 1
-                        print(f"✅ Đã tự động tính năng suất: {predicted_yield} tấn cho {season.get('crop')} tại {season.get('province')}")
-                        
-                    except Exception as e:
-                        print(f"❌ Lỗi khi lưu năng suất tự động: {e}")
+        # Chưa có actual_yield nhưng có đủ thông tin (cây trồng, diện tích > 0) để tính toán
+        pending = np.flatnonzero(~(columns.actual_yield > 0) & (columns.crop_key != "") & (columns.area > 0))
+        # Tính theo lô (nối thời tiết một lần cho cả danh sách)
+        for row, predicted_yield in zip(pending, calculate_yields(columns.take(pending))):
+            if predicted_yield is not None:
+                try:
+                    if from_firestore:
+                        write_season(seasons[row].id, "update", {
+                            "actual_yield": round(predicted_yield, 2),
+                            "yield_calculated_at": datetime.utcnow().isoformat(),
+                            "yield_source": "auto_overview"
+                        })
+                    else:
+                        # Cập nhật đúng dòng trong CSV (ghi file một lần ở cuối)
+                        index = df.index[row]
+                        df.at[index, "actual_yield"] = round(predicted_yield, 2)
+                        df.at[index, "yield_calculated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                        df.at[index, "yield_source"] = "auto_overview"
+                    
+                    auto_calculated_count += 1
+                    print(f"✅ Đã tự động tính năng suất: {predicted_yield} tấn cho {columns.crop_key[row]} tại {columns.province[row]}")
+                    
+                except Exception as e:
+                    print(f"❌ Lỗi khi lưu năng suất tự động: {e}")
         
         if auto_calculated_count > 0:
+            if not from_firestore:
+                df.to_csv(SEASONS_CSV_PATH, index=False, encoding="utf-8-sig")
+            bump_data_version()
             print(f"📊 Đã tự động tính năng suất cho {auto_calculated_count} mùa vụ")
             # Load lại trang để hiển thị dữ liệu mới
             flash(f"✅ Đã tự động tính năng suất cho {auto_calculated_count} mùa vụ", "success")
             return redirect(url_for("overview"))
     
     # ✅ TÍNH TOÁN THỐNG KÊ TỪ DỮ LIỆU MÙA VỤ
-    if seasons_data:
-        area_by_province = {}
-        crop_stats = {}
-        crop_province_stats = {}
-        
-        for season in seasons_data:
-            # Xử lý diện tích
-            try:
-                area = float(season.get("area", 0))
-            except:
-                area = 0
-                
-            province = season.get("province", "Chưa xác định")
-            crop = season.get("crop", "Chưa xác định")
-            
-            # Chuẩn hóa tên cây trồng
-            crop_normalized = crop.strip().lower()
-            
-            # Tổng diện tích
-            stats["total_area"] += area
-            
-            # Thống kê theo tỉnh
-            if province in area_by_province:
-                area_by_province[province] += area
-            else:
-                area_by_province[province] = area
-            
-            # Thống kê theo cây trồng
-            if crop_normalized in crop_stats:
-                crop_stats[crop_normalized] += 1
-            else:
-                crop_stats[crop_normalized] = 1
-            
-            # Thống kê năng suất theo tỉnh và cây trồng
-            # Kiểm tra nếu có actual_yield
-            actual_yield = season.get("actual_yield")
-            if actual_yield and area > 0:
-                try:
-                    # Tính năng suất (tấn/ha)
-                    productivity = float(actual_yield) / area
-                    
-                    if crop_normalized not in crop_province_stats:
-                        crop_province_stats[crop_normalized] = []
-                    
-                    # Tìm xem tỉnh đã có trong danh sách chưa
-                    existing_province = None
-                    for item in crop_province_stats[crop_normalized]:
-                        if item["province"] == province:
-                            existing_province = item
-                            break
-                    
-                    if existing_province:
-                        # Cập nhật thông tin nếu đã tồn tại
-                        existing_province["total_area"] += area
-                        existing_province["total_yield"] += float(actual_yield)
-                        existing_province["productivity"] = existing_province["total_yield"] / existing_province["total_area"]
-                    else:
-                        # Thêm tỉnh mới
-                        crop_province_stats[crop_normalized].append({
-                            "province": province,
-                            "total_area": area,
-                            "total_yield": float(actual_yield),
-                            "productivity": productivity
-                        })
-                except (ValueError, TypeError, ZeroDivisionError) as e:
-                    print(f"Lỗi tính năng suất: {e}")
-                    continue
-        
-        # Sắp xếp và lấy top provinces theo diện tích
-        stats["top_provinces"] = sorted(area_by_province.items(), key=lambda x: x[1], reverse=True)[:5]
-        stats["crop_distribution"] = crop_stats
-        
-        # Xử lý top provinces by crop - chỉ lấy top 3 cho mỗi loại cây
-        stats["top_provinces_by_crop"] = {}
-        for crop, provinces in crop_province_stats.items():
-            if provinces:  # Chỉ xử lý nếu có dữ liệu
-                # Sắp xếp theo năng suất giảm dần và lấy top 3
-                sorted_provinces = sorted(provinces, key=lambda x: x["productivity"], reverse=True)[:3]
-                stats["top_provinces_by_crop"][crop] = sorted_provinces
+    if columns is not None and len(columns):
+        season_stats, crop_province_stats = aggregate_season_stats(columns)
+        stats.update(season_stats)
         
         # DEBUG: In ra để kiểm tra
         print(f"📊 Tổng số mùa vụ: {stats['total_seasons']}")
@@ -639,24 +517,10 @@ def register():
                 flash("Lỗi đăng ký Firebase: " + str(e), "danger")
                 return redirect(url_for("register"))
         else:
-            if os.path.exists(USERS_CSV):
-                df = pd.read_csv(USERS_CSV)
-                if username in df['username'].values:
-                    flash("Tên đăng nhập đã tồn tại.", "danger")
-                    return redirect(url_for("register"))
-            else:
-                df = pd.DataFrame(columns=["username", "password", "fullname", "role", "created_at"])
-
-            new = pd.DataFrame([{
-                "username": username,
-                "password": password,
-                "fullname": fullname,
-                "role": "user",
-                "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }])
-
-            df = pd.concat([df, new], ignore_index=True)
-            df.to_csv(USERS_CSV, index=False, encoding="utf-8-sig")
+            # Chỉ nối thêm một dòng, mật khẩu lưu dạng hash
+            if not get_user_store(USERS_CSV).register(username, password, fullname):
+                flash("Tên đăng nhập đã tồn tại.", "danger")
+                return redirect(url_for("register"))
             flash("Đăng ký thành công (CSV). Vui lòng đăng nhập.", "success")
             return redirect(url_for("login"))
     return render_template("register.html")
@@ -673,7 +537,10 @@ def login():
                 flash("Firebase API key chưa được cấu hình.", "danger")
                 return redirect(url_for("login"))
 
-            url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={api_key}"
+            if config.FIREBASE_AUTH_EMULATOR_HOST:
+                url = f"http://{config.FIREBASE_AUTH_EMULATOR_HOST}/identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={api_key}"
+            else:
+                url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={api_key}"
             payload = {"email": username, "password": password, "returnSecureToken": True}
 
             try:
@@ -692,12 +559,12 @@ def login():
                 flash("Không thể kết nối tới Firebase.", "danger")
                 return redirect(url_for("login"))
         else:
-            if not os.path.exists(USERS_CSV):
+            users = get_user_store(USERS_CSV)
+            if not users.exists():
                 flash("Chưa có người dùng nào. Vui lòng đăng ký.", "warning")
                 return redirect(url_for("register"))
-            df = pd.read_csv(USERS_CSV)
-            user = df[(df['username'] == username) & (df['password'] == password)]
-            if not user.empty:
+            # Tra chỉ mục trong bộ nhớ (chỉ đọc lại file khi file thay đổi)
+            if users.authenticate(username, password) is not None:
                 session['user'] = username
                 flash(f"Chào mừng {username}", "success")
                 return redirect(url_for("index"))
@@ -718,6 +585,7 @@ def logout():
 # ---------- MANAGE SEASONS (OPTIMIZED) ----------
 @app.route("/manage", methods=["GET", "POST"])
 @login_required
+@cached_page
 def manage():
     try:
         prov_file = os.path.join(os.path.dirname(__file__), "data", "vietnam_provinces_latlon.csv")
@@ -745,8 +613,9 @@ def manage():
             }
 
             try:
-                if config.USE_FIREBASE and db is not None:
-                    db.collection("seasons").add(data)
+                if firestore_mode():
+                    write_season(None, "set", data)
+                    bump_data_version()
                     flash("✅ Đã thêm mùa vụ mới vào Firestore.", "success")
                 else:
                     if os.path.exists(SEASONS_CSV):
@@ -755,81 +624,50 @@ def manage():
                     else:
                         df = pd.DataFrame([data])
                     df.to_csv(SEASONS_CSV, index=False, encoding="utf-8-sig")
+                    bump_data_version()
                     flash("✅ Đã lưu mùa vụ vào CSV (chế độ offline).", "success")
             except Exception as e:
-                flash(f"❌ Lỗi khi lưu mùa vụ: {e}", "danger")
+                flash(storage_error_message(e, "lưu mùa vụ"), "danger")
 
             return redirect(url_for("manage"))
 
         # ✅ Hiển thị danh sách mùa vụ - TỐI ƯU HÓA
         seasons = []
+        unavailable = False  # Firestore gián đoạn: không có danh sách để hiển thị
         
-        if config.USE_FIREBASE and db is not None:
+        if use_firestore():
             try:
                 # GIỚI HẠN CHẶT CHẼ - chỉ lấy 50 bản ghi mới nhất
-                docs = db.collection("seasons")\
-                        .order_by("created_at", direction=firestore.Query.DESCENDING)\
-                        .limit(50)\
-                        .stream()
-                
-                count = 0
-                for d in docs:
-                    if count >= 50:  # Double check
-                        break
-                    record = d.to_dict()
-                    record["id"] = d.id
-                    
-                    # Xử lý dữ liệu an toàn
-                    try:
-                        if record.get("actual_yield"):
-                            record["actual_yield"] = float(record["actual_yield"])
-                        else:
-                            record["actual_yield"] = 0.0
-                    except:
-                        record["actual_yield"] = 0.0
-                        
-                    try:
-                        if record.get("area"):
-                            record["area"] = float(record["area"])
-                        else:
-                            record["area"] = 0.0
-                    except:
-                        record["area"] = 0.0
-                    
-                    seasons.append(record)
-                    count += 1
-                    
+                replica = get_season_replica()
+                if replica is not None:
+                    docs = replica.recent(50)
+                else:
+                    docs = [(d.id, d.to_dict()) for d in db.collection("seasons")
+                            .order_by("created_at", direction=firestore.Query.DESCENDING)
+                            .limit(50)
+                            .stream()]
+                seasons = load_seasons(docs, limit=50, order_by="created_at")
                 print(f"✅ Đã tải {len(seasons)} mùa vụ từ Firebase")
                 
             except Exception as e:
                 print(f"❌ Lỗi đọc Firestore: {e}")
-                flash(f"Lỗi kết nối database: {str(e)[:100]}...", "danger")
-                # Fallback to CSV
-                if os.path.exists(SEASONS_CSV):
-                    try:
-                        df = pd.read_csv(SEASONS_CSV)
-                        if 'actual_yield' in df.columns:
-                            df['actual_yield'] = pd.to_numeric(df['actual_yield'], errors='coerce').fillna(0)
-                        if 'area' in df.columns:
-                            df['area'] = pd.to_numeric(df['area'], errors='coerce').fillna(0)
-                        seasons = df.tail(50).to_dict(orient="records")  # Chỉ lấy 50 bản ghi
-                    except Exception as csv_error:
-                        print(f"❌ Lỗi đọc CSV: {csv_error}")
+                # Không thay bằng seasons.csv: file đó không phải bản sao của Firestore
+                unavailable = True
+                flash(DATA_UNAVAILABLE_MSG if is_outage(e) else f"Lỗi kết nối database: {str(e)[:100]}...",
+                      "warning" if is_outage(e) else "danger")
+        elif firestore_mode():
+            unavailable = True
+            flash(DATA_UNAVAILABLE_MSG, "warning")
         else:
             # Chế độ CSV
             if os.path.exists(SEASONS_CSV):
                 try:
-                    df = pd.read_csv(SEASONS_CSV)
-                    if 'actual_yield' in df.columns:
-                        df['actual_yield'] = pd.to_numeric(df['actual_yield'], errors='coerce').fillna(0)
-                    if 'area' in df.columns:
-                        df['area'] = pd.to_numeric(df['area'], errors='coerce').fillna(0)
-                    seasons = df.tail(50).to_dict(orient="records")  # Chỉ lấy 50 bản ghi
+                    seasons = seasons_from_frame(pd.read_csv(SEASONS_CSV).tail(50))  # Chỉ lấy 50 bản ghi
                 except Exception as e:
                     print(f"❌ Lỗi đọc file CSV: {e}")
                     seasons = []
 
-        return render_template("manage.html", provinces=provinces, seasons=seasons)
+        return render_template("manage.html", provinces=provinces, seasons=seasons, unavailable=unavailable)
         
     except Exception as e:
         print(f"❌ Lỗi nghiêm trọng trong route /manage: {e}")
@@ -841,15 +679,12 @@ def manage():
 @login_required
 def auto_yield(season_id):
     try:
-        if config.USE_FIREBASE and db is not None:
-            # Lấy dữ liệu mùa vụ từ Firestore
-            doc_ref = db.collection("seasons").document(season_id)
-            doc = doc_ref.get()
-            if not doc.exists:
+        if firestore_mode():
+            # Lấy dữ liệu mùa vụ từ bản sao trong bộ nhớ, không có thì từ Firestore
+            season = read_season(season_id)
+            if season is None:
                 flash("Không tìm thấy mùa vụ.", "danger")
                 return redirect(url_for("manage"))
-
-            season = doc.to_dict()
             
             # Nếu là POST request, tính toán và lưu năng suất
             if request.method == "POST":
@@ -858,21 +693,23 @@ def auto_yield(season_id):
                 if actual_yield_input:
                     # Sử dụng giá trị người dùng nhập
                     actual_yield = float(actual_yield_input)
-                    doc_ref.update({
+                    write_season(season_id, "update", {
                         "actual_yield": round(actual_yield, 2),
                         "yield_calculated_at": datetime.utcnow().isoformat(),
                         "yield_source": "manual"
                     })
+                    bump_data_version()
                     flash(f"✅ Đã lưu năng suất: {round(actual_yield, 2)} tấn", "success")
                 else:
                     # Tự động tính toán nếu không có input
                     predicted_yield = calculate_yield(season)
                     if predicted_yield is not None:
-                        doc_ref.update({
+                        write_season(season_id, "update", {
                             "actual_yield": round(predicted_yield, 2),
                             "yield_calculated_at": datetime.utcnow().isoformat(),
                             "yield_source": "auto"
                         })
+                        bump_data_version()
                         flash(f"✅ Đã tính toán năng suất tự động: {round(predicted_yield, 2)} tấn", "success")
                     else:
                         flash("❌ Không thể tính toán năng suất tự động.", "warning")
@@ -881,14 +718,7 @@ def auto_yield(season_id):
                 return redirect(url_for("manage"))
 
             # Hiển thị thông tin dự đoán và hỗ trợ quyết định (GET request)
-            predicted_yield = calculate_yield(season)
-            decision_support = generate_decision_support(season, predicted_yield)
-            
-            return render_template("auto_yield.html", 
-                                 season=season, 
-                                 season_id=season_id,
-                                 predicted_yield=predicted_yield,
-                                 decision_support=decision_support)
+            return render_auto_yield(season, season_id)
 
         else:
             # Fallback cho CSV
@@ -897,11 +727,12 @@ def auto_yield(season_id):
                 return redirect(url_for("manage"))
             
             df = pd.read_csv(SEASONS_CSV)
-            if int(season_id) >= len(df):
+            row = csv_row(df, season_id)
+            if row is None:
                 flash("Không tìm thấy mùa vụ.", "danger")
                 return redirect(url_for("manage"))
                 
-            season = df.iloc[int(season_id)].to_dict()
+            season = as_season(df.loc[row].to_dict(), season_id)
             
             if request.method == "POST":
                 actual_yield_input = request.form.get("actual_yield")
@@ -909,19 +740,21 @@ def auto_yield(season_id):
                 if actual_yield_input:
                     # Sử dụng giá trị người dùng nhập
                     actual_yield = float(actual_yield_input)
-                    df.at[int(season_id), "actual_yield"] = round(actual_yield, 2)
-                    df.at[int(season_id), "yield_calculated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    df.at[int(season_id), "yield_source"] = "manual"
+                    df.at[row, "actual_yield"] = round(actual_yield, 2)
+                    df.at[row, "yield_calculated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    df.at[row, "yield_source"] = "manual"
                     df.to_csv(SEASONS_CSV, index=False, encoding="utf-8-sig")
+                    bump_data_version()
                     flash(f"✅ Đã lưu năng suất: {round(actual_yield, 2)} tấn", "success")
                 else:
                     # Tự động tính toán
                     predicted_yield = calculate_yield(season)
                     if predicted_yield is not None:
-                        df.at[int(season_id), "actual_yield"] = round(predicted_yield, 2)
-                        df.at[int(season_id), "yield_calculated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        df.at[int(season_id), "yield_source"] = "auto"
+                        df.at[row, "actual_yield"] = round(predicted_yield, 2)
+                        df.at[row, "yield_calculated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                        df.at[row, "yield_source"] = "auto"
                         df.to_csv(SEASONS_CSV, index=False, encoding="utf-8-sig")
+                        bump_data_version()
                         flash(f"✅ Đã tính toán năng suất tự động: {round(predicted_yield, 2)} tấn", "success")
                     else:
                         flash("❌ Không thể tính toán năng suất tự động.", "warning")
@@ -929,17 +762,10 @@ def auto_yield(season_id):
                 
                 return redirect(url_for("manage"))
 
-            predicted_yield = calculate_yield(season)
-            decision_support = generate_decision_support(season, predicted_yield)
-            
-            return render_template("auto_yield.html", 
-                                 season=season, 
-                                 season_id=season_id,
-                                 predicted_yield=predicted_yield,
-                                 decision_support=decision_support)
+            return render_auto_yield(season, season_id)
 
     except Exception as e:
-        flash(f"❌ Lỗi khi tính năng suất: {e}", "danger")
+        flash(storage_error_message(e, "tính năng suất"), "danger")
         return redirect(url_for("manage"))
 
 # ---------- EDIT SEASON ----------
@@ -947,15 +773,17 @@ def auto_yield(season_id):
 @login_required
 def edit_season(id):
     try:
-        if config.USE_FIREBASE and db is not None:
-            doc_ref = db.collection("seasons").document(id)
-            doc = doc_ref.get()
-            if not doc.exists:
+        # Danh sách tỉnh cho form (GET) được đọc song song với mùa vụ
+        fan = Fanout()
+        if request.method == "GET":
+            fan.submit("provinces", load_province_names, default=[])
+
+        if firestore_mode():
+            season = read_season(id, fan)
+            if season is None:
                 flash("Không tìm thấy mùa vụ để chỉnh sửa.", "danger")
                 return redirect(url_for("manage"))
 
-            season = doc.to_dict()
-
             if request.method == "POST":
                 updated_data = {
                     "farmer_name": request.form.get("farmer_name"),
@@ -967,13 +795,13 @@ def edit_season(id):
                     "fertilizer": request.form.get("fertilizer"),
                     "notes": request.form.get("notes")
                 }
-                doc_ref.update(updated_data)
+                write_season(id, "update", updated_data)
+                bump_data_version()
                 flash("✅ Đã cập nhật thông tin mùa vụ (Firebase).", "success")
                 return redirect(url_for("manage"))
 
-            prov_file = os.path.join(os.path.dirname(__file__), "data", "vietnam_provinces_latlon.csv")
-            provinces = list(pd.read_csv(prov_file)['Province']) if os.path.exists(prov_file) else []
-            return render_template("edit_season.html", season=season, provinces=provinces, season_id=id)
+            return render_template("edit_season.html", season=season, provinces=fan.result("provinces"),
+                                   season_id=id)
 
         else:
             # Fallback cho CSV
@@ -981,52 +809,53 @@ def edit_season(id):
                 flash("Không có dữ liệu mùa vụ.", "danger")
                 return redirect(url_for("manage"))
             
-            df = pd.read_csv(SEASONS_CSV)
-            try:
-                season_id_int = int(id)
-                if season_id_int >= len(df):
-                    flash("Không tìm thấy mùa vụ để chỉnh sửa.", "danger")
-                    return redirect(url_for("manage"))
-                
-                season = df.iloc[season_id_int].to_dict()
-                
-                if request.method == "POST":
-                    for field in ["farmer_name", "province", "crop", "area", "sow_date", "harvest_date", "fertilizer", "notes"]:
-                        if field == "area":
-                            df.at[season_id_int, field] = float(request.form.get(field) or 0)
-                        else:
-                            df.at[season_id_int, field] = request.form.get(field)
-                    df.to_csv(SEASONS_CSV, index=False, encoding="utf-8-sig")
-                    flash("✅ Đã cập nhật thông tin mùa vụ (CSV).", "success")
-                    return redirect(url_for("manage"))
+            df = fan.submit("season", pd.read_csv, SEASONS_CSV).result("season")
+            row = csv_row(df, id)
+            if row is None:
+                flash("Không tìm thấy mùa vụ để chỉnh sửa.", "danger")
+                return redirect(url_for("manage"))
 
-                prov_file = os.path.join(os.path.dirname(__file__), "data", "vietnam_provinces_latlon.csv")
-                provinces = list(pd.read_csv(prov_file)['Province']) if os.path.exists(prov_file) else []
-                return render_template("edit_season.html", season=season, provinces=provinces, season_id=id)
-                
-            except ValueError:
-                flash("ID mùa vụ không hợp lệ.", "danger")
+            season = as_season(df.loc[row].to_dict(), id)
+
+            if request.method == "POST":
+                for field in ["farmer_name", "province", "crop", "area", "sow_date", "harvest_date", "fertilizer", "notes"]:
+                    if field == "area":
+                        df.at[row, field] = float(request.form.get(field) or 0)
+                    else:
+                        df.at[row, field] = request.form.get(field)
+                df.to_csv(SEASONS_CSV, index=False, encoding="utf-8-sig")
+                bump_data_version()
+                flash("✅ Đã cập nhật thông tin mùa vụ (CSV).", "success")
                 return redirect(url_for("manage"))
 
+            return render_template("edit_season.html", season=season, provinces=fan.result("provinces"),
+                                   season_id=id)
+
     except Exception as e:
-        flash(f"❌ Lỗi khi chỉnh sửa mùa vụ: {e}", "danger")
+        flash(storage_error_message(e, "chỉnh sửa mùa vụ"), "danger")
         return redirect(url_for("manage"))
 
 # ---------- DELETE SEASON ----------
 @app.route("/manage/delete/<id>")
 @login_required
 def delete_season(id):
-    if config.USE_FIREBASE and db is not None:
+    if firestore_mode():
         try:
-            db.collection("seasons").document(id).delete()
+            write_season(id, "delete")
+            bump_data_version()
             flash("Đã xóa mùa vụ.", "info")
         except Exception as e:
-            flash("Lỗi khi xóa mùa vụ: " + str(e), "danger")
+            flash(storage_error_message(e, "xóa mùa vụ"), "danger")
     else:
         if os.path.exists(SEASONS_CSV):
             df = pd.read_csv(SEASONS_CSV)
-            df = df.drop(int(id))
+            row = csv_row(df, id)
+            if row is None:
+                flash("Không tìm thấy mùa vụ để xóa.", "danger")
+                return redirect(url_for("manage"))
+            df = df.drop(row)
             df.to_csv(SEASONS_CSV, index=False, encoding="utf-8-sig")
+            bump_data_version()
             flash("Đã xóa mùa vụ (CSV).", "info")
     return redirect(url_for("manage"))
 
@@ -1034,11 +863,13 @@ def delete_season(id):
 @app.route("/weather")
 @login_required
 def weather():
-    WEATHER_CSV = "data/weather_all_vn_annual_2000-2023.csv"
-    if not os.path.exists(WEATHER_CSV):
+    # Chuỗi toàn quốc (hoặc ?province=..&from=..&to=..) từ mảng dựng sẵn, mặc định 20 năm gần nhất
+    try:
+        series = get_series_store().query_args(request.args, default_last=20)
+    except (KeyError, SeriesQueryError):
         return render_template("weather.html", weather=[])
-    df = pd.read_csv(WEATHER_CSV, header=None, names=["Year", "TempAvg", "RainfallAnnual", "HumidityAvg"])
-    data = df.tail(20).to_dict(orient="records")  # Giới hạn 20 bản ghi
+    data = [{"Year": year, "TempAvg": t, "RainfallAnnual": r, "HumidityAvg": h}
+            for year, t, r, h in zip(series["years"], series["temp"], series["rain"], series["humidity"])]
     return render_template("weather.html", weather=data)
 
 # ---------- PREDICT ----------
@@ -1071,6 +902,12 @@ def predict():
                             "wind": round(data["wind"]["speed"] * 3.6, 1), 
                             "icon": data["weather"][0]["icon"]
                         }
+                        # Gắn thành phố với tỉnh gần nhất để dùng chuỗi thời tiết theo tỉnh
+                        coord = data.get("coord") or {}
+                        if "lat" in coord and "lon" in coord:
+                            province, distance = province_locator.nearest(coord["lat"], coord["lon"])[0]
+                            weather_data["province"] = province
+                            weather_data["province_distance_km"] = round(distance, 1)
                         flash(f"Đã cập nhật dự báo cho thành phố {data['name']}.", "success")
                     else:
                         flash("Không tìm thấy thành phố. Vui lòng thử lại.", "danger")
@@ -1087,9 +924,9 @@ def predict():
             if model is None:
                 flash("Model chưa load.", "danger")
             else:
-                import numpy as np
                 X = np.array([[temp, rain, humid]])
-                pred = model.predict(X)[0]
+                with metrics.MODEL_INFERENCE.time("yield_model"):
+                    pred = model.predict(X)[0]
                 result = round(float(pred), 2)
                 
     return render_template("predict.html", weather=weather_data, forecast=forecast_data, result=result)
@@ -1103,22 +940,29 @@ def predict():
 def health_check():
     """Endpoint kiểm tra tình trạng hệ thống"""
     try:
-        # Kiểm tra Firebase connection
+        # Trạng thái Firebase lấy từ lần gọi Firestore gần nhất, không gửi thêm query
         if config.USE_FIREBASE and db is not None:
-            try:
-                test_ref = db.collection("seasons").limit(1)
-                list(test_ref.stream())
-                firebase_status = "connected"
-            except Exception as e:
-                firebase_status = f"error: {str(e)}"
+            state = connection_state()
+            firebase_status = state["status"]
+            if state["error"]:
+                firebase_status = f"error: {state['error']}"
+            if not firestore_breaker.allow():
+                firebase_status = ("circuit_open (đọc từ bản sao trong bộ nhớ)" if get_season_replica() is not None
+                                   else "circuit_open (dữ liệu mùa vụ tạm thời không khả dụng)")
+            last_checked = datetime.fromtimestamp(state["checked_at"]).isoformat() if state["checked_at"] else None
         else:
             firebase_status = "disabled"
+            last_checked = None
         
         return jsonify({
             "status": "healthy",
             "timestamp": datetime.now().isoformat(),
             "firebase": firebase_status,
-            "memory_usage": f"{sys.getsizeof([]) / 1024 / 1024:.2f} MB"
+            "firebase_checked_at": last_checked,
+            "firebase_circuit": firestore_breaker.snapshot() if config.USE_FIREBASE else None,
+            "season_replica": season_replica_status(),
+            "write_behind": write_behind_status(),
+            "memory_usage": f"{metrics.process_rss_bytes() / 1024 / 1024:.2f} MB"
         })
     except Exception as e:
         return jsonify({
@@ -1127,28 +971,233 @@ def health_check():
             "timestamp": datetime.now().isoformat()
         }), 500
 
+# ---------- PROMETHEUS METRICS ----------
+@app.route("/metrics")
+def prometheus_metrics():
+    """Metric của tiến trình ở định dạng text Prometheus"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+# ---------- EXPORT SEASONS ----------
+@app.route("/api/seasons/export")
+@login_required
+def api_seasons_export():
+    """
+    Xuất mùa vụ dạng stream: ?format=csv|ndjson
+    Lọc: user, province, crop, date_from, date_to (theo ngày gieo, YYYY-MM-DD)
+    """
+    fmt = request.args.get("format", "csv").lower()
+    if fmt not in ("csv", "ndjson"):
+        return jsonify({"error": "format phải là csv hoặc ndjson"}), 400
+    try:
+        filters = ExportFilters.from_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if firestore_mode():
+        # Xuất luôn query thẳng Firestore; mạch mở -> 503 thay vì xuất seasons.csv (không phải dữ liệu hiện hành)
+        if not firestore_breaker.allow():
+            return jsonify({"error": "Firestore tạm thời không khả dụng, chưa xuất được dữ liệu. Vui lòng thử lại sau."}), 503
+        metrics.set_request_value("firestore_budget_exempt", True)
+        chunks = export_firestore(db, filters, fmt)
+    elif os.path.exists(SEASONS_CSV):
+        chunks = export_csv_file(SEASONS_CSV, filters, fmt)
+    else:
+        chunks = iter(["\ufeff" + ",".join(EXPORT_COLUMNS) + "\n"] if fmt == "csv" else [])
+
+    filename = f"seasons_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    mimetype = "text/csv; charset=utf-8" if fmt == "csv" else "application/x-ndjson; charset=utf-8"
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    response.headers["X-Accel-Buffering"] = "no"  # để nginx không gom cả file trước khi gửi
+    return response
+
+# ---------- IMPORT SEASONS ----------
+@app.route("/api/seasons/import", methods=["POST"])
+@login_required
+def api_seasons_import():
+    """
+    Nhập hàng loạt mùa vụ từ file CSV/XLSX (multipart, field "file").
+    ?dry_run=1 -> chỉ kiểm tra. Trả về báo cáo kèm lỗi theo từng dòng.
+    """
+    upload = request.files.get("file")
+    if upload is None or not upload.filename:
+        return jsonify({"error": "Chưa chọn file"}), 400
+    dry_run = request.args.get("dry_run") in ("1", "true")
+    target_db = db if firestore_mode() else None
+    try:
+        report = import_seasons(upload.stream, session.get("user"), filename=upload.filename,
+                                db=target_db, csv_path=SEASONS_CSV, dry_run=dry_run)
+    except SeasonImportError as e:
+        return jsonify({"error": str(e)}), 400
+    except SeasonWriteError as e:
+        # Các batch trước đã commit: báo số đã ghi + dòng lỗi; id theo nội dung dòng nên tải lại file không nhân đôi
+        print(f"❌ Lỗi nhập mùa vụ: {e}")
+        if e.written:
+            bump_data_version()
+        return jsonify({
+            "error": f"Lỗi khi ghi dữ liệu: {e.error}. Có thể tải lại cùng file, các dòng đã ghi không bị nhân đôi.",
+            "written": e.written,
+            "failed_rows": {"from": e.failed_rows[0], "to": e.failed_rows[1]},
+        }), 503 if is_outage(e.error) else 500
+    except Exception as e:
+        print(f"❌ Lỗi nhập mùa vụ: {e}")
+        if is_outage(e):
+            return jsonify({"error": f"Firestore tạm thời không khả dụng, chưa nhập dữ liệu: {e}"}), 503
+        return jsonify({"error": f"Lỗi khi ghi dữ liệu: {e}"}), 500
+    if report["written"]:
+        bump_data_version()
+    return jsonify(report)
+
+# ---------- NEAREST PROVINCE ----------
+def _province_climate(name):
+    """Khí hậu trung bình nhiều năm (NASA) của tỉnh, None nếu không có dữ liệu"""
+    features = weather_index.lookup(name, None)
+    if features is None:
+        return None
+    return {"temp": round(features.temp_normal, 2), "rain": round(features.rain_normal, 1),
+            "humidity": round(features.humidity_normal, 2)}
+
+@app.route("/api/nearest_province", methods=["GET", "POST"])
+@login_required
+def api_nearest_province():
+    """
+    Tỉnh gần nhất cho tọa độ.
+    GET ?lat=..&lon=..&k=3 -> một điểm; POST {"points": [[lat, lon], ...], "k": 1} -> theo lô.
+    """
+    try:
+        if request.method == "POST":
+            payload = request.get_json(silent=True) or {}
+            points = payload.get("points") or []
+            k = int(payload.get("k", 1))
+            if not points:
+                return jsonify({"error": "Thiếu points"}), 400
+            lats, lons = zip(*points)
+            result = province_locator.nearest_many(lats, lons, k)
+            return jsonify({
+                "provinces": result["provinces"].tolist(),
+                "distances_km": result["distances_km"].round(2).tolist(),
+            })
+
+        lat = float(request.args["lat"])
+        lon = float(request.args["lon"])
+        k = int(request.args.get("k", 1))
+        nearest = province_locator.nearest(lat, lon, k)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Tọa độ không hợp lệ: {e}"}), 400
+    return jsonify({
+        "lat": lat,
+        "lon": lon,
+        "nearest": [{"province": name, "distance_km": round(d, 2), "climate": _province_climate(name)}
+                    for name, d in nearest],
+    })
+
+# ---------- NỘI SUY KHÍ HẬU THEO TỌA ĐỘ ----------
+@app.route("/api/climate/interpolate", methods=["GET", "POST"])
+@login_required
+def api_climate_interpolate():
+    """
+    Khí hậu nội suy (IDW từ các tỉnh gần nhất) tại tọa độ ruộng.
+    GET ?lat=..&lon=..&year=.. -> một điểm;
+    POST {"points": [[lat, lon], ...], "year": 2020 | "years": [...], "series": [2015, ..., 2023]} -> theo lô.
+    "years" là năm riêng cho từng điểm; "series" trả về chuỗi nhiều năm cho mỗi điểm.
+    ?encoding=f32 -> mảng kết quả dạng base64 float32 (gọn hơn cho lô lớn).
+    """
+    interpolator = get_climate_interpolator()
+    try:
+        encoding = compression.parse_encoding(request.args.get("encoding"))
+        if request.method == "POST":
+            payload = request.get_json(silent=True) or {}
+            points = payload.get("points") or []
+            if not points:
+                return jsonify({"error": "Thiếu points"}), 400
+            lats, lons = zip(*points)
+            if payload.get("series"):
+                series = [int(y) for y in payload["series"]]
+                values = interpolator.interpolate_series(lats, lons, series)
+                return jsonify({"years": series, **as_records(values, encoding)})
+            years = payload.get("years", payload.get("year"))
+            values = interpolator.interpolate(lats, lons, years)
+            return jsonify(as_records(values, encoding))
+
+        lat = float(request.args["lat"])
+        lon = float(request.args["lon"])
+        year = request.args.get("year", type=int)
+        values = interpolator.interpolate([lat], [lon], year)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Dữ liệu không hợp lệ: {e}"}), 400
+    record = {name: column[0] for name, column in as_records(values).items()}
+    return jsonify({"lat": lat, "lon": lon, "year": year, **record})
+
+# ---------- KỊCH BẢN WHAT-IF ----------
+@app.route("/api/scenarios/yield_surface")
+@login_required
+def api_yield_surface():
+    """
+    Bề mặt năng suất của mô hình theo độ lệch thời tiết so với khí hậu trung bình.
+    ?temp_shift=-2,2,9&rain_pct=-30,30,7&humidity_shift=0   (start,stop,steps hoặc một giá trị)
+    &province=An Giang,Hà Nội | all   (bỏ trống -> trung bình cả nước)
+    &encoding=json|f32
+    Trả về shape [tỉnh, T, R, H] và mảng yield phẳng (tấn/ha, row-major).
+    """
+    if model is None:
+        return jsonify({"error": "Model chưa load"}), 503
+    try:
+        grid = grid_from_args(request.args)
+        encoding = compression.parse_encoding(request.args.get("encoding"))
+        province_arg = (request.args.get("province") or "").strip()
+        if province_arg.lower() == "all":
+            provinces = weather_index.provinces
+        else:
+            provinces = [p.strip() for p in province_arg.split(",") if p.strip()]
+        body = surface_json(model, MODEL_VERSION, weather_index, grid, provinces, encoding)
+        compression.mark_cacheable()
+        return Response(body, mimetype="application/json")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+# ---------- FIRESTORE READ PROFILE ----------
+@app.route("/api/firestore_profile")
+@login_required
+def api_firestore_profile():
+    """Số document/byte Firestore đọc-ghi theo route và các query nặng nhất"""
+    return jsonify({
+        "read_budget": config.FIRESTORE_READ_BUDGET,
+        "read_budget_mode": config.FIRESTORE_READ_BUDGET_MODE,
+        "routes": route_profile(),
+        "heaviest_queries": heaviest_queries(),
+    })
+
 # ---------- WEATHER CHART (HOME) ----------
 @app.route("/api/weather_chart_home")
 @login_required
 def api_weather_chart_home():
-    weather_path = os.path.join(os.getcwd(), "data", "weather_all_vn_annual_2000-2023.csv")
-    if not os.path.exists(weather_path):
-        return jsonify({"error": "Không tìm thấy file thời tiết"}), 404
-
+    # Mặc định 10 năm gần nhất của chuỗi toàn quốc; nhận cùng tham số với /api/weather_series
     try:
-        df = pd.read_csv(weather_path, header=None, names=["Year", "TempAvg", "RainfallAnnual", "HumidityAvg"])
-        df = df.tail(10)  # Chỉ lấy 10 năm gần nhất
-        df = df.dropna().sort_values("Year")
-
-        out = {
-            "years": df["Year"].tolist(),
-            "temp": df["TempAvg"].tolist(),
-            "rain": df["RainfallAnnual"].tolist(),
-            "humidity": df["HumidityAvg"].tolist()
-        }
-        return jsonify(out)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        series = get_series_store().query_args(request.args, default_last=10)
+        compression.mark_cacheable()
+        return jsonify(series)
+    except KeyError:
+        return jsonify({"error": "Không có dữ liệu thời tiết"}), 404
+    except SeriesQueryError as e:
+        return jsonify({"error": str(e)}), 400
+
+# ---------- WEATHER SERIES (TỈNH / KHOẢNG NĂM) ----------
+@app.route("/api/weather_series")
+@login_required
+def api_weather_series():
+    """
+    Chuỗi thời tiết năm cho biểu đồ.
+    ?province=An Giang (bỏ trống = toàn quốc)&from=2010&to=2030&vars=temp,rain&bucket=5&max_points=12&last=10
+    &encoding=json|f32. Năm sau chuỗi NASA là năm dự báo (forecast = true).
+    """
+    try:
+        series = get_series_store().query_args(request.args)
+        compression.mark_cacheable()
+        return jsonify(series)
+    except KeyError:
+        return jsonify({"error": f"Không có dữ liệu thời tiết cho tỉnh {request.args.get('province')}"}), 404
+    except SeriesQueryError as e:
+        return jsonify({"error": str(e)}), 400
 
 # ---------- YIELD CHART (FAO) ----------
 @app.route("/api/yield_chart")
@@ -1162,20 +1211,43 @@ def api_yield_chart():
     return jsonify(out)
 
 # =========================================================
-#               GRACEFUL SHUTDOWN
+#               APPLICATION FACTORY
 # =========================================================
+# Chạy nhiều tiến trình (xem gunicorn.conf.py):
+#   gunicorn -c gunicorn.conf.py wsgi:app
+# Master import wsgi.py -> create_app(storage=False): mô hình, chỉ mục thời tiết, chuỗi biểu đồ... được nạp
+# MỘT lần trước fork, các worker dùng chung trang bộ nhớ (copy-on-write). Sau fork mỗi worker gọi
+# init_storage() để có Firestore client riêng.
+
+def preload():
+    """Dựng trước các cấu trúc chỉ đọc còn nạp lười (gọi ở master, trước fork)"""
+    get_series_store()
+    get_climate_interpolator()
+    get_risk_simulator()
 
-def signal_handler(sig, frame):
-    print('\n👋 Ứng dụng đang dừng...')
-    sys.exit(0)
 
-signal.signal(signal.SIGINT, signal_handler)
+def create_app(storage=True):
+    """
+    Trả về Flask app đã sẵn sàng phục vụ.
+    storage=False: chưa kết nối Firestore - dùng khi server fork worker sau khi nạp app.
+    """
+    preload()
+    if storage:
+        init_storage()
+    return app
 
 # =========================================================
 #               APPLICATION START
 # =========================================================
 
+def signal_handler(sig, frame):
+    print('\n👋 Ứng dụng đang dừng...')
+    sys.exit(0)
+
+
 if __name__ == "__main__":
+    # Chỉ cài handler khi chạy trực tiếp: gunicorn tự quản lý tín hiệu của master/worker
+    signal.signal(signal.SIGINT, signal_handler)
     print("🚀 Starting AgriConnect Application...")
     print("📍 Health Check: http://localhost:5000/api/health")
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
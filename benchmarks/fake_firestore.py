@@ -0,0 +1,295 @@
+# fake_firestore.py
+# Firestore giả lập trong bộ nhớ cho load test / benchmark: đủ các API mà app.py đang dùng
+# (collection/document/add/get/update/delete, where/order_by/limit/start_after/stream, on_snapshot của
+# collection). Có thể thêm độ trễ giả lập cho mỗi lần gọi để gần với Firestore thật qua mạng; tham số
+# retry/timeout của RPC được nhận nhưng bỏ qua. An toàn khi dùng đa luồng.
+import copy
+import datetime
+import enum
+import threading
+import time
+import uuid
+
+DESCENDING = "DESCENDING"
+ASCENDING = "ASCENDING"
+
+ChangeType = enum.Enum("ChangeType", "ADDED MODIFIED REMOVED")
+
+
+class FakeDocumentSnapshot:
+
+    def __init__(self, doc_id, data, reference):
+        self.id = doc_id
+        self._data = data
+        self.reference = reference
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+
+class FakeDocumentReference:
+
+    def __init__(self, collection, doc_id):
+        self._collection = collection
+        self.id = doc_id
+
+    def get(self, **_options):
+        self._collection._client._rpc("read")
+        with self._collection._client._lock:
+            data = self._collection._docs.get(self.id)
+            return FakeDocumentSnapshot(self.id, copy.deepcopy(data) if data is not None else None, self)
+
+    def set(self, data, merge=False, **_options):
+        self._collection._client._rpc("write")
+        with self._collection._client._lock:
+            if merge and self.id in self._collection._docs:
+                self._collection._docs[self.id].update(copy.deepcopy(data))
+            else:
+                self._collection._docs[self.id] = copy.deepcopy(data)
+        self._collection._changed([self.id])
+
+    def update(self, data, **_options):
+        self._collection._client._rpc("write")
+        with self._collection._client._lock:
+            if self.id not in self._collection._docs:
+                raise KeyError(f"No document to update: {self._collection.id}/{self.id}")
+            self._collection._docs[self.id].update(copy.deepcopy(data))
+        self._collection._changed([self.id])
+
+    def delete(self, **_options):
+        self._collection._client._rpc("write")
+        with self._collection._client._lock:
+            self._collection._docs.pop(self.id, None)
+        self._collection._changed([self.id])
+
+
+_OPERATORS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "in": lambda a, b: a in b,
+}
+
+
+class FakeQuery:
+
+    def __init__(self, collection, order=None, limit=None, filters=(), cursor=None):
+        self._collection = collection
+        self._order = order
+        self._limit = limit
+        self._filters = tuple(filters)
+        self._cursor = cursor
+
+    def _copy(self, **changes):
+        state = {"order": self._order, "limit": self._limit, "filters": self._filters, "cursor": self._cursor}
+        state.update(changes)
+        return FakeQuery(self._collection, **state)
+
+    def where(self, field, op, value):
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field, direction=ASCENDING):
+        return self._copy(order=(field, str(direction).upper()))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, snapshot):
+        return self._copy(cursor=snapshot)
+
+    def _sort_key(self, field):
+        if field == "__name__":
+            return lambda item: item[0]
+        return lambda item: item[1][field]
+
+    def stream(self, **_options):
+        client = self._collection._client
+        client._rpc("read")
+        with client._lock:
+            items = [(doc_id, copy.deepcopy(data)) for doc_id, data in self._collection._docs.items()]
+        for field, op, value in self._filters:
+            items = [item for item in items if _OPERATORS[op](item[1].get(field), value)]
+        if self._order:
+            field, direction = self._order
+            if field != "__name__":
+                # Firestore bỏ qua document không có trường dùng để sắp xếp
+                items = [item for item in items if item[1].get(field) is not None]
+            key = self._sort_key(field)
+            reverse = direction.endswith(DESCENDING)
+            items.sort(key=key, reverse=reverse)
+            if self._cursor is not None:
+                after = key((self._cursor.id, self._cursor.to_dict() or {}))
+                items = [item for item in items if (key(item) < after if reverse else key(item) > after)]
+        if self._limit is not None:
+            items = items[:self._limit]
+        client.documents_read += len(items)
+        for doc_id, data in items:
+            yield FakeDocumentSnapshot(doc_id, data, FakeDocumentReference(self._collection, doc_id))
+
+    def get(self, **options):
+        return list(self.stream(**options))
+
+
+class FakeCollectionReference(FakeQuery):
+
+    def __init__(self, client, name):
+        super().__init__(self)
+        self._client = client
+        self.id = name
+        self._docs = {}
+        self._watches = []
+
+    def on_snapshot(self, callback):
+        """Listener: snapshot đầu tiên (toàn bộ collection) gọi ngay, sau đó mỗi lần ghi gọi với các thay đổi"""
+        watch = FakeWatch(self, callback)
+        with self._client._lock:
+            self._watches.append(watch)
+        watch.push(list(self._docs))
+        return watch
+
+    def _changed(self, doc_ids):
+        with self._client._lock:
+            watches = list(self._watches)
+        for watch in watches:
+            watch.push(doc_ids)
+
+    def document(self, doc_id=None):
+        return FakeDocumentReference(self, doc_id or uuid.uuid4().hex[:20])
+
+    def add(self, data, **_options):
+        ref = self.document()
+        ref.set(data)
+        return None, ref
+
+
+class FakeWriteBatch:
+    """Gom thao tác ghi, commit() là một RPC (giống WriteBatch của Firestore, tối đa 500 thao tác)"""
+
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def set(self, reference, data, merge=False):
+        self._ops.append(("set", reference, copy.deepcopy(data), merge))
+
+    def update(self, reference, data):
+        self._ops.append(("update", reference, copy.deepcopy(data), False))
+
+    def delete(self, reference):
+        self._ops.append(("delete", reference, None, False))
+
+    def commit(self, **_options):
+        if len(self._ops) > 500:
+            raise ValueError("Batch vượt quá 500 thao tác")
+        self._client._rpc("write")
+        changed = {}
+        with self._client._lock:
+            for op, reference, data, merge in self._ops:
+                changed.setdefault(reference._collection, []).append(reference.id)
+                docs = reference._collection._docs
+                if op == "delete":
+                    docs.pop(reference.id, None)
+                elif op == "update" or (merge and reference.id in docs):
+                    docs[reference.id].update(data)
+                else:
+                    docs[reference.id] = data
+        self._ops = []
+        for collection, doc_ids in changed.items():
+            collection._changed(doc_ids)
+
+
+class FakeDocumentChange:
+
+    def __init__(self, kind, document):
+        self.type = kind
+        self.document = document
+
+
+class FakeWatch:
+    """Kết quả của on_snapshot: gọi callback(documents, changes, read_time) đồng bộ sau mỗi lần ghi"""
+
+    def __init__(self, collection, callback):
+        self._collection = collection
+        self._callback = callback
+        self._known = set()
+        self.is_active = True
+
+    def push(self, doc_ids):
+        if not self.is_active:
+            return
+        changes = []
+        with self._collection._client._lock:
+            for doc_id in dict.fromkeys(doc_ids):
+                data = self._collection._docs.get(doc_id)
+                reference = FakeDocumentReference(self._collection, doc_id)
+                if data is None:
+                    if doc_id in self._known:
+                        self._known.discard(doc_id)
+                        changes.append(FakeDocumentChange(ChangeType.REMOVED, FakeDocumentSnapshot(doc_id, None, reference)))
+                    continue
+                kind = ChangeType.MODIFIED if doc_id in self._known else ChangeType.ADDED
+                self._known.add(doc_id)
+                changes.append(FakeDocumentChange(kind, FakeDocumentSnapshot(doc_id, copy.deepcopy(data), reference)))
+        self._callback([change.document for change in changes], changes, datetime.datetime.now(datetime.timezone.utc))
+
+    def unsubscribe(self):
+        self.is_active = False
+        with self._collection._client._lock:
+            if self in self._collection._watches:
+                self._collection._watches.remove(self)
+
+
+class FakeFirestoreClient:
+    """
+    Thay thế firestore.client() khi load test.
+    - latency_ms: độ trễ giả lập cho mỗi RPC (đọc/ghi)
+    - rpc_counts / documents_read: thống kê số lần gọi và số document đã đọc
+    """
+
+    def __init__(self, latency_ms=0.0):
+        self.latency = latency_ms / 1000.0
+        self._lock = threading.RLock()
+        self._collections = {}
+        self.rpc_counts = {"read": 0, "write": 0}
+        self.documents_read = 0
+        self.outage = None  # gán một exception -> mọi RPC ném lỗi đó (giả lập Firestore mất kết nối)
+
+    def _rpc(self, kind):
+        with self._lock:
+            self.rpc_counts[kind] += 1
+        if self.outage is not None:
+            if self.latency:
+                time.sleep(self.latency)
+            raise self.outage
+        if self.latency:
+            time.sleep(self.latency)
+
+    def collection(self, name):
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = FakeCollectionReference(self, name)
+            return self._collections[name]
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def load(self, collection, records):
+        """Nạp sẵn dữ liệu (không tính độ trễ); trả về danh sách id"""
+        col = self.collection(collection)
+        ids = []
+        with self._lock:
+            for record in records:
+                doc_id = uuid.uuid4().hex[:20]
+                col._docs[doc_id] = copy.deepcopy(record)
+                ids.append(doc_id)
+        return ids
@@ -0,0 +1,243 @@
+# load_test.py
+# Load test cấp route cho app.py mà không cần Firebase thật:
+#   - Firestore: bản giả lập trong bộ nhớ (fake_firestore.py) hoặc Firestore Emulator (--emulator)
+#   - Đăng nhập: stub identity endpoint cục bộ, app gọi tới qua FIREBASE_AUTH_EMULATOR_HOST
+#   - App chạy trên server đa luồng của werkzeug, client gửi request HTTP thật song song
+#
+# Cách dùng:
+#   python benchmarks/load_test.py                                  # 5k mùa vụ, concurrency 1/4/16
+#   python benchmarks/load_test.py --seasons 20000 --concurrency 1 8 32 --requests 400
+#   python benchmarks/load_test.py --latency-ms 30                  # giả lập độ trễ mạng Firestore
+#   python benchmarks/load_test.py --emulator 127.0.0.1:8080        # dùng Firestore Emulator
+#   python benchmarks/load_test.py --output load.json
+import argparse
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(BENCH_DIR)
+for path in (BASE_DIR, BENCH_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import numpy as np  # noqa: E402
+import requests  # noqa: E402
+
+import synthetic  # noqa: E402
+from fake_firestore import FakeFirestoreClient  # noqa: E402
+
+ROUTES = ["/", "/overview", "/manage", "/manage/yield/<id>"]
+LOAD_USER = "loadtest@example.com"
+
+
+# =========================================================
+#               STUB IDENTITY ENDPOINT
+# =========================================================
+
+class _IdentityHandler(BaseHTTPRequestHandler):
+    """Trả lời accounts:signInWithPassword như Firebase Auth Emulator: mọi tài khoản đều hợp lệ"""
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if "accounts:signInWithPassword" not in self.path:
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = json.dumps({
+            "kind": "identitytoolkit#VerifyPasswordResponse",
+            "email": payload.get("email"),
+            "localId": "load-test",
+            "idToken": f"stub-token-{payload.get('email')}",
+            "registered": True,
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_identity_stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _IdentityHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"127.0.0.1:{server.server_address[1]}"
+
+
+# =========================================================
+#               KHỞI ĐỘNG APP
+# =========================================================
+
+def _emulator_client(host, project):
+    os.environ["FIRESTORE_EMULATOR_HOST"] = host
+    from google.auth.credentials import AnonymousCredentials
+    from google.cloud import firestore as gcf
+    return gcf.Client(project=project, credentials=AnonymousCredentials())
+
+
+def _seed(client, records):
+    """Nạp dữ liệu mùa vụ; trả về danh sách id document"""
+    if isinstance(client, FakeFirestoreClient):
+        return client.load("seasons", records)
+    ids = []
+    collection = client.collection("seasons")
+    for start in range(0, len(records), 500):
+        batch = client.batch()
+        for record in records[start:start + 500]:
+            ref = collection.document()
+            batch.set(ref, record)
+            ids.append(ref.id)
+        batch.commit()
+    return ids
+
+
+def boot_app(db, auth_host, replica=False):
+    """
+    Nạp app.py với Firestore đã cho và stub đăng nhập; chạy trên server đa luồng.
+    USE_FIREBASE được tắt trong lúc import để app không kết nối project Firebase thật.
+    """
+    from werkzeug.serving import make_server
+
+    import config
+    config.USE_FIREBASE = False
+    config.FIREBASE_AUTH_EMULATOR_HOST = auth_host
+    import app as web
+    config.USE_FIREBASE = True
+    config.SEASON_REPLICA_ENABLED = replica
+    web.init_storage(db)
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # không in log từng request
+    server = make_server("127.0.0.1", 0, web.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def login_session(base_url):
+    session = requests.Session()
+    r = session.post(f"{base_url}/login", data={"username": LOAD_USER, "password": "load-test"},
+                     allow_redirects=False, timeout=30)
+    if r.status_code != 302 or "/login" in r.headers.get("Location", ""):
+        raise RuntimeError(f"Đăng nhập load test thất bại (HTTP {r.status_code})")
+    return session
+
+
+# =========================================================
+#               TẠO TẢI
+# =========================================================
+
+def run_level(base_url, route, concurrency, total_requests, season_ids):
+    """Gửi total_requests request tới route với concurrency luồng; trả về thống kê độ trễ"""
+    sessions = [login_session(base_url) for _ in range(concurrency)]
+    ids = itertools.cycle(season_ids or ["missing"])
+    id_lock = threading.Lock()
+    per_worker = max(1, total_requests // concurrency)
+
+    def worker(session):
+        latencies, errors = [], 0
+        for _ in range(per_worker):
+            path = route
+            if "<id>" in route:
+                with id_lock:
+                    path = route.replace("<id>", next(ids))
+            t = time.perf_counter()
+            try:
+                r = session.get(base_url + path, allow_redirects=False, timeout=60)
+                ok = r.status_code == 200
+            except requests.RequestException:
+                ok = False
+            latencies.append(time.perf_counter() - t)
+            errors += 0 if ok else 1
+        return latencies, errors
+
+    t_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(worker, sessions))
+    wall = time.perf_counter() - t_start
+    for s in sessions:
+        s.close()
+
+    latencies = np.array([x for lat, _ in outcomes for x in lat]) * 1000
+    errors = sum(e for _, e in outcomes)
+    return {
+        "route": route,
+        "concurrency": concurrency,
+        "requests": int(latencies.size),
+        "errors": int(errors),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        "max_ms": round(float(latencies.max()), 2),
+        "throughput_rps": round(latencies.size / wall, 1),
+    }
+
+
+def print_table(results):
+    print("\n" + "=" * 86)
+    print(f"{'route':<22} {'conc':>5} {'reqs':>6} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9}")
+    for r in results:
+        print(f"{r['route']:<22} {r['concurrency']:>5} {r['requests']:>6} {r['errors']:>5} "
+              f"{r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['throughput_rps']:>9.1f}")
+    print("=" * 86)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test các route Flask với Firestore giả lập")
+    parser.add_argument("--seasons", type=int, default=5000, help="Số mùa vụ nạp sẵn")
+    parser.add_argument("--concurrency", nargs="*", type=int, default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=200, help="Số request cho mỗi (route, concurrency)")
+    parser.add_argument("--routes", nargs="*", default=ROUTES)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Độ trễ giả lập mỗi RPC Firestore")
+    parser.add_argument("--emulator", help="HOST:PORT của Firestore Emulator (mặc định dùng bản giả lập)")
+    parser.add_argument("--project", default="demo-agriconnect")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--replica", action="store_true", help="Bật bản sao seasons trong bộ nhớ (on_snapshot)")
+    parser.add_argument("--output", help="Ghi kết quả JSON ra file")
+    args = parser.parse_args(argv)
+
+    db = _emulator_client(args.emulator, args.project) if args.emulator else FakeFirestoreClient(args.latency_ms)
+    records = synthetic.generate_season_records(args.seasons, seed=args.seed)
+    season_ids = _seed(db, records)
+    print(f"📦 Đã nạp {len(season_ids):,} mùa vụ vào {'Firestore Emulator' if args.emulator else 'Firestore giả lập'}")
+
+    auth_server, auth_host = start_identity_stub()
+    server, base_url = boot_app(db, auth_host, replica=args.replica)
+    print(f"🚀 App: {base_url}  |  identity stub: {auth_host}")
+
+    results = []
+    try:
+        for concurrency in args.concurrency:
+            for route in args.routes:
+                result = run_level(base_url, route, concurrency, args.requests, season_ids)
+                results.append(result)
+                print(f"   {route:<22} c={concurrency:<3} p50 {result['p50_ms']:.1f}ms  "
+                      f"p99 {result['p99_ms']:.1f}ms  {result['throughput_rps']:.1f} req/s")
+    finally:
+        server.shutdown()
+        auth_server.shutdown()
+
+    print_table(results)
+    if args.output:
+        payload = {
+            "meta": {"created_at": datetime.now().isoformat(timespec="seconds"), "seasons": args.seasons,
+                     "latency_ms": args.latency_ms, "replica": args.replica, "backend": "emulator" if args.emulator else "fake"},
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        print(f"💾 Đã ghi kết quả: {args.output}")
+    return 1 if any(r["errors"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,407 @@
+# run_benchmarks.py
+# Benchmark các đường xử lý nóng của ứng dụng trên dữ liệu giả lập (benchmarks/synthetic.py):
+#   - yield:   calculate_yield (từng mùa vụ), calculate_yields (theo lô), generate_decision_support
+#   - stats:   parse document -> Season (season_model), tổng hợp thống kê trang /overview (aggregate_season_stats)
+#   - routes:  các route CRUD chế độ CSV và API biểu đồ qua Flask test client (không dùng Firebase)
+#   - model:   dự đoán bằng mô hình thời tiết -> năng suất
+#
+# Cách dùng:
+#   python benchmarks/run_benchmarks.py                         # 10k mùa vụ, so với baseline.json
+#   python benchmarks/run_benchmarks.py --sizes 10000 100000 1000000
+#   python benchmarks/run_benchmarks.py --only yield --output results.json
+#   python benchmarks/run_benchmarks.py --save-baseline          # ghi đè baseline.json
+#
+# Mã thoát 1 nếu có benchmark chậm hơn baseline quá ngưỡng --tolerance (mặc định 25%).
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(BENCH_DIR)
+for path in (BASE_DIR, BENCH_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import numpy as np  # noqa: E402
+
+import synthetic  # noqa: E402
+from season_model import Season  # noqa: E402
+from yield_engine import calculate_yield, calculate_yields, generate_decision_support  # noqa: E402
+
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_SIZES = [10_000]
+
+# Số lần gọi tối đa cho các benchmark đo từng thao tác (để 1M mùa vụ vẫn chạy trong thời gian hợp lý)
+SCALAR_CAP = 20_000
+DECISION_CAP = 5_000
+
+
+# =========================================================
+#               NGỮ CẢNH & ĐĂNG KÝ BENCHMARK
+# =========================================================
+
+class Context:
+    """Dữ liệu dùng chung cho mọi benchmark ở một kích thước"""
+
+    def __init__(self, size, seed, tmp_dir):
+        self.size = size
+        self.seed = seed
+        self.tmp_dir = tmp_dir
+        self.frame = synthetic.generate_seasons(size, seed=seed)
+        self.records = self.frame.to_dict(orient="records")
+        # App parse document thành Season một lần khi nạp dữ liệu -> các benchmark tính toán nhận Season
+        self.seasons = [Season.from_dict(record, str(i)) for i, record in enumerate(self.records)]
+        self._web = None
+
+    @property
+    def seasons_csv(self):
+        return os.path.join(self.tmp_dir, "seasons.csv")
+
+    def write_seasons_csv(self):
+        self.frame.to_csv(self.seasons_csv, index=False, encoding="utf-8-sig")
+
+    def web(self):
+        """
+        Nạp app.py ở chế độ offline (CSV) với dữ liệu trong thư mục tạm.
+        Trả về (module app, test client đã đăng nhập).
+        """
+        if self._web is None:
+            import config
+            config.USE_FIREBASE = False
+            # Render cache tắt mặc định để các benchmark route đo render thật;
+            # benchmark *_cached tự bật khi chạy
+            config.RENDER_CACHE_ENABLED = False
+            config.RENDER_CACHE_PATH = os.path.join(self.tmp_dir, "render_cache.sqlite")
+            import app as web
+            web.db = None
+            web.DATA_DIR = self.tmp_dir
+            web.SEASONS_CSV = self.seasons_csv
+            web.app._session_cleared = True
+            client = web.app.test_client()
+            with client.session_transaction() as sess:
+                sess["user"] = "bench@example.com"
+            self._web = (web, client)
+        return self._web
+
+
+BENCHMARKS = []
+
+
+def benchmark(name, group):
+    """
+    Đăng ký một benchmark. Hàm nhận Context, chuẩn bị dữ liệu (không tính giờ)
+    và trả về (số thao tác, hàm cần đo).
+    """
+    def decorator(fn):
+        BENCHMARKS.append({"name": name, "group": group, "setup": fn})
+        return fn
+    return decorator
+
+
+# =========================================================
+#               YIELD ENGINE
+# =========================================================
+
+@benchmark("calculate_yield", "yield")
+def bench_calculate_yield(ctx):
+    seasons = ctx.seasons[:SCALAR_CAP]
+
+    def run():
+        for season in seasons:
+            calculate_yield(season)
+    return len(seasons), run
+
+
+@benchmark("calculate_yields_batch", "yield")
+def bench_calculate_yields(ctx):
+    return len(ctx.seasons), lambda: calculate_yields(ctx.seasons)
+
+
+@benchmark("generate_decision_support", "yield")
+def bench_decision_support(ctx):
+    seasons = ctx.seasons[:DECISION_CAP]
+
+    def run():
+        for season in seasons:
+            generate_decision_support(season, season.actual_yield)
+    return len(seasons), run
+
+
+# =========================================================
+#               OVERVIEW
+# =========================================================
+
+@benchmark("season_parse", "stats")
+def bench_season_parse(ctx):
+    return len(ctx.records), lambda: [Season.from_dict(record) for record in ctx.records]
+
+
+@benchmark("overview_aggregation", "stats")
+def bench_overview_aggregation(ctx):
+    web, _ = ctx.web()
+    return len(ctx.seasons), lambda: web.aggregate_season_stats(ctx.seasons)
+
+
+# =========================================================
+#               ROUTES (CSV + API BIỂU ĐỒ)
+# =========================================================
+
+def _route_bench(ctx, ops, request):
+    _, client = ctx.web()
+    ctx.write_seasons_csv()
+
+    def run():
+        for i in range(ops):
+            response = request(client, i)
+            if response.status_code >= 500:
+                raise RuntimeError(f"HTTP {response.status_code}")
+    return ops, run
+
+
+def _season_form(i):
+    return {
+        "farmer_name": f"Bench {i}", "province": "AnGiang", "crop": "lúa", "area": "2.5",
+        "sow_date": "2023-01-10", "harvest_date": "2023-04-20", "fertilizer": "NPK", "notes": "",
+    }
+
+
+@benchmark("route_manage_list_csv", "routes")
+def bench_manage_list(ctx):
+    return _route_bench(ctx, 20, lambda c, i: c.get("/manage"))
+
+
+@benchmark("route_manage_add_csv", "routes")
+def bench_manage_add(ctx):
+    return _route_bench(ctx, 10, lambda c, i: c.post("/manage", data=_season_form(i)))
+
+
+@benchmark("route_manage_edit_csv", "routes")
+def bench_manage_edit(ctx):
+    return _route_bench(ctx, 10, lambda c, i: c.post(f"/manage/edit/{i}", data=_season_form(i)))
+
+
+@benchmark("route_manage_delete_csv", "routes")
+def bench_manage_delete(ctx):
+    return _route_bench(ctx, 10, lambda c, i: c.get(f"/manage/delete/{i}"))
+
+
+@benchmark("route_auto_yield_csv", "routes")
+def bench_auto_yield(ctx):
+    return _route_bench(ctx, 20, lambda c, i: c.get(f"/manage/yield/{i}"))
+
+
+@benchmark("route_overview_csv", "routes")
+def bench_overview_route(ctx):
+    return _route_bench(ctx, 3, lambda c, i: c.get("/overview"))
+
+
+def _cached_route_bench(ctx, ops, path):
+    """Xem lặp lại một trang khi render cache bật (lần đầu render để làm ấm, không tính giờ)"""
+    import config
+    _, client = ctx.web()
+    ctx.write_seasons_csv()
+    with client.session_transaction() as sess:
+        sess.pop("_flashes", None)
+
+    def run():
+        config.RENDER_CACHE_ENABLED = True
+        try:
+            for _ in range(ops):
+                response = client.get(path)
+                if response.status_code >= 500:
+                    raise RuntimeError(f"HTTP {response.status_code}")
+        finally:
+            config.RENDER_CACHE_ENABLED = False
+
+    config.RENDER_CACHE_ENABLED = True
+    try:
+        client.get(path)
+    finally:
+        config.RENDER_CACHE_ENABLED = False
+    return ops, run
+
+
+@benchmark("route_manage_cached", "routes")
+def bench_manage_cached(ctx):
+    return _cached_route_bench(ctx, 200, "/manage")
+
+
+@benchmark("route_overview_cached", "routes")
+def bench_overview_cached(ctx):
+    return _cached_route_bench(ctx, 200, "/overview")
+
+
+@benchmark("api_weather_chart_home", "routes")
+def bench_weather_chart(ctx):
+    return _route_bench(ctx, 200, lambda c, i: c.get("/api/weather_chart_home"))
+
+
+@benchmark("api_yield_chart", "routes")
+def bench_yield_chart(ctx):
+    return _route_bench(ctx, 200, lambda c, i: c.get("/api/yield_chart"))
+
+
+# =========================================================
+#               MODEL
+# =========================================================
+
+def _load_model():
+    """Mô hình thật (data/yield_model.pkl) nếu có, nếu không thì huấn luyện nhanh từ file gộp"""
+    import joblib
+    model_path = os.path.join(BASE_DIR, "data", "yield_model.pkl")
+    if os.path.exists(model_path):
+        return joblib.load(model_path)
+    import pandas as pd
+    from sklearn.linear_model import LinearRegression
+    merged = pd.read_csv(os.path.join(BASE_DIR, "data", "merged_yield_weather_vn.csv")).dropna()
+    return LinearRegression().fit(merged[["TempAvg", "RainfallAnnual", "HumidityAvg"]].to_numpy(),
+                                  merged["Yield_FAO"].to_numpy())
+
+
+def _weather_matrix(n, seed):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.uniform(20, 30, n), rng.uniform(800, 3000, n), rng.uniform(65, 90, n)])
+
+
+@benchmark("model_predict_single", "model")
+def bench_model_single(ctx):
+    model = _load_model()
+    X = _weather_matrix(200, ctx.seed)
+
+    def run():
+        for row in X:
+            model.predict(row.reshape(1, -1))
+    return len(X), run
+
+
+@benchmark("model_predict_batch", "model")
+def bench_model_batch(ctx):
+    model = _load_model()
+    X = _weather_matrix(ctx.size, ctx.seed)
+    return len(X), lambda: model.predict(X)
+
+
+# =========================================================
+#               CHẠY & SO SÁNH
+# =========================================================
+
+def run_benchmarks(sizes=DEFAULT_SIZES, only=None, repeat=3, seed=42):
+    """Chạy các benchmark, trả về list kết quả (mỗi phần tử một benchmark ở một kích thước)"""
+    selected = [b for b in BENCHMARKS
+                if not only or any(fnmatch.fnmatch(b["name"], p) or b["group"] == p for p in only)]
+    results = []
+    cwd = os.getcwd()
+    os.chdir(BASE_DIR)  # các route đọc file theo thư mục làm việc
+    try:
+        for size in sizes:
+            tmp_dir = tempfile.mkdtemp(prefix="agri_bench_")
+            try:
+                t = time.perf_counter()
+                ctx = Context(size, seed, tmp_dir)
+                print(f"\n📦 {size:,} mùa vụ (sinh dữ liệu {time.perf_counter() - t:.2f}s)")
+                for bench in selected:
+                    timings = []
+                    for _ in range(repeat):
+                        ops, fn = bench["setup"](ctx)
+                        t = time.perf_counter()
+                        fn()
+                        timings.append(time.perf_counter() - t)
+                    best = min(timings)
+                    result = {
+                        "name": bench["name"],
+                        "group": bench["group"],
+                        "size": size,
+                        "ops": ops,
+                        "best_s": round(best, 6),
+                        "median_s": round(statistics.median(timings), 6),
+                        "per_op_us": round(best / max(ops, 1) * 1e6, 3),
+                    }
+                    results.append(result)
+                    print(f"   {bench['name']:<28} {result['per_op_us']:>12,.2f} µs/op  ({ops} ops, {best:.4f}s)")
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+    finally:
+        os.chdir(cwd)
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance=0.25):
+    """Trả về danh sách benchmark chậm hơn baseline quá ngưỡng tolerance"""
+    base = {(r["name"], r["size"]): r for r in baseline.get("results", [])}
+    regressions = []
+    print("\n" + "=" * 72)
+    print(f"{'benchmark':<28} {'size':>9} {'baseline µs':>13} {'now µs':>13} {'Δ':>7}")
+    for r in results:
+        ref = base.get((r["name"], r["size"]))
+        if not ref:
+            print(f"{r['name']:<28} {r['size']:>9} {'-':>13} {r['per_op_us']:>13,.2f}")
+            continue
+        change = r["per_op_us"] / ref["per_op_us"] - 1 if ref["per_op_us"] else 0.0
+        flag = ""
+        if change > tolerance:
+            regressions.append({**r, "baseline_per_op_us": ref["per_op_us"], "change": round(change, 3)})
+            flag = "  ⚠️"
+        print(f"{r['name']:<28} {r['size']:>9} {ref['per_op_us']:>13,.2f} {r['per_op_us']:>13,.2f} {change:>+7.0%}{flag}")
+    print("=" * 72)
+    return regressions
+
+
+def _meta():
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "numpy": np.__version__,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark các đường xử lý nóng của ứng dụng")
+    parser.add_argument("--sizes", nargs="*", type=int, default=DEFAULT_SIZES, help="Số mùa vụ giả lập")
+    parser.add_argument("--only", nargs="*", help="Chỉ chạy benchmark theo tên (glob) hoặc nhóm")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Ghi kết quả JSON ra file")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="Ghi kết quả làm baseline mới")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Ngưỡng chậm hơn cho phép (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.only, args.repeat, args.seed)
+    payload = {"meta": _meta(), "results": results}
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        print(f"💾 Đã ghi kết quả: {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        print(f"💾 Đã cập nhật baseline: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("ℹ️ Chưa có baseline - chạy lại với --save-baseline để tạo.")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print(f"❌ {len(regressions)} benchmark chậm hơn baseline quá {args.tolerance:.0%}")
+        return 1
+    print("✅ Không có regression so với baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
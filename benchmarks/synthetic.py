@@ -0,0 +1,17 @@
+# synthetic.py
+# Dữ liệu mùa vụ giả lập cho benchmark: dùng lại bộ sinh trong seed_data.py
+# (63 tỉnh × các cây trồng trong yield_engine.BASE_YIELDS, vector hóa bằng NumPy).
+# Cùng seed -> cùng bộ dữ liệu, nên kết quả benchmark so sánh được giữa các lần chạy.
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from seed_data import FERTILIZERS, SEASON_COLUMNS, generate_seasons, load_provinces  # noqa: E402,F401
+
+
+def generate_season_records(n, seed=42, users=50, with_yield=True):
+    """Giống generate_seasons nhưng trả về list dict (dạng mà các route đang xử lý)"""
+    return generate_seasons(n, seed, users, with_yield).to_dict(orient="records")
@@ -0,0 +1,131 @@
+import threading
+import time
+
+import config
+import metrics
+
+try:
+    from google.api_core import exceptions as google_exceptions
+except ImportError:  # không cài google-cloud (chế độ CSV / client giả lập)
+    google_exceptions = None
+
+# =========================================================
+#               CIRCUIT BREAKER CHO STORAGE
+# =========================================================
+# Mọi lần gọi Firestore (qua instrumented_firestore) đi qua một breaker:
+#   closed    -> gọi bình thường; STORAGE_BREAKER_FAILURES lỗi "mất kết nối" liên tiếp -> open
+#   open      -> từ chối ngay (CircuitOpenError), không chờ timeout; route chuyển sang store cục bộ (CSV)
+#   half_open -> sau STORAGE_BREAKER_RESET_SECONDS cho tối đa STORAGE_BREAKER_HALF_OPEN_CALLS lần gọi thử:
+#                thành công -> closed, lỗi -> open lại
+# Chỉ lỗi phía hạ tầng (timeout, mất kết nối, 5xx, quá tải) mới tính; NotFound, sai tham số... là lỗi
+# của request, không làm mở mạch.
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+if google_exceptions is not None:
+    OUTAGE_ERRORS = (TimeoutError, ConnectionError, google_exceptions.ServerError,
+                     google_exceptions.DeadlineExceeded, google_exceptions.TooManyRequests,
+                     google_exceptions.RetryError)
+else:
+    OUTAGE_ERRORS = (TimeoutError, ConnectionError)
+
+
+class CircuitOpenError(ConnectionError):
+    """Mạch đang mở: storage được coi là không khả dụng, lần gọi bị từ chối ngay"""
+
+
+def is_outage(error):
+    return isinstance(error, OUTAGE_ERRORS)
+
+
+class CircuitBreaker:
+
+    def __init__(self, name, failure_threshold=None, reset_timeout=None, half_open_calls=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or config.STORAGE_BREAKER_FAILURES
+        self.reset_timeout = config.STORAGE_BREAKER_RESET_SECONDS if reset_timeout is None else reset_timeout
+        self.half_open_calls = half_open_calls or config.STORAGE_BREAKER_HALF_OPEN_CALLS
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trials = 0
+        self._last_error = None
+        self._lock = threading.Lock()
+        metrics.CIRCUIT_STATE.set(STATE_VALUES[CLOSED], name)
+
+    def _set_state(self, state):
+        # gọi khi đang giữ self._lock
+        if state == self._state:
+            return
+        print(f"{'🔴' if state == OPEN else '🟡' if state == HALF_OPEN else '🟢'} Circuit '{self.name}': "
+              f"{self._state} -> {state}")
+        self._state = state
+        metrics.CIRCUIT_STATE.set(STATE_VALUES[state], self.name)
+        metrics.CIRCUIT_TRANSITIONS.inc(1, self.name, state)
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN  # lần gọi kế tiếp sẽ là lần thử
+            return self._state
+
+    def allow(self):
+        """Có nên thử storage không (không chiếm lượt thử): False khi mạch mở và chưa tới lúc thử lại"""
+        return self.state != OPEN
+
+    def before_call(self):
+        """Gọi trước mỗi lần gọi storage; ném CircuitOpenError nếu phải từ chối"""
+        with self._lock:
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    metrics.CIRCUIT_REJECTED.inc(1, self.name)
+                    raise CircuitOpenError(f"Storage '{self.name}' tạm ngưng (mạch mở): {self._last_error}")
+                self._set_state(HALF_OPEN)
+                self._trials = 0
+            if self._state == HALF_OPEN:
+                if self._trials >= self.half_open_calls:
+                    metrics.CIRCUIT_REJECTED.inc(1, self.name)
+                    raise CircuitOpenError(f"Storage '{self.name}' đang được thử lại")
+                self._trials += 1
+
+    def on_success(self):
+        with self._lock:
+            self._failures = 0
+            if self._state == HALF_OPEN:
+                self._set_state(CLOSED)
+
+    def on_failure(self, error):
+        if not is_outage(error):
+            # lỗi của chính lần gọi (NotFound...) vẫn chứng tỏ storage trả lời được
+            self.on_success()
+            return
+        with self._lock:
+            self._failures += 1
+            self._last_error = str(error)[:200]
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    def snapshot(self):
+        """Trạng thái cho /api/health"""
+        state = self.state
+        with self._lock:
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at)) if state == OPEN else 0.0
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "last_error": self._last_error,
+                "retry_in_seconds": round(retry_in, 1),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._failures = 0
+            self._trials = 0
+            self._set_state(CLOSED)
+
+
+# Breaker dùng chung cho Firestore của tiến trình
+firestore_breaker = CircuitBreaker("firestore")
@@ -0,0 +1,175 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+from compression import encode_array
+from province_locator import get_province_locator
+from weather_index import WEATHER_VARS, get_weather_index
+
+# =========================================================
+#               NỘI SUY KHÍ HẬU THEO TỌA ĐỘ RUỘNG
+# =========================================================
+# Tâm tỉnh chỉ là xấp xỉ thô cho khí hậu của một thửa ruộng (nhất là tỉnh rộng như Gia Lai, Nghệ An).
+# Ước lượng TempAvg / RainfallAnnual / HumidityAvg tại tọa độ bất kỳ bằng nội suy nghịch đảo khoảng cách
+# (IDW) từ chuỗi NASA của k tỉnh gần nhất:  v = Σ w_i·v_i / Σ w_i,  w_i = 1 / d_i^p.
+# Mọi phép tính là phép toán mảng NumPy trên cả lô điểm × năm.
+# Trọng số láng giềng được nhớ theo ô lưới lượng tử hóa (GRID_DEG độ) -> điểm rơi vào ô đã gặp
+# không phải tra BallTree lại, chỉ còn một phép gather + tổng có trọng số.
+
+DEFAULT_K = 4
+DEFAULT_POWER = 2.0
+GRID_DEG = 0.05          # ~5.5 km, nhỏ hơn nhiều so với khoảng cách giữa các tâm tỉnh
+SNAP_KM = 1.0            # gần tâm tỉnh hơn mức này (hoặc cùng ô lưới) -> lấy đúng số liệu tỉnh đó
+MAX_CELLS = 200_000
+
+
+class ClimateInterpolator:
+
+    def __init__(self, locator, index, k=DEFAULT_K, power=DEFAULT_POWER, grid_deg=GRID_DEG, max_cells=MAX_CELLS):
+        self.locator = locator
+        self.index = index
+        self.k = max(1, min(int(k), len(locator)))
+        self.power = float(power)
+        self.grid_deg = float(grid_deg)
+        self.max_cells = int(max_cells)
+        # tỉnh trong bảng tọa độ -> dòng trong chỉ mục NASA (-1 nếu tỉnh không có chuỗi thời tiết)
+        self._weather_row = index.rows(locator.keys)
+        self._lon_span = int(np.ceil(360.0 / self.grid_deg)) + 2
+        # trọng số tính tại tâm ô -> ô chứa tâm tỉnh phải trả đúng số liệu tỉnh đó
+        self._snap_km = max(SNAP_KM, self.grid_deg * 111.2 * 0.71)
+        self._cells = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ----------------- LƯỚI + TRỌNG SỐ -----------------
+    def _cell_codes(self, lats, lons):
+        qlat = np.round(lats / self.grid_deg).astype(np.int64)
+        qlon = np.round(lons / self.grid_deg).astype(np.int64)
+        return qlat * self._lon_span + qlon, qlat, qlon
+
+    def _compute_weights(self, lats, lons):
+        """Dòng NASA [n, k] và trọng số IDW [n, k] (tổng = 1, láng giềng thiếu số liệu có trọng số 0)"""
+        nearest = self.locator.nearest_many(lats, lons, self.k)
+        rows = self._weather_row[nearest["index"]]
+        distances = nearest["distances_km"]
+        with np.errstate(divide="ignore"):
+            weights = np.where(rows >= 0, 1.0 / np.maximum(distances, 1e-9) ** self.power, 0.0)
+        # Điểm trùng tâm tỉnh (có số liệu): dùng thẳng tỉnh đó
+        snap = (distances[:, 0] < self._snap_km) & (rows[:, 0] >= 0)
+        weights[snap] = 0.0
+        weights[snap, 0] = 1.0
+        total = weights.sum(axis=1, keepdims=True)
+        weights = np.divide(weights, total, out=np.zeros_like(weights), where=total > 0)
+        return np.where(rows >= 0, rows, 0), weights
+
+    def _weights(self, lats, lons):
+        """Tra trọng số theo ô lưới; chỉ các ô chưa gặp mới truy vấn BallTree (theo lô)"""
+        lats = np.asarray(lats, dtype=float).reshape(-1)
+        lons = np.asarray(lons, dtype=float).reshape(-1)
+        if lats.shape != lons.shape:
+            raise ValueError("lat và lon phải cùng độ dài")
+        if not np.isfinite(lats).all() or not np.isfinite(lons).all() \
+                or (np.abs(lats) > 90).any() or (np.abs(lons) > 180).any():
+            raise ValueError("Tọa độ không hợp lệ")
+        codes, qlat, qlon = self._cell_codes(lats, lons)
+        unique, first, inverse = np.unique(codes, return_index=True, return_inverse=True)
+
+        rows = np.empty((len(unique), self.k), dtype=np.intp)
+        weights = np.empty((len(unique), self.k))
+        missing = []
+        with self._lock:
+            for j, code in enumerate(unique.tolist()):
+                cached = self._cells.get(code)
+                if cached is None:
+                    missing.append(j)
+                else:
+                    self._cells.move_to_end(code)
+                    rows[j], weights[j] = cached
+        metrics.record_cache("climate_grid", True, len(unique) - len(missing))
+        metrics.record_cache("climate_grid", False, len(missing))
+
+        if missing:
+            missing = np.array(missing, dtype=np.intp)
+            centers_lat = np.clip(qlat[first[missing]] * self.grid_deg, -90.0, 90.0)
+            centers_lon = np.clip(qlon[first[missing]] * self.grid_deg, -180.0, 180.0)
+            new_rows, new_weights = self._compute_weights(centers_lat, centers_lon)
+            rows[missing] = new_rows
+            weights[missing] = new_weights
+            with self._lock:
+                for j, r, w in zip(missing.tolist(), new_rows, new_weights):
+                    self._cells[int(unique[j])] = (r, w)
+                while len(self._cells) > self.max_cells:
+                    self._cells.popitem(last=False)
+        return rows[inverse], weights[inverse]
+
+    # ----------------- NỘI SUY -----------------
+    def _gather(self, rows, offsets):
+        """Giá trị NASA tại (dòng, năm); năm thiếu / ngoài dữ liệu -> khí hậu trung bình của tỉnh đó"""
+        values = self.index.values
+        n_years = values.shape[1]
+        in_range = (offsets >= 0) & (offsets < n_years)
+        picked = values[rows, np.where(in_range, offsets, 0)] if n_years else np.full(rows.shape + (3,), np.nan)
+        normals = self.index.normals[rows]
+        picked = np.where(in_range[..., None], picked, normals)
+        return np.where(np.isnan(picked), normals, picked)
+
+    def _offsets(self, years, n):
+        if years is None:
+            return np.full(n, -1, dtype=np.intp)
+        years = np.asarray(years, dtype=float).reshape(-1)
+        if years.size == 1:
+            years = np.repeat(years, n)
+        if years.shape != (n,):
+            raise ValueError("years phải là một số hoặc có cùng độ dài với danh sách điểm")
+        return np.where(np.isfinite(years), years - self.index.year_min, -1).astype(np.intp)
+
+    def interpolate(self, lats, lons, years=None):
+        """
+        Ước lượng khí hậu tại từng điểm -> mảng [n, 3] theo WEATHER_VARS.
+        years: None (khí hậu trung bình), một năm, hoặc mảng năm cùng độ dài với điểm.
+        Điểm không có láng giềng nào có số liệu -> NaN.
+        """
+        rows, weights = self._weights(lats, lons)
+        offsets = self._offsets(years, len(rows))
+        values = self._gather(rows, offsets[:, None])                       # [n, k, 3]
+        result = np.einsum("nk,nkv->nv", weights, values)
+        result[weights.sum(axis=1) == 0] = np.nan
+        return result
+
+    def interpolate_series(self, lats, lons, years):
+        """Chuỗi nhiều năm cho từng điểm -> mảng [n, số năm, 3]; láng giềng chỉ tính một lần cho mọi năm"""
+        rows, weights = self._weights(lats, lons)
+        years = np.asarray(years, dtype=float).reshape(-1)
+        offsets = np.where(np.isfinite(years), years - self.index.year_min, -1).astype(np.intp)
+        values = self._gather(rows[:, :, None], offsets[None, None, :])     # [n, k, m, 3]
+        result = np.einsum("nk,nkmv->nmv", weights, values)
+        result[weights.sum(axis=1) == 0] = np.nan
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+
+    def __len__(self):
+        return len(self._cells)
+
+
+def as_records(values, encoding="json"):
+    """Mảng [..., 3] -> dict {TempAvg: [...], RainfallAnnual: [...], HumidityAvg: [...]} (NaN -> None)"""
+    return {name: encode_array(values[..., i], encoding, precision=2) for i, name in enumerate(WEATHER_VARS)}
+
+
+# ----------------- SINGLETON -----------------
+_interpolator = None
+_interpolator_lock = threading.Lock()
+
+
+def get_climate_interpolator():
+    """Bộ nội suy dùng chung; bộ nhớ đệm ô lưới sống suốt tiến trình"""
+    global _interpolator
+    if _interpolator is None:
+        with _interpolator_lock:
+            if _interpolator is None:
+                _interpolator = ClimateInterpolator(get_province_locator(), get_weather_index())
+    return _interpolator
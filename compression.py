@@ -0,0 +1,186 @@
+import base64
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from flask import request
+
+import config
+import metrics
+
+try:
+    import brotli
+except ImportError:  # gói tùy chọn: không có thì chỉ dùng gzip
+    brotli = None
+
+# =========================================================
+#               NÉN RESPONSE + MÃ HÓA GỌN MẢNG SỐ
+# =========================================================
+# - after_request: nén gzip/brotli theo Accept-Encoding khi body >= COMPRESS_MIN_BYTES và là
+#   HTML/JSON/CSV/text; response stream (xuất CSV/NDJSON) và file tĩnh được bỏ qua.
+# - Response đánh dấu mark_cacheable() (trang render cache, bề mặt what-if, chuỗi thời tiết...) thì
+#   bản đã nén được nhớ theo (băm nội dung, mã hóa) -> lần sau không phải nén lại.
+# - encode_array(): mảng số -> list đã làm tròn (NaN -> null) hoặc base64 float32 nhỏ gọn.
+
+COMPRESSIBLE_TYPES = {
+    "text/html", "text/plain", "text/csv", "text/css", "text/javascript",
+    "application/json", "application/javascript", "application/x-ndjson", "image/svg+xml",
+}
+
+BROTLI_QUALITY = 5
+ENCODINGS = ("json", "f32")
+
+
+def _accepted(header):
+    """Accept-Encoding -> {mã hóa: q}"""
+    accepted = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+    return accepted
+
+
+def choose_encoding(header):
+    """Mã hóa tốt nhất mà client chấp nhận: br (nếu có gói brotli) > gzip; None nếu không nén"""
+    accepted = _accepted(header)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best, best_q = None, 0.0
+    for name in candidates:
+        q = accepted.get(name, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def compress(data, encoding, level=None):
+    level = config.COMPRESS_LEVEL if level is None else level
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+class CompressedCache:
+    """LRU bản đã nén theo (băm nội dung, mã hóa), giới hạn theo tổng số byte"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = value
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+_cache = CompressedCache(config.COMPRESS_CACHE_MB * 1024 * 1024)
+
+
+def mark_cacheable():
+    """Đánh dấu response của request hiện tại là nội dung dùng lại được -> nhớ bản đã nén"""
+    metrics.set_request_value("compress_cacheable", True)
+
+
+def compress_response(response):
+    if not config.COMPRESS_ENABLED or response.direct_passthrough or response.is_streamed:
+        return response
+    if response.status_code < 200 or response.status_code >= 300 or "Content-Encoding" in response.headers:
+        return response
+    if response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < config.COMPRESS_MIN_BYTES:
+        return response
+    encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+    if encoding is None:
+        return response
+
+    cacheable = metrics.request_value("compress_cacheable", False)
+    compressed = None
+    if cacheable:
+        key = (hashlib.blake2b(data, digest_size=16).digest(), encoding)
+        compressed = _cache.get(key)
+        metrics.record_cache("compressed", compressed is not None)
+    if compressed is None:
+        compressed = compress(data, encoding)
+        if cacheable:
+            _cache.set(key, compressed)
+    if len(compressed) >= len(data):
+        return response
+
+    metrics.RESPONSE_BYTES.inc(len(data), encoding, "raw")
+    metrics.RESPONSE_BYTES.inc(len(compressed), encoding, "sent")
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    if response.get_etag()[0]:
+        # ETag của bản chưa nén không còn đúng byte-for-byte -> chuyển thành weak
+        response.set_etag(response.get_etag()[0], weak=True)
+    return response
+
+
+def init_app(app):
+    app.after_request(compress_response)
+
+
+# =========================================================
+#               MÃ HÓA MẢNG SỐ
+# =========================================================
+
+def parse_encoding(value):
+    """Tham số ?encoding=json|f32 (mặc định json)"""
+    value = (value or "json").strip().lower()
+    if value not in ENCODINGS:
+        raise ValueError(f"encoding phải là một trong: {', '.join(ENCODINGS)}")
+    return value
+
+
+def encode_array(values, encoding="json", precision=2):
+    """
+    Mảng số -> dạng gửi qua JSON:
+    - "json": list đã làm tròn `precision` chữ số, NaN -> null (giữ nguyên shape)
+    - "f32":  {"dtype": "float32", "shape": [...], "data": base64 little-endian}; NaN giữ nguyên
+              (JS: new Float32Array(Uint8Array.from(atob(data), c => c.charCodeAt(0)).buffer))
+    """
+    values = np.asarray(values, dtype=float)
+    if encoding == "f32":
+        return {
+            "dtype": "float32",
+            "shape": list(values.shape),
+            "data": base64.b64encode(values.astype("<f4").tobytes()).decode("ascii"),
+        }
+    rounded = np.round(values, precision)
+    return np.where(np.isnan(rounded), None, rounded).tolist()
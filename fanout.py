@@ -0,0 +1,146 @@
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+import metrics
+
+# =========================================================
+#               CHẠY SONG SONG CÁC LẦN ĐỌC ĐỘC LẬP
+# =========================================================
+# Route cần nhiều lần đọc độc lập (Firestore, file CSV...) thì chạy chúng song song thay vì lần lượt:
+# độ trễ trang = lần đọc chậm nhất thay vì tổng các lần đọc.
+#   - một thread pool dùng chung cho cả tiến trình (FANOUT_MAX_WORKERS)
+#   - mỗi request chỉ chạy đồng thời tối đa FANOUT_PER_REQUEST việc, phần còn lại xếp hàng
+#   - mỗi việc có hạn chót riêng; quá hạn -> trả giá trị mặc định (nếu có) hoặc ném DeadlineExceeded.
+#     Việc quá hạn không bị hủy (gRPC/đọc file không ngắt được giữa chừng), chỉ không được chờ nữa.
+#   - việc chạy trong bản sao contextvars của request -> vẫn thấy flask.g / request, metric Firestore
+#     được tính đúng route
+#
+#   fan = Fanout()
+#   fan.submit("recent", load_recent)
+#   fan.submit("total", count_seasons, timeout=2.0, default=0)
+#   recent, total = fan.result("recent"), fan.result("total")
+
+_RAISE = object()
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+class DeadlineExceeded(TimeoutError):
+    """Một việc trong Fanout không xong trước hạn chót"""
+
+
+def get_executor():
+    """Pool dùng chung của tiến trình; tạo lại sau fork (thread của tiến trình cha không sang tiến trình con)"""
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=config.FANOUT_MAX_WORKERS, thread_name_prefix="fanout")
+                _executor_pid = os.getpid()
+    return _executor
+
+
+class _Task:
+    __slots__ = ("name", "fn", "args", "kwargs", "deadline", "default", "future", "context")
+
+    def __init__(self, name, fn, args, kwargs, deadline, default):
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.deadline = deadline
+        self.default = default
+        self.future = None
+        self.context = contextvars.copy_context()
+
+
+class Fanout:
+
+    def __init__(self, max_parallel=None, timeout=None):
+        self.max_parallel = max(1, max_parallel or config.FANOUT_PER_REQUEST)
+        self.timeout = config.FANOUT_TIMEOUT if timeout is None else timeout
+        self._tasks = {}
+        self._queue = deque()
+        self._running = 0
+        # RLock: add_done_callback gọi _on_done ngay trong thread hiện tại nếu việc đã xong trước khi đăng ký
+        self._lock = threading.RLock()
+        self._ready = threading.Condition(self._lock)
+
+    def submit(self, name, fn, *args, timeout=None, default=_RAISE, **kwargs):
+        """
+        Đăng ký việc `name`. Hạn chót tính từ lúc đăng ký (timeout giây, mặc định FANOUT_TIMEOUT).
+        default: giá trị trả về khi quá hạn hoặc việc ném lỗi (bỏ trống -> result() ném lỗi).
+        """
+        if name in self._tasks:
+            raise ValueError(f"Việc '{name}' đã được đăng ký")
+        timeout = self.timeout if timeout is None else timeout
+        task = _Task(name, fn, args, kwargs, time.monotonic() + timeout, default)
+        with self._lock:
+            self._tasks[name] = task
+            if self._running < self.max_parallel:
+                self._start(task)
+            else:
+                self._queue.append(task)
+        return self
+
+    def _start(self, task):
+        # gọi khi đang giữ self._lock
+        self._running += 1
+        task.future = get_executor().submit(task.context.run, task.fn, *task.args, **task.kwargs)
+        task.future.add_done_callback(self._on_done)
+        self._ready.notify_all()
+
+    def _on_done(self, _future):
+        with self._lock:
+            self._running -= 1
+            while self._queue and self._running < self.max_parallel:
+                task = self._queue.popleft()
+                if time.monotonic() >= task.deadline:
+                    continue  # đã quá hạn khi còn xếp hàng -> không chạy nữa
+                self._start(task)
+
+    def result(self, name):
+        """Kết quả của việc `name`, chờ tối đa tới hạn chót của nó"""
+        task = self._tasks[name]
+        with self._lock:
+            # việc còn trong hàng đợi: chờ tới khi được chạy hoặc hết hạn
+            while task.future is None:
+                remaining = task.deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._ready.wait(remaining)
+        if task.future is None:
+            return self._fail(task, DeadlineExceeded(f"{name}: quá hạn khi còn xếp hàng"))
+        try:
+            return task.future.result(timeout=max(0.0, task.deadline - time.monotonic()))
+        except TimeoutError:
+            return self._fail(task, DeadlineExceeded(f"{name}: quá hạn"))
+        except Exception as e:
+            return self._fail(task, e)
+
+    def _fail(self, task, error):
+        metrics.FANOUT_FAILURES.inc(1, task.name, "timeout" if isinstance(error, DeadlineExceeded) else "error")
+        if task.default is _RAISE:
+            raise error
+        print(f"⚠️ Fan-out '{task.name}' lỗi, dùng giá trị mặc định: {error}")
+        return task.default
+
+    def results(self):
+        """dict tên -> kết quả cho mọi việc đã đăng ký"""
+        return {name: self.result(name) for name in self._tasks}
+
+
+def gather(*calls, timeout=None, max_parallel=None):
+    """Tiện ích ngắn: gather(f, g, (h, arg)) -> [f(), g(), h(arg)] chạy song song, lỗi được ném lại"""
+    fan = Fanout(max_parallel=max_parallel, timeout=timeout)
+    for i, call in enumerate(calls):
+        fn, *args = call if isinstance(call, tuple) else (call,)
+        fan.submit(i, fn, *args)
+    return [fan.result(i) for i in range(len(calls))]
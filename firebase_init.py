@@ -1,11 +1,35 @@
+import os
+
 import firebase_admin
 from firebase_admin import credentials, firestore
 
+# Kênh gRPC của Firestore client không dùng chung được qua fork() -> mỗi tiến trình (worker) phải có client riêng.
+# firestore.client(app) nhớ client theo app, nên nếu default app đã được tạo ở tiến trình cha (trước fork),
+# tiến trình con dùng một app riêng "worker-<pid>" thay vì nhận lại client của cha.
+_default_app_pid = None
+
+
+def _firebase_app(cred):
+    global _default_app_pid
+    pid = os.getpid()
+    try:
+        app = firebase_admin.get_app()
+    except ValueError:
+        _default_app_pid = pid
+        return firebase_admin.initialize_app(cred)
+    if _default_app_pid in (None, pid):
+        return app
+    name = f"worker-{pid}"
+    try:
+        return firebase_admin.get_app(name)
+    except ValueError:
+        return firebase_admin.initialize_app(cred, name=name)
+
+
 def init_firebase():
     """
-    Khởi tạo Firebase app và trả về Firestore client.
+    Khởi tạo Firebase app và trả về Firestore client của tiến trình hiện tại.
+    Gọi lại trong cùng tiến trình trả về cùng client.
     """
     cred = credentials.Certificate("firebase_config.json")
-    firebase_admin.initialize_app(cred)
-    db = firestore.client()
-    return db
+    return firestore.client(_firebase_app(cred))
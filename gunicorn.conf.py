@@ -0,0 +1,22 @@
+# gunicorn.conf.py
+# Chạy nhiều worker (mỗi worker một tiến trình, dùng hết số nhân CPU):
+#   gunicorn -c gunicorn.conf.py wsgi:app
+# Biến môi trường: PORT, WEB_CONCURRENCY (số worker, mặc định = số nhân), WEB_THREADS, WEB_TIMEOUT (xem config.py)
+#
+# - preload_app: nạp app ở master trước fork -> mô hình/chỉ mục chỉ nạp một lần, worker chia sẻ trang bộ nhớ
+# - post_fork: mỗi worker tạo Firestore client (kênh gRPC) riêng; không dùng lại kết nối của master
+# - Metric /metrics và các cache trong bộ nhớ là của từng worker; render cache (SQLite) dùng chung
+import config
+
+bind = f"0.0.0.0:{config.PORT}"
+workers = config.WEB_CONCURRENCY
+worker_class = "gthread"
+threads = config.WEB_THREADS
+timeout = config.WEB_TIMEOUT
+preload_app = True
+
+
+def post_fork(server, worker):
+    import app as web
+    web.init_storage()
+    server.log.info("Worker %s: storage ready (Firebase: %s)", worker.pid, web.db is not None)
@@ -0,0 +1,318 @@
+import datetime
+import heapq
+import itertools
+import threading
+import time
+
+import config
+import metrics
+from circuit_breaker import firestore_breaker
+
+# =========================================================
+#               FIRESTORE CÓ ĐO ĐẾM
+# =========================================================
+# Bọc Firestore client: mỗi lần đọc/ghi được ghi vào metrics (số document + byte, theo
+# request/route) và cập nhật trạng thái kết nối. /api/health đọc trạng thái này thay vì
+# gửi thêm một query thật. Query đọc nhiều được ghi log; khi bật FIRESTORE_READ_BUDGET,
+# request đọc quá ngưỡng sẽ bị cảnh báo hoặc bị dừng (ReadBudgetExceeded).
+# Mỗi lần gọi có hạn chót STORAGE_CALL_TIMEOUT và đi qua circuit breaker: Firestore lỗi liên tục thì
+# lần gọi bị từ chối ngay (CircuitOpenError) thay vì chờ timeout.
+
+_state_lock = threading.Lock()
+_connection = {"status": "unknown", "checked_at": None, "error": None}
+
+HEAVY_QUERIES_KEPT = 20
+_heavy_lock = threading.Lock()
+_heavy = []  # min-heap (documents, seq, entry): giữ HEAVY_QUERIES_KEPT query nặng nhất
+_seq = itertools.count()
+
+
+class ReadBudgetExceeded(RuntimeError):
+    """Request đọc quá FIRESTORE_READ_BUDGET document (chế độ "refuse")"""
+
+
+def _with_timeout(kwargs):
+    """Thêm hạn chót mặc định cho lần gọi (google-cloud-firestore nhận timeout=... cho mọi RPC)"""
+    if config.STORAGE_CALL_TIMEOUT:
+        kwargs.setdefault("timeout", config.STORAGE_CALL_TIMEOUT)
+    return kwargs
+
+
+def _mark_ok():
+    firestore_breaker.on_success()
+    with _state_lock:
+        _connection.update(status="connected", checked_at=time.time(), error=None)
+
+
+def _mark_error(error):
+    firestore_breaker.on_failure(error)
+    metrics.set_request_value("firestore_error", True)
+    with _state_lock:
+        _connection.update(status="error", checked_at=time.time(), error=str(error)[:200])
+
+
+def connection_state():
+    """Trạng thái kết nối Firestore lần gần nhất (status, checked_at, error)"""
+    with _state_lock:
+        return dict(_connection)
+
+
+# ----------------- KÍCH THƯỚC DOCUMENT -----------------
+def value_size(value):
+    """Kích thước lưu trữ của một giá trị theo quy tắc tính dung lượng của Firestore"""
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, datetime.datetime)):
+        return 8
+    if isinstance(value, str):
+        return len(value.encode("utf-8")) + 1
+    if isinstance(value, bytes):
+        return len(value) + 1
+    if isinstance(value, dict):
+        return sum(len(str(k).encode("utf-8")) + 1 + value_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(value_size(v) for v in value)
+    if hasattr(value, "latitude"):  # GeoPoint
+        return 16
+    path = getattr(value, "path", None)  # DocumentReference
+    return len((path or str(value)).encode("utf-8")) + 1
+
+
+def document_size(snapshot):
+    """Kích thước ước tính (byte) của một document đã đọc: tên document + các trường + 32 byte"""
+    data = getattr(snapshot, "_data", None)
+    if data is None and getattr(snapshot, "exists", False):
+        data = snapshot.to_dict()
+    path = getattr(getattr(snapshot, "reference", None), "path", None) or str(snapshot.id)
+    name = sum(len(part.encode("utf-8")) + 1 for part in path.split("/")) + 16
+    return name + (value_size(data) if data else 0) + 32
+
+
+# ----------------- NGÂN SÁCH ĐỌC -----------------
+def _over_budget(shape, documents):
+    """Gọi khi request hiện tại đã đọc `documents` document và vượt ngưỡng"""
+    message = (f"Request {metrics.request_value('metrics_endpoint', 'background')} đã đọc {documents} "
+               f"document Firestore (giới hạn {config.FIRESTORE_READ_BUDGET}) tại query: {shape}")
+    if config.FIRESTORE_READ_BUDGET_MODE == "refuse":
+        metrics.set_request_value("firestore_error", True)  # kết quả không đầy đủ
+        print(f"⛔ {message}")
+        raise ReadBudgetExceeded(message)
+    print(f"⚠️ {message}")
+
+
+def _record_query(shape, documents, nbytes, elapsed):
+    if documents < config.FIRESTORE_HEAVY_QUERY_DOCS:
+        return
+    entry = {
+        "query": shape,
+        "endpoint": metrics.request_value("metrics_endpoint", "background"),
+        "documents": documents,
+        "bytes": nbytes,
+        "seconds": round(elapsed, 4),
+        "at": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+    print(f"🐢 Query Firestore nặng: {shape} -> {documents} document, "
+          f"{nbytes / 1024:.1f} KB, {elapsed * 1000:.0f} ms ({entry['endpoint']})")
+    with _heavy_lock:
+        item = (documents, next(_seq), entry)
+        if len(_heavy) < HEAVY_QUERIES_KEPT:
+            heapq.heappush(_heavy, item)
+        else:
+            heapq.heappushpop(_heavy, item)
+
+
+def heaviest_queries():
+    """Các query đọc nhiều document nhất kể từ khi khởi động (giảm dần)"""
+    with _heavy_lock:
+        return [entry for _, _, entry in sorted(_heavy, reverse=True)]
+
+
+def route_profile():
+    """Tổng document/byte đọc và ghi theo route, kèm số request và trung bình document đọc mỗi request"""
+    routes = {}
+    for (endpoint, op), value in metrics.FIRESTORE_DOCS.items().items():
+        routes.setdefault(endpoint, {})[f"{op}_documents"] = value
+    for (endpoint, op), value in metrics.FIRESTORE_BYTES.items().items():
+        routes.setdefault(endpoint, {})[f"{op}_bytes"] = value
+    for (endpoint, op), value in metrics.FIRESTORE_OPS.items().items():
+        routes.setdefault(endpoint, {})[f"{op}_calls"] = value
+    requests_by_route = {labels[0]: state["count"]
+                         for labels, state in list(metrics.FIRESTORE_READS_PER_REQUEST._values.items())}
+    for endpoint, row in routes.items():
+        count = requests_by_route.get(endpoint, 0)
+        row["requests"] = count
+        row["avg_documents_read"] = round(row.get("read_documents", 0) / count, 1) if count else None
+    return dict(sorted(routes.items(), key=lambda item: item[1].get("read_documents", 0), reverse=True))
+
+
+# =========================================================
+#               WRAPPERS
+# =========================================================
+
+class _Proxy:
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+
+class InstrumentedQuery(_Proxy):
+
+    def __init__(self, target, shape):
+        super().__init__(target)
+        self._shape = shape
+
+    def _wrap(self, query, step):
+        return InstrumentedQuery(query, f"{self._shape} {step}")
+
+    def where(self, *args, **kwargs):
+        field = args[0] if args else kwargs.get("field_path", "filter")
+        return self._wrap(self._target.where(*args, **kwargs), f"where({field})")
+
+    def order_by(self, field_path, *args, **kwargs):
+        return self._wrap(self._target.order_by(field_path, *args, **kwargs), f"order_by({field_path})")
+
+    def limit(self, count):
+        return self._wrap(self._target.limit(count), f"limit({count})")
+
+    def offset(self, count):
+        return self._wrap(self._target.offset(count), f"offset({count})")
+
+    def select(self, field_paths):
+        return self._wrap(self._target.select(field_paths), "select(...)")
+
+    def start_after(self, document_fields):
+        return self._wrap(self._target.start_after(document_fields), "start_after(...)")
+
+    def stream(self, *args, **kwargs):
+        # Route xuất dữ liệu đọc toàn bộ collection có chủ đích -> không áp ngân sách
+        budget = 0 if metrics.request_value("firestore_budget_exempt", False) else config.FIRESTORE_READ_BUDGET
+        already = metrics.request_value("firestore_reads")
+        warned = metrics.request_value("firestore_budget_warned", False)
+        count = nbytes = 0
+        firestore_breaker.before_call()
+        started = time.perf_counter()
+        try:
+            for snapshot in self._target.stream(*args, **_with_timeout(kwargs)):
+                count += 1
+                nbytes += document_size(snapshot)
+                if budget and not warned and already + count > budget:
+                    warned = True
+                    metrics.set_request_value("firestore_budget_warned", True)
+                    _over_budget(self._shape, already + count)
+                yield snapshot
+        except (ReadBudgetExceeded, GeneratorExit):
+            firestore_breaker.on_success()  # Firestore vẫn trả lời; dừng là do ngân sách / bên gọi
+            raise
+        except Exception as e:
+            _mark_error(e)
+            raise
+        finally:
+            metrics.record_firestore("read", count, nbytes)
+            _record_query(self._shape, count, nbytes, time.perf_counter() - started)
+        _mark_ok()
+
+    def get(self, *args, **kwargs):
+        return list(self.stream(*args, **kwargs))
+
+
+class InstrumentedDocument(_Proxy):
+
+    def _call(self, op, method, *args, **kwargs):
+        firestore_breaker.before_call()
+        try:
+            result = getattr(self._target, method)(*args, **_with_timeout(kwargs))
+        except Exception as e:
+            _mark_error(e)
+            raise
+        nbytes = document_size(result) if op == "read" else 0
+        metrics.record_firestore(op, 1, nbytes)
+        _mark_ok()
+        return result
+
+    def get(self, *args, **kwargs):
+        return self._call("read", "get", *args, **kwargs)
+
+    def set(self, *args, **kwargs):
+        return self._call("write", "set", *args, **kwargs)
+
+    def update(self, *args, **kwargs):
+        return self._call("write", "update", *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._call("write", "delete", *args, **kwargs)
+
+    def collection(self, name):
+        return InstrumentedCollection(self._target.collection(name), name)
+
+
+class InstrumentedCollection(InstrumentedQuery):
+
+    def document(self, *args, **kwargs):
+        return InstrumentedDocument(self._target.document(*args, **kwargs))
+
+    def add(self, *args, **kwargs):
+        firestore_breaker.before_call()
+        try:
+            timestamp, ref = self._target.add(*args, **_with_timeout(kwargs))
+        except Exception as e:
+            _mark_error(e)
+            raise
+        metrics.record_firestore("write", 1)
+        _mark_ok()
+        return timestamp, InstrumentedDocument(ref)
+
+
+class InstrumentedBatch(_Proxy):
+
+    def __init__(self, target):
+        super().__init__(target)
+        self._writes = 0
+
+    def _unwrap(self, reference):
+        return reference._target if isinstance(reference, InstrumentedDocument) else reference
+
+    def set(self, reference, *args, **kwargs):
+        self._writes += 1
+        return self._target.set(self._unwrap(reference), *args, **kwargs)
+
+    def update(self, reference, *args, **kwargs):
+        self._writes += 1
+        return self._target.update(self._unwrap(reference), *args, **kwargs)
+
+    def delete(self, reference, *args, **kwargs):
+        self._writes += 1
+        return self._target.delete(self._unwrap(reference), *args, **kwargs)
+
+    def commit(self, *args, **kwargs):
+        firestore_breaker.before_call()
+        try:
+            result = self._target.commit(*args, **_with_timeout(kwargs))
+        except Exception as e:
+            _mark_error(e)
+            raise
+        metrics.record_firestore("write", self._writes)
+        self._writes = 0
+        _mark_ok()
+        return result
+
+
+class InstrumentedClient(_Proxy):
+
+    def collection(self, name):
+        return InstrumentedCollection(self._target.collection(name), name)
+
+    def document(self, path):
+        return InstrumentedDocument(self._target.document(path))
+
+    def batch(self):
+        return InstrumentedBatch(self._target.batch())
+
+
+def instrument(client):
+    """Bọc Firestore client (None -> None; đã bọc thì giữ nguyên)"""
+    if client is None or isinstance(client, InstrumentedClient):
+        return client
+    return InstrumentedClient(client)
@@ -0,0 +1,340 @@
+import os
+import sys
+import threading
+import time
+
+from flask import g, request
+
+# =========================================================
+#               METRICS (ĐỊNH DẠNG PROMETHEUS)
+# =========================================================
+# Bộ đếm nhẹ, an toàn đa luồng, xuất ra dạng text của Prometheus tại /metrics.
+# Các module khác chỉ cần gọi record_firestore(), record_cache(), MODEL_INFERENCE.observe()...
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+_lock = threading.Lock()
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + list(extra or [])
+    if not pairs:
+        return ""
+    escaped = (f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        REGISTRY.append(self)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, *labels):
+        with _lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def items(self):
+        with _lock:
+            return dict(self._values)
+
+    def render(self):
+        lines = self._header()
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labels=(), function=None):
+        super().__init__(name, documentation, labels)
+        self._function = function
+
+    def set(self, value, *labels):
+        with _lock:
+            self._values[labels] = value
+
+    def inc(self, amount=1, *labels):
+        with _lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, amount=1, *labels):
+        self.inc(-amount, *labels)
+
+    def render(self):
+        lines = self._header()
+        values = self._function() if self._function else self._values
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, *labels):
+        with _lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = self._header()
+        for labels, state in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["counts"]):
+                cumulative += count
+                le = [("le", _format_value(bound) if bound != float("inf") else "+Inf")]
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {_format_value(state['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {state['count']}")
+        return lines
+
+
+class _Timer:
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+# =========================================================
+#               BỘ NHỚ TIẾN TRÌNH
+# =========================================================
+
+def process_rss_bytes():
+    """
+    RSS thực của tiến trình (byte).
+    Linux: /proc/self/status; nơi khác: psutil nếu có, cuối cùng là đỉnh RSS từ getrusage.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process(os.getpid()).memory_info().rss
+    except Exception:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except Exception:
+        return 0
+
+
+PROCESS_START = time.time()
+
+
+# =========================================================
+#               CÁC METRIC CỦA ỨNG DỤNG
+# =========================================================
+
+REQUEST_LATENCY = Histogram("agri_http_request_duration_seconds", "Thời gian xử lý request theo route",
+                            ["endpoint", "method"])
+REQUESTS_TOTAL = Counter("agri_http_requests_total", "Số request theo route và mã trạng thái",
+                         ["endpoint", "method", "status"])
+IN_FLIGHT = Gauge("agri_http_requests_in_flight", "Số request đang xử lý")
+
+FIRESTORE_OPS = Counter("agri_firestore_operations_total", "Số lần gọi Firestore (read/write)",
+                        ["endpoint", "op"])
+FIRESTORE_DOCS = Counter("agri_firestore_documents_total", "Số document Firestore đã đọc/ghi",
+                         ["endpoint", "op"])
+FIRESTORE_BYTES = Counter("agri_firestore_bytes_total", "Kích thước ước tính (byte) của document Firestore đã đọc",
+                          ["endpoint", "op"])
+FIRESTORE_READS_PER_REQUEST = Histogram("agri_firestore_reads_per_request",
+                                        "Số document Firestore đọc trong một request", ["endpoint"],
+                                        buckets=COUNT_BUCKETS)
+FIRESTORE_WRITES_PER_REQUEST = Histogram("agri_firestore_writes_per_request",
+                                         "Số document Firestore ghi trong một request", ["endpoint"],
+                                         buckets=COUNT_BUCKETS)
+
+CACHE_REQUESTS = Counter("agri_cache_requests_total", "Số lần tra cache theo kết quả", ["cache", "result"])
+
+
+def _cache_hit_ratios():
+    totals = {}
+    for (cache, result), value in list(CACHE_REQUESTS._values.items()):
+        hits, all_ = totals.get(cache, (0, 0))
+        totals[cache] = (hits + (value if result == "hit" else 0), all_ + value)
+    return {(cache,): hits / all_ for cache, (hits, all_) in totals.items() if all_}
+
+
+CACHE_HIT_RATIO = Gauge("agri_cache_hit_ratio", "Tỷ lệ trúng cache", ["cache"], function=_cache_hit_ratios)
+
+MODEL_INFERENCE = Histogram("agri_model_inference_seconds", "Thời gian dự đoán của mô hình", ["model"],
+                            buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0))
+
+FANOUT_FAILURES = Counter("agri_fanout_failures_total", "Việc fan-out quá hạn hoặc lỗi", ["task", "reason"])
+
+SEASON_REPLICA_LAG = Histogram("agri_season_replica_lag_seconds",
+                               "Độ trễ từ read_time của snapshot Firestore tới lúc áp vào bản sao seasons",
+                               buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+SEASON_REPLICA_STALENESS = Gauge("agri_season_replica_staleness_seconds",
+                                 "Độ cũ tối đa của bản sao seasons (0 = listener đang chạy, -1 = chưa đồng bộ)")
+
+JOURNAL_APPEND = Histogram("agri_season_journal_append_seconds", "Thời gian ghi một thay đổi vào journal write-behind",
+                           buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0))
+JOURNAL_COMMITTED = Counter("agri_season_journal_commits_total",
+                            "Document write-behind đã commit lên Firestore theo kết quả (ok, retry, dead)", ["result"])
+JOURNAL_COALESCED = Counter("agri_season_journal_coalesced_total",
+                            "Số thay đổi được gộp vào thay đổi khác của cùng document trước khi commit")
+JOURNAL_BACKLOG = Gauge("agri_season_journal_backlog", "Số thay đổi write-behind đang chờ commit")
+
+CIRCUIT_STATE = Gauge("agri_storage_circuit_state", "Trạng thái circuit breaker (0 = closed, 1 = half_open, 2 = open)",
+                      ["storage"])
+CIRCUIT_TRANSITIONS = Counter("agri_storage_circuit_transitions_total", "Số lần circuit breaker chuyển trạng thái",
+                              ["storage", "state"])
+CIRCUIT_REJECTED = Counter("agri_storage_circuit_rejected_total", "Lần gọi storage bị từ chối ngay vì mạch mở",
+                           ["storage"])
+
+RESPONSE_BYTES = Counter("agri_http_response_bytes_total",
+                         "Kích thước body response (raw = trước nén, sent = đã gửi) theo mã hóa",
+                         ["encoding", "kind"])
+
+RSS = Gauge("agri_process_resident_memory_bytes", "RSS của tiến trình (byte)",
+            function=lambda: {(): process_rss_bytes()})
+START_TIME = Gauge("agri_process_start_time_seconds", "Thời điểm tiến trình khởi động (unix time)",
+                   function=lambda: {(): PROCESS_START})
+
+
+# =========================================================
+#               GHI NHẬN
+# =========================================================
+
+def _current_endpoint():
+    try:
+        return g.get("metrics_endpoint", "background")
+    except RuntimeError:  # ngoài request context
+        return "background"
+
+
+def record_firestore(op, documents=1, nbytes=0):
+    """Ghi nhận một lần gọi Firestore (op = "read" | "write"), số document và số byte liên quan"""
+    endpoint = _current_endpoint()
+    FIRESTORE_OPS.inc(1, endpoint, op)
+    FIRESTORE_DOCS.inc(documents, endpoint, op)
+    if nbytes:
+        FIRESTORE_BYTES.inc(nbytes, endpoint, op)
+    try:
+        key = "firestore_reads" if op == "read" else "firestore_writes"
+        with _lock:  # các việc fan-out của cùng request ghi chung một g
+            setattr(g, key, g.get(key, 0) + documents)
+    except RuntimeError:
+        pass
+
+
+def request_value(key, default=0):
+    """Giá trị đang đếm cho request hiện tại (vd. "firestore_reads"); ngoài request -> default"""
+    try:
+        return g.get(key, default)
+    except RuntimeError:
+        return default
+
+
+def set_request_value(key, value):
+    try:
+        setattr(g, key, value)
+    except RuntimeError:
+        pass
+
+
+def record_cache(cache, hit, count=1):
+    """Ghi nhận count lần tra cache `cache` (trúng hoặc trượt)"""
+    if count:
+        CACHE_REQUESTS.inc(count, cache, "hit" if hit else "miss")
+
+
+def render():
+    """Toàn bộ metric ở định dạng text của Prometheus"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# =========================================================
+#               GẮN VÀO FLASK
+# =========================================================
+
+def init_app(app):
+    """Đo thời gian, request đang xử lý và số đọc/ghi Firestore cho mọi request"""
+
+    @app.before_request
+    def _metrics_start():
+        g.metrics_start = time.perf_counter()
+        g.metrics_endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        g.firestore_reads = 0
+        g.firestore_writes = 0
+        IN_FLIGHT.inc()
+
+    @app.after_request
+    def _metrics_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _metrics_end(exc):
+        start = g.pop("metrics_start", None)
+        if start is None:
+            return
+        endpoint = g.get("metrics_endpoint", "unmatched")
+        status = g.get("metrics_status", 500 if exc else 200)
+        REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint, request.method)
+        REQUESTS_TOTAL.inc(1, endpoint, request.method, str(status))
+        FIRESTORE_READS_PER_REQUEST.observe(g.get("firestore_reads", 0), endpoint)
+        FIRESTORE_WRITES_PER_REQUEST.observe(g.get("firestore_writes", 0), endpoint)
+        IN_FLIGHT.dec()
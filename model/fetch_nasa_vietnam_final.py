@@ -7,6 +7,8 @@ from urllib3.util.retry import Retry
 from requests.adapters import HTTPAdapter
 import numpy as np
 
+from merge_data import BY_PROVINCE_OUTPUT_FILE, MergeError, merge_yield_weather, print_report
+
 # ================== CẤU HÌNH ==================
 BASE_DIR = Path(__file__).resolve().parents[1]  # LÊN 1 CẤP → E:\project_cuoiky\
 DATA_DIR = BASE_DIR / "data"
@@ -153,10 +155,11 @@ def process_one_province(row, all_data):
         time.sleep(pause)
 
 
-def main():
+def main(merge=True):
+    """Tải thời tiết 63 tỉnh; trả về số tỉnh tải được (0 nếu thiếu danh sách tỉnh hoặc không có dữ liệu)"""
     if not PROVINCES_FILE.exists():
         print(f"KHÔNG TÌM THẤY: {PROVINCES_FILE}")
-        return
+        return 0
 
     print("Đang đọc danh sách 63 tỉnh thành...")
     provinces = pd.read_csv(PROVINCES_FILE)
@@ -171,25 +174,22 @@ def main():
 
     if not all_data:
         print("KHÔNG CÓ DỮ LIỆU!")
-        return
+        return 0
 
     weather_all = pd.DataFrame(all_data)
     output_file = DATA_DIR / "weather_all_vn_annual_2000-2023.csv"
     weather_all.to_csv(output_file, index=False)
     print(f"\nHOÀN TẤT! Đã lưu {success}/63 tỉnh → {output_file.name}")
 
-    if FAO_FILE.exists():
+    # Gộp với năng suất FAO theo tỉnh bằng bước gộp chung (merge_data.py) -> merged_yield_weather_by_province.csv
+    # (pipeline.py gọi main(merge=False): bước gộp của pipeline dùng file toàn quốc ở trên)
+    if merge and FAO_FILE.exists():
         try:
-            fao = pd.read_csv(FAO_FILE)
-            if "Value" in fao.columns:
-                fao = fao.rename(columns={"Value": "Yield_FAO"})
-            if {"Year", "Yield_FAO"}.issubset(fao.columns):
-                merged = weather_all.merge(fao[["Year", "Yield_FAO"]], on="Year", how="left")
-                merged_file = DATA_DIR / "merged_yield_weather_by_province.csv"
-                merged.to_csv(merged_file, index=False)
-                print(f"ĐÃ GỘP FAO → {merged_file.name}")
-        except Exception as e:
+            report = merge_yield_weather(OUT_DIR, FAO_FILE, BY_PROVINCE_OUTPUT_FILE)
+            print_report(report)
+        except MergeError as e:
             print(f"Lỗi gộp: {e}")
+    return success
 
 
 if __name__ == "__main__":
@@ -0,0 +1,279 @@
+# forecast_weather.py
+# Dự báo thời tiết năm cho tất cả các tỉnh đến HORIZON_END (mặc định 2030) từ chuỗi NASA theo tỉnh.
+#   - mô hình: xu hướng tuyến tính + làm trơn mũ Holt có tắt dần (ETS(A,Ad,N))
+#   - 63 tỉnh × 3 biến = 189 chuỗi được xếp thành một ma trận [chuỗi, năm] và khớp CÙNG LÚC:
+#     mỗi bước thời gian là một phép toán mảng trên [tổ hợp tham số, chuỗi], tham số (alpha, beta, phi)
+#     được chọn cho từng chuỗi bằng lưới tìm kiếm vector hóa (SSE một bước nhỏ nhất)
+#   - khoảng dự báo theo phương sai giải tích của ETS(A,Ad,N)
+#   - ghi data/weather_all_vn_annual_2000-2030.csv (lịch sử + dự báo, cột Source) nguyên tử
+#
+# Cách dùng:
+#   python model/forecast_weather.py                    # đến 2030, khoảng tin cậy 95%
+#   python model/forecast_weather.py --end 2035 --level 0.8
+import argparse
+import glob
+import os
+import tempfile
+import time
+from itertools import product
+from pathlib import Path
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+# === ĐƯỜNG DẪN MẶC ĐỊNH ===
+BASE_DIR = Path(__file__).resolve().parents[1]
+DATA_DIR = BASE_DIR / "data"
+
+WEATHER_SOURCE = DATA_DIR / "nasa_data"
+OUTPUT_FILE = DATA_DIR / "weather_all_vn_annual_2000-2030.csv"
+
+WEATHER_VARS = ["TempAvg", "RainfallAnnual", "HumidityAvg"]
+
+HORIZON_END = 2030
+LEVEL = 0.95
+
+# Lưới tham số: alpha (mức), beta = alpha * tỷ lệ (xu hướng), phi (tắt dần xu hướng)
+ALPHAS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.7)
+BETA_RATIOS = (0.0, 0.05, 0.1, 0.3)
+PHIS = (0.8, 0.9, 0.98)
+
+# Giới hạn vật lý sau khi dự báo
+BOUNDS = {
+    "TempAvg": (None, None),
+    "RainfallAnnual": (0.0, None),
+    "HumidityAvg": (0.0, 100.0),
+}
+
+
+class ForecastError(Exception):
+    """Không đủ dữ liệu để dự báo"""
+
+
+# =========================================================
+#               DỮ LIỆU -> MA TRẬN
+# =========================================================
+
+def load_panel(source=WEATHER_SOURCE):
+    """
+    Đọc mọi file <Tỉnh>_<năm>-<năm>.csv -> (provinces, years, values [tỉnh, năm, 3]); NaN nếu thiếu năm.
+    """
+    files = sorted(glob.glob(os.path.join(str(source), "*_*-*.csv")))
+    frames = []
+    for path in files:
+        try:
+            frames.append(pd.read_csv(path, usecols=["Province", "Year", *WEATHER_VARS]))
+        except Exception as e:
+            print(f"⚠️ Bỏ qua file thời tiết {os.path.basename(path)}: {e}")
+    if not frames:
+        raise ForecastError(f"Không tìm thấy file thời tiết trong {source}")
+    frame = pd.concat(frames, ignore_index=True).dropna(subset=["Province", "Year"])
+    frame["Year"] = frame["Year"].astype(int)
+    frame = frame.groupby(["Province", "Year"], sort=True)[WEATHER_VARS].mean()
+
+    provinces = frame.index.get_level_values("Province").unique().tolist()
+    years = np.arange(frame.index.get_level_values("Year").min(), frame.index.get_level_values("Year").max() + 1)
+    full = frame.reindex(pd.MultiIndex.from_product([provinces, years], names=["Province", "Year"]))
+    values = full.to_numpy(dtype=float).reshape(len(provinces), len(years), len(WEATHER_VARS))
+    return provinces, years, values
+
+
+# =========================================================
+#               KHỚP MÔ HÌNH (VECTOR HÓA)
+# =========================================================
+
+def _linear_trend(y):
+    """Hồi quy tuyến tính theo thời gian cho từng chuỗi (bỏ qua NaN) -> (intercept tại t=0, slope)"""
+    t = np.arange(y.shape[1], dtype=float)
+    valid = ~np.isnan(y)
+    n = valid.sum(axis=1)
+    tv = np.where(valid, t, 0.0)
+    yv = np.where(valid, y, 0.0)
+    t_mean = tv.sum(axis=1) / np.maximum(n, 1)
+    y_mean = yv.sum(axis=1) / np.maximum(n, 1)
+    dt = np.where(valid, t - t_mean[:, None], 0.0)
+    var = (dt ** 2).sum(axis=1)
+    slope = np.divide((dt * (yv - y_mean[:, None])).sum(axis=1), var, out=np.zeros_like(var), where=var > 0)
+    return y_mean - slope * t_mean, slope
+
+
+def _parameter_grid():
+    grid = np.array([(a, a * r, phi) for a, r, phi in product(ALPHAS, BETA_RATIOS, PHIS)])
+    return grid[:, 0:1], grid[:, 1:2], grid[:, 2:3]          # mỗi mảng [G, 1] để broadcast với [G, S]
+
+
+def fit_holt(y):
+    """
+    Khớp ETS(A,Ad,N) cho mọi chuỗi cùng lúc. y: [S, T] (NaN = thiếu, bước đó chỉ dự báo, không cập nhật).
+    Trả về dict các mảng [S]: level, trend, alpha, beta, phi, sigma (độ lệch chuẩn sai số một bước), n.
+    """
+    alpha, beta, phi = _parameter_grid()
+    intercept, slope = _linear_trend(y)
+    # Trạng thái ban đầu từ đường xu hướng: dự báo cho năm đầu tiên = intercept
+    level = intercept - phi * slope
+    trend = np.broadcast_to(slope, level.shape).copy()
+    sse = np.zeros_like(level)
+    count = np.zeros(y.shape[0])
+
+    for t in range(y.shape[1]):
+        forecast = level + phi * trend
+        error = y[:, t] - forecast
+        valid = ~np.isnan(error)
+        error = np.where(valid, error, 0.0)
+        sse += error ** 2
+        count += valid[0]
+        level = forecast + alpha * error
+        trend = phi * trend + beta * error
+
+    best = np.argmin(sse, axis=0)
+    cols = np.arange(y.shape[0])
+    dof = np.maximum(count - 2, 1)
+    return {
+        "level": level[best, cols],
+        "trend": trend[best, cols],
+        "alpha": alpha[best, 0],
+        "beta": beta[best, 0],
+        "phi": phi[best, 0],
+        "sigma": np.sqrt(sse[best, cols] / dof),
+        "n": count,
+    }
+
+
+def forecast_holt(fit, horizon, level=LEVEL):
+    """Dự báo h = 1..horizon cho mọi chuỗi -> (mean, lower, upper), mỗi mảng [S, horizon]"""
+    h = np.arange(1, horizon + 1)
+    phi = fit["phi"][:, None]
+    # phi_h = phi + phi^2 + ... + phi^h
+    damp = np.cumsum(phi ** h[None, :], axis=1)
+    mean = fit["level"][:, None] + damp * fit["trend"][:, None]
+    # Var(h) = sigma^2 * [1 + Σ_{j=1}^{h-1} (alpha + beta * phi_j)^2]
+    step = (fit["alpha"][:, None] + fit["beta"][:, None] * damp) ** 2
+    var = 1.0 + np.concatenate([np.zeros((len(mean), 1)), np.cumsum(step, axis=1)[:, :-1]], axis=1)
+    z = NormalDist().inv_cdf(0.5 + level / 2)
+    half = z * fit["sigma"][:, None] * np.sqrt(var)
+    return mean, mean - half, mean + half
+
+
+# =========================================================
+#               CHẠY + GHI KẾT QUẢ
+# =========================================================
+
+def _clip(values, variable):
+    low, high = BOUNDS[variable]
+    return np.clip(values, low, high) if low is not None or high is not None else values
+
+
+def forecast_weather(source=WEATHER_SOURCE, output_file=OUTPUT_FILE, end=HORIZON_END, level=LEVEL):
+    """
+    Dự báo toàn bộ tỉnh × biến đến năm `end` và ghi file lịch sử + dự báo.
+    Cột: Province, Year, Source (nasa | forecast), TempAvg, ..., TempAvg_Lower, TempAvg_Upper, ...
+    Trả về báo cáo (số tỉnh, số chuỗi, năm dự báo, thời gian từng bước).
+    """
+    t_start = time.perf_counter()
+    timings = {}
+
+    t = time.perf_counter()
+    provinces, years, values = load_panel(source)
+    timings["load"] = time.perf_counter() - t
+    horizon = int(end) - int(years[-1])
+    if horizon <= 0:
+        raise ForecastError(f"Dữ liệu đã tới năm {years[-1]}, không có năm nào để dự báo đến {end}")
+
+    t = time.perf_counter()
+    n_prov, n_years, n_vars = values.shape
+    series = values.transpose(0, 2, 1).reshape(n_prov * n_vars, n_years)     # [tỉnh*biến, năm]
+    usable = (~np.isnan(series)).sum(axis=1) >= 3
+    if not usable.any():
+        raise ForecastError("Không có chuỗi nào đủ 3 năm dữ liệu")
+    fit = fit_holt(series)
+    mean, lower, upper = forecast_holt(fit, horizon, level)
+    mean[~usable] = lower[~usable] = upper[~usable] = np.nan
+    timings["fit"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    future = np.arange(years[-1] + 1, years[-1] + horizon + 1)
+    shape = (n_prov, n_vars, horizon)
+    mean, lower, upper = (a.reshape(shape).transpose(0, 2, 1) for a in (mean, lower, upper))   # [tỉnh, năm, biến]
+
+    history = pd.DataFrame({
+        "Province": np.repeat(provinces, n_years),
+        "Year": np.tile(years, n_prov),
+        "Source": "nasa",
+    })
+    ahead = pd.DataFrame({
+        "Province": np.repeat(provinces, horizon),
+        "Year": np.tile(future, n_prov),
+        "Source": "forecast",
+    })
+    for i, var in enumerate(WEATHER_VARS):
+        observed = values[:, :, i].reshape(-1)
+        history[var] = observed
+        history[f"{var}_Lower"] = observed
+        history[f"{var}_Upper"] = observed
+        ahead[var] = _clip(mean[:, :, i].reshape(-1), var)
+        ahead[f"{var}_Lower"] = _clip(lower[:, :, i].reshape(-1), var)
+        ahead[f"{var}_Upper"] = _clip(upper[:, :, i].reshape(-1), var)
+    out = pd.concat([history.dropna(subset=WEATHER_VARS, how="all"), ahead], ignore_index=True)
+    out = out.sort_values(["Province", "Year"], kind="stable").round(4)
+
+    output_file = Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=output_file.name, suffix=".tmp", dir=output_file.parent)
+    os.close(fd)
+    try:
+        out.to_csv(tmp_path, index=False)
+        os.chmod(tmp_path, 0o644)  # mkstemp tạo file 0600, app đọc file này dưới user khác
+        os.replace(tmp_path, output_file)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    timings["write"] = time.perf_counter() - t
+    timings["total"] = time.perf_counter() - t_start
+
+    return {
+        "output": str(output_file),
+        "provinces": n_prov,
+        "series": int(usable.sum()),
+        "history": f"{years[0]}-{years[-1]}",
+        "forecast": f"{future[0]}-{future[-1]}",
+        "level": level,
+        "rows_out": len(out),
+        "timings": {k: round(v, 4) for k, v in timings.items()},
+    }
+
+
+def print_report(report):
+    print("\n" + "=" * 60)
+    print("HOÀN TẤT DỰ BÁO THỜI TIẾT!")
+    print(f"   File đã lưu: {report['output']}")
+    print(f"   Tỉnh: {report['provinces']}, chuỗi đã khớp: {report['series']}")
+    print(f"   Lịch sử {report['history']}, dự báo {report['forecast']} (khoảng {report['level']:.0%})")
+    print(f"   Dòng ra: {report['rows_out']}")
+    print("   Thời gian: " + ", ".join(f"{k} {v:.3f}s" for k, v in report["timings"].items()))
+    print("=" * 60)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dự báo thời tiết năm theo tỉnh (xu hướng + làm trơn mũ)")
+    parser.add_argument("--weather", default=str(WEATHER_SOURCE), help="Thư mục chứa các file NASA theo tỉnh")
+    parser.add_argument("--out", default=str(OUTPUT_FILE), help="File kết quả")
+    parser.add_argument("--end", type=int, default=HORIZON_END, help="Năm cuối cần dự báo")
+    parser.add_argument("--level", type=float, default=LEVEL, help="Mức tin cậy của khoảng dự báo (0-1)")
+    args = parser.parse_args(argv)
+
+    if not 0 < args.level < 1:
+        print("LỖI: --level phải nằm trong (0, 1)")
+        return 1
+    try:
+        report = forecast_weather(args.weather, args.out, args.end, args.level)
+    except ForecastError as e:
+        print(f"LỖI: {e}")
+        return 1
+    print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,337 @@
+# merge_data.py
+# Gộp dữ liệu thời tiết (NASA) với năng suất (FAO) theo (Province, Year).
+# Thay thế fix_and_merge.py và merge_yield_weather.py:
+#   - tự nhận dạng file thời tiết có/không có header, theo năm hay theo ngày
+#   - tự nhận dạng các biến thể file FAO (FAOSTAT gốc, "Yield (ton/ha)", "Value", nhiều cây trồng)
+#   - đọc theo từng khối (chunk) với dtype cố định, ghi file kết quả nguyên tử
+# Cột của file kết quả giữ như các script cũ:
+#   - mặc định (file thời tiết toàn quốc): Year, TempAvg, RainfallAnnual, HumidityAvg, Yield_FAO
+#     -> merged_yield_weather_vn.csv, file train_predict_yield.py dùng để huấn luyện
+#   - thời tiết theo tỉnh (nasa_data/, fetch_nasa_vietnam_final.py): thêm cột Province đầu tiên
+#     -> merged_yield_weather_by_province.csv
+#   - cột Crop chỉ có khi file FAO chứa nhiều cây trồng (FAOSTAT gốc nhiều Item)
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# === ĐƯỜNG DẪN MẶC ĐỊNH ===
+BASE_DIR = Path(__file__).resolve().parents[1]
+DATA_DIR = BASE_DIR / "data"
+
+WEATHER_SOURCE = DATA_DIR / "weather_all_vn_annual_2000-2023.csv"
+FAO_FILE = DATA_DIR / "rice_yield_vn.csv"
+OUTPUT_FILE = DATA_DIR / "merged_yield_weather_vn.csv"
+BY_PROVINCE_OUTPUT_FILE = DATA_DIR / "merged_yield_weather_by_province.csv"
+
+CHUNK_SIZE = 200_000
+
+WEATHER_VARS = ["TempAvg", "RainfallAnnual", "HumidityAvg"]
+
+# Tên cột gốc của NASA POWER -> tên chuẩn
+WEATHER_ALIASES = {
+    "T2M": "TempAvg",
+    "PRECTOTCORR": "RainfallAnnual",
+    "PRECTOT": "RainfallAnnual",
+    "RH2M": "HumidityAvg",
+    "YEAR": "Year",
+    "PROVINCE": "Province",
+    "DATE": "Date",
+}
+
+WEATHER_DTYPES = {
+    "Province": "string",
+    "Year": "Int32",
+    "TempAvg": "float64",
+    "RainfallAnnual": "float64",
+    "HumidityAvg": "float64",
+}
+
+# Số cột -> tên cột cho file thời tiết không có header
+HEADERLESS_LAYOUTS = {
+    4: ["Year", "TempAvg", "RainfallAnnual", "HumidityAvg"],
+    5: ["Province", "Year", "TempAvg", "RainfallAnnual", "HumidityAvg"],
+}
+
+
+class MergeError(Exception):
+    """Lỗi dữ liệu đầu vào khi gộp (thay cho exit() của các script cũ)"""
+
+
+# =========================================================
+#               NHẬN DẠNG SCHEMA
+# =========================================================
+
+def _is_number(text):
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+
+def detect_weather_schema(path):
+    """
+    Đọc dòng đầu để xác định file thời tiết:
+    - header: có dòng tiêu đề hay không
+    - columns: tên cột chuẩn theo thứ tự trong file
+    - daily: dữ liệu theo ngày (có cột Date hoặc Month/Day) -> cần gộp theo năm
+    """
+    with open(path, encoding="utf-8-sig") as f:
+        first = f.readline().strip()
+    if not first:
+        raise MergeError(f"File thời tiết rỗng: {path}")
+
+    fields = [x.strip().strip('"') for x in first.split(",")]
+    if all(_is_number(x) for x in fields):
+        if len(fields) not in HEADERLESS_LAYOUTS:
+            raise MergeError(f"File {path} không có header và có {len(fields)} cột - không nhận dạng được")
+        return {"header": False, "columns": HEADERLESS_LAYOUTS[len(fields)], "daily": False}
+
+    columns = [WEATHER_ALIASES.get(x.upper(), x) for x in fields]
+    if "Year" not in columns and "Date" not in columns:
+        raise MergeError(f"File {path} không có cột 'Year' hoặc 'Date'. Cột hiện có: {fields}")
+    missing = [c for c in WEATHER_VARS if c not in columns]
+    if missing:
+        raise MergeError(f"File {path} thiếu cột thời tiết: {missing}")
+    daily = "Date" in columns or {"Month", "Day"}.issubset(columns) or "DOY" in columns
+    return {"header": True, "columns": columns, "daily": daily}
+
+
+def detect_yield_schema(path):
+    """
+    Xác định biến thể file năng suất FAO:
+    - "faostat": file FAOSTAT gốc (Element/Item/Value, đơn vị kg/ha)
+    - "value":   cột Value đã là tấn/ha
+    - "ton_ha":  cột "Yield (ton/ha)" (process_fao.py sinh ra)
+    - "merged":  đã có cột Yield_FAO
+    """
+    header = pd.read_csv(path, nrows=0, encoding="utf-8-sig").columns.tolist()
+    if "Year" not in header:
+        raise MergeError(f"File FAO không có cột 'Year'. Cột hiện có: {header}")
+    if {"Element", "Value"}.issubset(header):
+        kind = "faostat"
+    elif "Yield (ton/ha)" in header:
+        kind = "ton_ha"
+    elif "Yield_FAO" in header:
+        kind = "merged"
+    elif "Value" in header:
+        kind = "value"
+    else:
+        raise MergeError(f"Không tìm thấy cột năng suất (Value hoặc Yield (ton/ha)). Cột hiện có: {header}")
+    return {"kind": kind, "columns": header}
+
+
+# =========================================================
+#               ĐỌC DỮ LIỆU THEO KHỐI
+# =========================================================
+
+def _weather_files(source):
+    source = Path(source)
+    if source.is_dir():
+        files = sorted(source.glob("*.csv"))
+        if not files:
+            raise MergeError(f"Thư mục {source} không có file CSV")
+        return files
+    if not source.exists():
+        raise MergeError(f"KHÔNG TÌM THẤY: {source}")
+    return [source]
+
+
+def _read_weather_chunks(path, schema, chunksize):
+    dtypes = {c: WEATHER_DTYPES[c] for c in schema["columns"] if c in WEATHER_DTYPES}
+    if schema["daily"]:
+        dtypes.pop("Year", None)
+    reader = pd.read_csv(
+        path,
+        header=0 if schema["header"] else None,
+        names=schema["columns"],
+        dtype=dtypes,
+        chunksize=chunksize,
+        encoding="utf-8-sig",
+    )
+    for chunk in reader:
+        if schema["daily"]:
+            if "Date" in chunk.columns:
+                chunk["Year"] = pd.to_numeric(chunk["Date"].astype(str).str[:4], errors="coerce")
+            chunk["Year"] = chunk["Year"].astype("Int32")
+        if "Province" not in chunk.columns:
+            # File toàn quốc: không có tỉnh
+            chunk["Province"] = pd.array([pd.NA] * len(chunk), dtype="string")
+        yield chunk
+
+
+def load_yield_table(path, chunksize=CHUNK_SIZE):
+    """
+    Đọc file FAO thành bảng năng suất gọn: Year, [Province], [Crop], Yield_FAO (tấn/ha).
+    Bảng này nhỏ (số năm × số cây trồng) nên giữ trong bộ nhớ để nối với từng khối thời tiết.
+    """
+    path = Path(path)
+    if not path.exists():
+        raise MergeError(f"KHÔNG TÌM THẤY: {path}")
+    schema = detect_yield_schema(path)
+    columns = schema["columns"]
+
+    parts = []
+    reader = pd.read_csv(path, chunksize=chunksize, encoding="utf-8-sig",
+                         dtype={c: "string" for c in ("Area", "Item", "Element", "Province", "Crop") if c in columns})
+    for chunk in reader:
+        if schema["kind"] == "faostat":
+            chunk = chunk[chunk["Element"].str.contains("Yield", case=False, na=False)]
+            chunk = chunk.assign(Yield_FAO=pd.to_numeric(chunk["Value"], errors="coerce") / 1000)
+            if "Item" in chunk.columns:
+                chunk = chunk.rename(columns={"Item": "Crop"})
+        elif schema["kind"] == "ton_ha":
+            chunk = chunk.rename(columns={"Yield (ton/ha)": "Yield_FAO"})
+        elif schema["kind"] == "value":
+            chunk = chunk.rename(columns={"Value": "Yield_FAO"})
+        keep = [c for c in ("Province", "Year", "Crop", "Yield_FAO") if c in chunk.columns]
+        parts.append(chunk[keep])
+
+    table = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=["Year", "Yield_FAO"])
+    table["Year"] = pd.to_numeric(table["Year"], errors="coerce").astype("Int32")
+    table["Yield_FAO"] = pd.to_numeric(table["Yield_FAO"], errors="coerce").astype("float64")
+    if "Province" in table.columns:
+        table["Province"] = table["Province"].astype("string")
+    if "Crop" in table.columns and table["Crop"].nunique(dropna=True) <= 1:
+        # Chỉ một cây trồng (vd. FAOSTAT chỉ có lúa) -> không thêm cột Crop, giữ schema cũ
+        table = table.drop(columns="Crop")
+    table = table.dropna(subset=["Year"]).drop_duplicates()
+    return table
+
+
+# =========================================================
+#               GỘP
+# =========================================================
+
+def _counted(chunks, report):
+    for chunk in chunks:
+        report["weather_rows_in"] += len(chunk)
+        report["chunks"] += 1
+        yield chunk
+
+
+def _aggregate_daily(chunks):
+    """Gộp dữ liệu ngày -> năm theo từng khối: chỉ giữ tổng/đếm cho mỗi (Province, Year)"""
+    partials = []
+    for chunk in chunks:
+        grouped = chunk.groupby(["Province", "Year"], dropna=False).agg(
+            temp_sum=("TempAvg", "sum"), temp_n=("TempAvg", "count"),
+            rain_sum=("RainfallAnnual", "sum"),
+            hum_sum=("HumidityAvg", "sum"), hum_n=("HumidityAvg", "count"),
+        )
+        partials.append(grouped)
+        # Thu gọn định kỳ để bộ nhớ chỉ tỉ lệ với số (tỉnh, năm), không theo số dòng
+        if len(partials) >= 16:
+            partials = [pd.concat(partials).groupby(level=[0, 1], dropna=False).sum()]
+    if not partials:
+        return pd.DataFrame(columns=["Province", "Year", *WEATHER_VARS])
+    total = pd.concat(partials).groupby(level=[0, 1], dropna=False).sum()
+    annual = pd.DataFrame({
+        "TempAvg": (total["temp_sum"] / total["temp_n"]).round(4),
+        "RainfallAnnual": total["rain_sum"].round(2),
+        "HumidityAvg": (total["hum_sum"] / total["hum_n"]).round(4),
+    }).reset_index()
+    return annual
+
+
+def _merge_chunk(weather, yields, keys):
+    merged = weather.merge(yields, on=keys, how="left")
+    columns = ["Province", "Year", "Crop", *WEATHER_VARS, "Yield_FAO"]
+    if merged["Province"].isna().all():
+        columns.remove("Province")
+    if "Crop" not in merged.columns:
+        columns.remove("Crop")
+    return merged[columns]
+
+
+def merge_yield_weather(weather_source=WEATHER_SOURCE, fao_file=FAO_FILE, output_file=OUTPUT_FILE,
+                        chunksize=CHUNK_SIZE):
+    """
+    Gộp thời tiết + năng suất theo (Province, Year) (chỉ theo Year nếu FAO là số liệu toàn quốc).
+    Kết quả ghi vào file tạm rồi os.replace() -> không bao giờ để lại file gộp dở dang.
+    Trả về báo cáo: số dòng vào/ra, số khối và thời gian từng bước (giây).
+    """
+    t_start = time.perf_counter()
+    timings = {}
+    report = {"weather_files": 0, "weather_rows_in": 0, "yield_rows_in": 0, "rows_out": 0, "chunks": 0}
+
+    t = time.perf_counter()
+    files = _weather_files(weather_source)
+    schemas = [(path, detect_weather_schema(path)) for path in files]
+    timings["detect"] = time.perf_counter() - t
+    report["weather_files"] = len(files)
+
+    t = time.perf_counter()
+    yields = load_yield_table(fao_file, chunksize)
+    report["yield_rows_in"] = len(yields)
+    keys = ["Province", "Year"] if "Province" in yields.columns else ["Year"]
+    timings["load_yield"] = time.perf_counter() - t
+
+    output_file = Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=output_file.name, suffix=".tmp", dir=output_file.parent)
+    os.close(fd)
+
+    t = time.perf_counter()
+    header_written = False
+    try:
+        for path, schema in schemas:
+            chunks = _counted(_read_weather_chunks(path, schema, chunksize), report)
+            if schema["daily"]:
+                chunks = [_aggregate_daily(chunks)]
+            for chunk in chunks:
+                chunk = chunk.dropna(subset=["Year"])
+                out = _merge_chunk(chunk[["Province", "Year", *WEATHER_VARS]], yields, keys)
+                out.to_csv(tmp_path, mode="a", header=not header_written, index=False)
+                header_written = True
+                report["rows_out"] += len(out)
+        if not header_written:
+            raise MergeError("Không có dòng thời tiết nào để gộp")
+        os.replace(tmp_path, output_file)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    timings["merge_write"] = time.perf_counter() - t
+    timings["total"] = time.perf_counter() - t_start
+
+    report["output"] = str(output_file)
+    report["timings"] = {k: round(v, 4) for k, v in timings.items()}
+    return report
+
+
+def print_report(report):
+    print("\n" + "=" * 60)
+    print("HOÀN TẤT GỘP DỮ LIỆU!")
+    print(f"   File đã lưu: {report['output']}")
+    print(f"   File thời tiết: {report['weather_files']} ({report['chunks']} khối)")
+    print(f"   Dòng vào: thời tiết {report['weather_rows_in']}, năng suất {report['yield_rows_in']}")
+    print(f"   Dòng ra: {report['rows_out']}")
+    print("   Thời gian: " + ", ".join(f"{k} {v:.3f}s" for k, v in report["timings"].items()))
+    print("=" * 60)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gộp dữ liệu thời tiết NASA với năng suất FAO")
+    parser.add_argument("--weather", default=str(WEATHER_SOURCE),
+                        help="File CSV thời tiết hoặc thư mục chứa các file theo tỉnh")
+    parser.add_argument("--fao", default=str(FAO_FILE), help="File năng suất FAO")
+    parser.add_argument("--out", default=str(OUTPUT_FILE), help="File kết quả")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    try:
+        report = merge_yield_weather(args.weather, args.fao, args.out, args.chunksize)
+    except MergeError as e:
+        print(f"LỖI: {e}")
+        return 1
+    print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,397 @@
+# pipeline.py
+# Chạy toàn bộ quy trình dữ liệu offline theo đúng thứ tự phụ thuộc:
+#
+#   FAOSTAT_data.csv --(fao)--> rice_yield_vn.csv ----------------------.
+#                                                                        v
+#   vietnam_provinces_latlon.csv --(nasa)--> weather_all_vn_annual_2000-2023.csv --(merge)--> merged_yield_weather_vn.csv --(train)--> yield_model.pkl
+#                                        |
+#                                        '--> nasa_data/ --(forecast)--> weather_all_vn_annual_2000-2030.csv
+#
+# Mỗi bước khai báo input/output; dấu vân tay (SHA-256 nội dung input + mã nguồn của bước)
+# được lưu trong data/.pipeline_state.json. Bước nào input không đổi và output còn nguyên thì bỏ qua,
+# các bước độc lập (fao, nasa) chạy song song. Thời gian từng bước ghi vào data/pipeline_runs.jsonl.
+# Lần chạy đầu (chưa có trạng thái cho một bước) mà output của bước đã có sẵn trong data/ thì output đó
+# được ghi nhận làm mốc thay vì chạy lại (bước nasa tải lại từ mạng mất ~25 phút); --force để chạy lại.
+# Bước chỉ được ghi "ok" khi hàm chạy xong VÀ mọi output đều có mặt (thư mục thì phải có file); bước
+# không có dữ liệu (thiếu input, API không trả gì) ném StageError -> "failed", lần sau sẽ chạy lại.
+#
+# Cách dùng:
+#   python model/pipeline.py                 # chạy những gì đã thay đổi
+#   python model/pipeline.py --dry-run       # chỉ xem bước nào sẽ chạy
+#   python model/pipeline.py --force merge   # ép chạy lại một bước (và các bước sau nó)
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+
+MODEL_DIR = Path(__file__).resolve().parent
+BASE_DIR = MODEL_DIR.parent
+DATA_DIR = BASE_DIR / "data"
+
+STATE_FILE = DATA_DIR / ".pipeline_state.json"
+RUN_LOG = DATA_DIR / "pipeline_runs.jsonl"
+
+if str(MODEL_DIR) not in sys.path:
+    sys.path.insert(0, str(MODEL_DIR))
+
+
+# =========================================================
+#               CÁC BƯỚC
+# =========================================================
+
+class StageError(Exception):
+    """Bước chạy xong nhưng không có dữ liệu để ghi (thiếu input, API không trả về gì...)"""
+
+
+def _run_fao():
+    import process_fao
+    if process_fao.main().empty:
+        raise StageError("FAOSTAT_data.csv không có dòng năng suất lúa của Việt Nam")
+
+
+def _run_nasa():
+    import fetch_nasa_vietnam_final
+    if not fetch_nasa_vietnam_final.main(merge=False):
+        raise StageError("Không tải được dữ liệu NASA POWER cho tỉnh nào (hoặc thiếu danh sách tỉnh)")
+
+
+def _run_merge():
+    from merge_data import merge_yield_weather, print_report
+    print_report(merge_yield_weather())
+
+
+def _run_forecast():
+    from forecast_weather import forecast_weather, print_report
+    print_report(forecast_weather())
+
+
+def _run_train():
+    import train_predict_yield
+    train_predict_yield.main(show_plot=False)
+
+
+class Stage:
+    """Một bước của pipeline: hàm chạy + danh sách input/output + file mã nguồn"""
+
+    def __init__(self, name, func, inputs, outputs, sources):
+        self.name = name
+        self.func = func
+        self.inputs = [Path(p) for p in inputs]
+        self.outputs = [Path(p) for p in outputs]
+        self.sources = [MODEL_DIR / s for s in sources]
+        self.deps = set()
+
+    def missing_outputs(self):
+        """Output chưa có (thư mục rỗng cũng tính là thiếu)"""
+        return [path for path in self.outputs
+                if not path.exists() or (path.is_dir() and not any(p.is_file() for p in path.rglob("*")))]
+
+
+STAGES = [
+    Stage("fao", _run_fao,
+          inputs=[DATA_DIR / "FAOSTAT_data.csv"],
+          outputs=[DATA_DIR / "rice_yield_vn.csv"],
+          sources=["process_fao.py"]),
+    Stage("nasa", _run_nasa,
+          inputs=[DATA_DIR / "vietnam_provinces_latlon.csv"],
+          outputs=[DATA_DIR / "nasa_data", DATA_DIR / "weather_all_vn_annual_2000-2023.csv"],
+          sources=["fetch_nasa_vietnam_final.py"]),
+    Stage("merge", _run_merge,
+          inputs=[DATA_DIR / "weather_all_vn_annual_2000-2023.csv", DATA_DIR / "rice_yield_vn.csv"],
+          outputs=[DATA_DIR / "merged_yield_weather_vn.csv"],
+          sources=["merge_data.py"]),
+    Stage("forecast", _run_forecast,
+          inputs=[DATA_DIR / "nasa_data"],
+          outputs=[DATA_DIR / "weather_all_vn_annual_2000-2030.csv"],
+          sources=["forecast_weather.py"]),
+    Stage("train", _run_train,
+          inputs=[DATA_DIR / "rice_yield_vn.csv", DATA_DIR / "merged_yield_weather_vn.csv"],
+          outputs=[DATA_DIR / "yield_model.pkl"],
+          sources=["train_predict_yield.py"]),
+]
+
+
+class PipelineError(Exception):
+    """Pipeline không thể tiếp tục (vd. phụ thuộc vòng tròn giữa các bước)"""
+
+
+def resolve_dependencies(stages):
+    """Bước B phụ thuộc A nếu một input của B là (hoặc nằm trong) output của A"""
+    for stage in stages:
+        for other in stages:
+            if other is stage:
+                continue
+            for path in stage.inputs:
+                if any(path == out or out in path.parents for out in other.outputs):
+                    stage.deps.add(other.name)
+    return stages
+
+
+# =========================================================
+#               DẤU VÂN TAY NỘI DUNG
+# =========================================================
+
+class Fingerprinter:
+    """
+    Băm SHA-256 nội dung file/thư mục.
+    Kết quả băm từng file được nhớ theo (kích thước, mtime) để lần chạy sau không phải đọc lại file lớn.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache or {}
+
+    def file_hash(self, path):
+        stat = path.stat()
+        key = str(path)
+        cached = self.cache.get(key)
+        if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            return cached["sha256"]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        self.cache[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+        return digest
+
+    def path_hash(self, path):
+        """Băm một file, hoặc toàn bộ file trong thư mục (sắp xếp theo tên). None nếu không tồn tại."""
+        path = Path(path)
+        if path.is_file():
+            return self.file_hash(path)
+        if path.is_dir():
+            h = hashlib.sha256()
+            for child in sorted(p for p in path.rglob("*") if p.is_file()):
+                h.update(str(child.relative_to(path)).encode("utf-8"))
+                h.update(self.file_hash(child).encode("ascii"))
+            return h.hexdigest()
+        return None
+
+    def combine(self, paths):
+        h = hashlib.sha256()
+        for path in paths:
+            path = Path(path)
+            label = path.relative_to(BASE_DIR) if BASE_DIR in path.parents else path
+            h.update(label.as_posix().encode("utf-8"))
+            h.update((self.path_hash(path) or "missing").encode("ascii"))
+        return h.hexdigest()
+
+
+# =========================================================
+#               TRẠNG THÁI
+# =========================================================
+
+def load_state(path=STATE_FILE):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"stages": {}, "hashes": {}}
+
+
+def save_state(state, path=STATE_FILE):
+    """Ghi nguyên tử: file tạm + os.replace"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=path.name, suffix=".tmp", dir=path.parent)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+# =========================================================
+#               CHẠY
+# =========================================================
+
+class Pipeline:
+
+    def __init__(self, stages=STAGES, state_file=STATE_FILE, run_log=RUN_LOG, jobs=2):
+        self.stages = {s.name: s for s in resolve_dependencies(stages)}
+        self.state_file = Path(state_file)
+        self.run_log = Path(run_log)
+        self.jobs = jobs
+        self.state = load_state(self.state_file)
+        self.fingerprints = Fingerprinter(self.state.setdefault("hashes", {}))
+
+    def input_fingerprint(self, stage):
+        return self.fingerprints.combine(stage.inputs + stage.sources)
+
+    def adopt_existing(self, stage):
+        """
+        Bước chưa từng chạy qua pipeline nhưng output đã có đủ -> ghi nhận làm mốc (coi như ok).
+        Trả về True nếu đã ghi nhận.
+        """
+        if stage.name in self.state["stages"] or not stage.outputs:
+            return False
+        if stage.missing_outputs():
+            return False
+        self.state["stages"][stage.name] = {
+            "status": "ok",
+            "inputs": self.input_fingerprint(stage),
+            "outputs": self.fingerprints.combine(stage.outputs),
+            "finished_at": datetime.now().isoformat(timespec="seconds"),
+            "duration": 0.0,
+            "adopted": True,
+        }
+        print(f"📌 [{stage.name}] output đã có sẵn - ghi nhận làm mốc (--force {stage.name} để chạy lại)")
+        return True
+
+    def is_up_to_date(self, stage):
+        prev = self.state["stages"].get(stage.name)
+        if not prev or prev.get("status") != "ok":
+            return False
+        if prev.get("inputs") != self.input_fingerprint(stage):
+            return False
+        # Trạng thái cũ có thể đã ghi "ok" cho bước không sinh ra output ("missing" == "missing") -> chạy lại
+        if stage.missing_outputs():
+            return False
+        # Output bị xóa hoặc sửa tay -> chạy lại
+        return prev.get("outputs") == self.fingerprints.combine(stage.outputs)
+
+    def _downstream(self, names):
+        result = set(names)
+        changed = True
+        while changed:
+            changed = False
+            for stage in self.stages.values():
+                if stage.name not in result and stage.deps & result:
+                    result.add(stage.name)
+                    changed = True
+        return result
+
+    def _execute(self, stage):
+        print(f"▶️  [{stage.name}] bắt đầu")
+        t = time.perf_counter()
+        try:
+            stage.func()
+            missing = stage.missing_outputs()
+            if missing:
+                raise StageError("không tạo ra output: " + ", ".join(
+                    str(path.relative_to(BASE_DIR) if BASE_DIR in path.parents else path) for path in missing))
+            status, error = "ok", None
+        except StageError as e:
+            print(f"⚠️  [{stage.name}] {e}")
+            status, error = "failed", f"StageError: {e}"
+        except BaseException as e:
+            traceback.print_exc()
+            status, error = "failed", f"{type(e).__name__}: {e}"
+        return status, error, time.perf_counter() - t
+
+    def run(self, force=(), only=None, dry_run=False):
+        """
+        Chạy các bước theo thứ tự phụ thuộc, song song khi có thể.
+        Trả về dict {tên bước: {"status": ok|skipped|failed|blocked|pending, "duration": giây}}.
+        """
+        forced = self._downstream(force)
+        wanted = set(self.stages) if only is None else set(only)
+        started_at = datetime.now().isoformat(timespec="seconds")
+        results = {}
+        done = set()
+        running = {}
+        t_start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            while len(done) < len(self.stages):
+                progressed = False
+                for name, stage in self.stages.items():
+                    if name in done or name in running.values():
+                        continue
+                    if not stage.deps <= done:
+                        continue
+                    progressed = True
+                    if any(results[d]["status"] in ("failed", "blocked") for d in stage.deps):
+                        results[name] = {"status": "blocked", "duration": 0.0}
+                        done.add(name)
+                        continue
+                    # Input được băm lại sau khi bước trước chạy xong: nếu bước trước sinh ra
+                    # nội dung y hệt thì bước này vẫn được bỏ qua
+                    upstream_pending = any(results[d]["status"] == "pending" for d in stage.deps)
+                    upstream_ran = any(results[d]["status"] == "ok" for d in stage.deps)
+                    if name not in forced and not upstream_pending and not upstream_ran:
+                        self.adopt_existing(stage)
+                    needs_run = name in forced or upstream_pending or not self.is_up_to_date(stage)
+                    if name not in wanted or not needs_run:
+                        results[name] = {"status": "skipped", "duration": 0.0}
+                        done.add(name)
+                        print(f"⏭️  [{name}] không thay đổi - bỏ qua" if name in wanted else f"⏭️  [{name}] không chọn")
+                        continue
+                    if dry_run:
+                        results[name] = {"status": "pending", "duration": 0.0}
+                        done.add(name)
+                        print(f"📝 [{name}] sẽ chạy")
+                        continue
+                    running[pool.submit(self._execute, stage)] = name
+
+                if not running:
+                    if not progressed:
+                        waiting = {name: sorted(self.stages[name].deps - done)
+                                   for name in self.stages if name not in done}
+                        raise PipelineError(f"Không bước nào chạy được, các bước còn chờ phụ thuộc: {waiting}")
+                    continue
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    status, error, duration = future.result()
+                    stage = self.stages[name]
+                    results[name] = {"status": status, "duration": round(duration, 3)}
+                    if error:
+                        results[name]["error"] = error
+                    self.state["stages"][name] = {
+                        "status": status,
+                        "inputs": self.input_fingerprint(stage),
+                        "outputs": self.fingerprints.combine(stage.outputs),
+                        "finished_at": datetime.now().isoformat(timespec="seconds"),
+                        "duration": round(duration, 3),
+                    }
+                    done.add(name)
+                    icon = "✅" if status == "ok" else "❌"
+                    print(f"{icon} [{name}] {status} sau {duration:.2f}s")
+
+        if not dry_run:
+            save_state(self.state, self.state_file)
+            self._log_run(results, started_at, time.perf_counter() - t_start)
+        return results
+
+    def _log_run(self, results, started_at, total):
+        entry = {
+            "started_at": started_at,
+            "total": round(total, 3),
+            "stages": results,
+        }
+        with open(self.run_log, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chạy pipeline dữ liệu FAO → NASA → gộp → huấn luyện")
+    parser.add_argument("--force", nargs="*", default=[], help="Ép chạy lại các bước này (và các bước sau)")
+    parser.add_argument("--only", nargs="*", default=None, help="Chỉ xét các bước này")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ in ra bước nào sẽ chạy")
+    parser.add_argument("--jobs", type=int, default=2, help="Số bước chạy song song tối đa")
+    args = parser.parse_args(argv)
+
+    unknown = [n for n in list(args.force) + list(args.only or []) if n not in {s.name for s in STAGES}]
+    if unknown:
+        print(f"LỖI: không có bước {unknown}. Các bước: {[s.name for s in STAGES]}")
+        return 2
+
+    try:
+        results = Pipeline(jobs=args.jobs).run(force=args.force, only=args.only, dry_run=args.dry_run)
+    except PipelineError as e:
+        print(f"LỖI: {e}")
+        return 2
+    print("\n" + "=" * 50)
+    for name, r in results.items():
+        print(f"   {name:<8} {r['status']:<8} {r['duration']:.2f}s")
+    print("=" * 50)
+    return 1 if any(r["status"] in ("failed", "blocked") for r in results.values()) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
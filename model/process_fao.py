@@ -1,32 +1,44 @@
 import pandas as pd
+from pathlib import Path
+
+# Đường dẫn tính theo vị trí script (không phụ thuộc thư mục đang đứng khi chạy)
+BASE_DIR = Path(__file__).resolve().parents[1]
+DATA_DIR = BASE_DIR / "data"
 
 # Đường dẫn đến file CSV bạn đã tải
-input_file = '../data/FAOSTAT_data.csv'
-output_file = '../data/rice_yield_vn.csv'
+input_file = DATA_DIR / 'FAOSTAT_data.csv'
+output_file = DATA_DIR / 'rice_yield_vn.csv'
+
+
+def main(input_file=input_file, output_file=output_file):
+    # Đọc file CSV
+    df = pd.read_csv(input_file)
+
+    # Kiểm tra xem các cột có đúng như mong đợi không
+    print("Các cột trong file:", df.columns.tolist())
 
-# Đọc file CSV
-df = pd.read_csv(input_file)
+    # Lọc dữ liệu cho Việt Nam - Rice - Yield
+    df = df[(df['Area'].str.contains('Viet', case=False)) &
+            (df['Item'].str.contains('Rice', case=False)) &
+            (df['Element'].str.contains('Yield', case=False))]
 
-# Kiểm tra xem các cột có đúng như mong đợi không
-print("Các cột trong file:", df.columns.tolist())
+    # Chuyển kiểu dữ liệu
+    df['Year'] = pd.to_numeric(df['Year'], errors='coerce')
+    df['Value'] = pd.to_numeric(df['Value'], errors='coerce')
 
-# Lọc dữ liệu cho Việt Nam - Rice - Yield
-df = df[(df['Area'].str.contains('Viet', case=False)) &
-        (df['Item'].str.contains('Rice', case=False)) &
-        (df['Element'].str.contains('Yield', case=False))]
+    # Dữ liệu của bạn hiện là kg/ha → đổi sang tấn/ha
+    df['Yield (ton/ha)'] = df['Value'] / 1000
 
-# Chuyển kiểu dữ liệu
-df['Year'] = pd.to_numeric(df['Year'], errors='coerce')
-df['Value'] = pd.to_numeric(df['Value'], errors='coerce')
+    # Giữ lại 2 cột cần thiết
+    clean_df = df[['Year', 'Yield (ton/ha)']].dropna().sort_values('Year')
 
-# Dữ liệu của bạn hiện là kg/ha → đổi sang tấn/ha
-df['Yield (ton/ha)'] = df['Value'] / 1000
+    # Xuất dữ liệu sạch
+    clean_df.to_csv(output_file, index=False)
 
-# Giữ lại 2 cột cần thiết
-clean_df = df[['Year', 'Yield (ton/ha)']].dropna().sort_values('Year')
+    print(f'✅ Đã lưu file sạch tại: {output_file}')
+    print(clean_df.head(10))
+    return clean_df
 
-# Xuất dữ liệu sạch
-clean_df.to_csv(output_file, index=False)
 
-print(f'✅ Đã lưu file sạch tại: {output_file}')
-print(clean_df.head(10))
+if __name__ == "__main__":
+    main()
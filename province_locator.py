@@ -0,0 +1,88 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+
+from provinces import canonical_province
+
+# =========================================================
+#               TỌA ĐỘ -> TỈNH GẦN NHẤT
+# =========================================================
+# Dựng BallTree (khoảng cách haversine) MỘT LẦN trên tâm 63 tỉnh trong
+# data/vietnam_provinces_latlon.csv. Tọa độ bất kỳ (thành phố từ OpenWeatherMap, vị trí ruộng)
+# được gắn với tỉnh gần nhất để nối với chuỗi thời tiết NASA / mô hình theo tỉnh.
+
+PROVINCES_FILE = os.path.join(os.path.dirname(__file__), "data", "vietnam_provinces_latlon.csv")
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+class ProvinceLocator:
+
+    def __init__(self, frame):
+        frame = frame.dropna(subset=["Latitude", "Longitude"]).reset_index(drop=True)
+        self.names = frame["Province"].to_numpy(dtype=object)
+        self.keys = np.array([canonical_province(name) for name in self.names], dtype=object)
+        self.lat = frame["Latitude"].to_numpy(dtype=float)
+        self.lon = frame["Longitude"].to_numpy(dtype=float)
+        self._row = {key: i for i, key in enumerate(self.keys)}
+        self._tree = BallTree(np.radians(np.column_stack([self.lat, self.lon])), metric="haversine")
+
+    def __len__(self):
+        return len(self.names)
+
+    def coordinates(self, province):
+        """(lat, lon) tâm tỉnh theo tên bất kỳ (có dấu/không dấu), None nếu không biết"""
+        i = self._row.get(canonical_province(province))
+        return None if i is None else (float(self.lat[i]), float(self.lon[i]))
+
+    def nearest_many(self, lats, lons, k=1):
+        """
+        Tra theo lô. Trả về dict:
+        index [n, k] (chỉ số tỉnh), provinces [n, k], keys [n, k], distances_km [n, k] - gần nhất trước.
+        """
+        lats = np.asarray(lats, dtype=float).reshape(-1)
+        lons = np.asarray(lons, dtype=float).reshape(-1)
+        if lats.shape != lons.shape:
+            raise ValueError("lat và lon phải cùng độ dài")
+        if not np.isfinite(lats).all() or not np.isfinite(lons).all() \
+                or (np.abs(lats) > 90).any() or (np.abs(lons) > 180).any():
+            raise ValueError("Tọa độ không hợp lệ")
+        k = max(1, min(int(k), len(self)))
+        distances, index = self._tree.query(np.radians(np.column_stack([lats, lons])), k=k)
+        return {
+            "index": index,
+            "provinces": self.names[index],
+            "keys": self.keys[index],
+            "distances_km": distances * EARTH_RADIUS_KM,
+        }
+
+    def nearest(self, lat, lon, k=1):
+        """Danh sách k tỉnh gần nhất: [(tên tỉnh, khoảng cách km), ...]"""
+        result = self.nearest_many([lat], [lon], k)
+        return [(name, float(d)) for name, d in zip(result["provinces"][0], result["distances_km"][0])]
+
+    def locate(self, lat, lon):
+        """Tên tỉnh gần nhất"""
+        return self.nearest(lat, lon, 1)[0][0]
+
+    @classmethod
+    def from_csv(cls, path=PROVINCES_FILE):
+        return cls(pd.read_csv(path))
+
+
+# ----------------- SINGLETON -----------------
+_locator = None
+_locator_lock = threading.Lock()
+
+
+def get_province_locator():
+    """Trả về bộ tra dùng chung; cây chỉ dựng một lần cho cả tiến trình"""
+    global _locator
+    if _locator is None:
+        with _locator_lock:
+            if _locator is None:
+                _locator = ProvinceLocator.from_csv()
+    return _locator
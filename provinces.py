@@ -0,0 +1,44 @@
+import unicodedata
+
+# =========================================================
+#               CHUẨN HÓA TÊN TỈNH THÀNH
+# =========================================================
+# Dữ liệu mùa vụ ghi tỉnh theo nhiều kiểu ("Hà Nội", "HaNoi", "TP. Hồ Chí Minh"),
+# còn file NASA dùng tên không dấu viết liền ("HaNoi_2000-2023.csv").
+# Mọi nơi cần nối dữ liệu theo tỉnh đều dùng khóa chuẩn do canonical_province() sinh ra.
+
+# Tiền tố hành chính bỏ đi khi chuẩn hóa
+_PREFIXES = ("thanhpho", "tinh", "tp")
+
+# Tên gọi khác -> khóa chuẩn (khóa chuẩn = tên file NASA viết thường)
+PROVINCE_ALIASES = {
+    "hochiminh": "hochiminhcity",
+    "saigon": "hochiminhcity",
+    "hcm": "hochiminhcity",
+    "hue": "thuathienhue",
+    "vungtau": "bariavungtau",
+    "brvt": "bariavungtau",
+    "daklac": "daklak",
+}
+
+
+def strip_accents(text):
+    """Bỏ dấu tiếng Việt (kể cả chữ đ/Đ)"""
+    text = text.replace("đ", "d").replace("Đ", "D")
+    normalized = unicodedata.normalize("NFD", text)
+    return "".join(ch for ch in normalized if unicodedata.category(ch) != "Mn")
+
+
+def canonical_province(name):
+    """
+    Trả về khóa chuẩn của tỉnh: không dấu, viết thường, bỏ khoảng trắng/ký tự đặc biệt.
+    Ví dụ: "Hà Nội" -> "hanoi", "TP. Hồ Chí Minh" -> "hochiminhcity".
+    """
+    if not name or not isinstance(name, str):
+        return ""
+    key = "".join(ch for ch in strip_accents(name).lower() if ch.isalnum())
+    for prefix in _PREFIXES:
+        if key.startswith(prefix) and len(key) > len(prefix) + 2:
+            key = key[len(prefix):]
+            break
+    return PROVINCE_ALIASES.get(key, key)
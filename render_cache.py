@@ -0,0 +1,203 @@
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from flask import Response, g, message_flashed, request, session
+
+import config
+import metrics
+from compression import mark_cacheable
+
+# =========================================================
+#               CACHE TRANG ĐÃ RENDER
+# =========================================================
+# Lưu HTML đã render của các trang nặng (/overview, /manage) trong SQLite để mọi worker
+# dùng chung. Khóa = (route + query string, user, nguồn dữ liệu); mỗi bản ghi gắn với "data version" —
+# một bộ đếm tăng mỗi lần mùa vụ bị thêm/sửa/xóa (bump_data_version). Version đổi thì
+# bản cũ tự hết hiệu lực. Tổng dung lượng bị giới hạn, vượt thì xóa bản ít dùng nhất.
+# Trong mỗi tiến trình còn một lớp dict nhỏ để lần xem lặp lại không phải đọc BLOB.
+# Nguồn dữ liệu (Firestore / CSV ở chế độ offline) do app đăng ký qua set_page_source(): trang render từ
+# nguồn này không được trả lại khi app chạy với nguồn kia.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS pages (
+    key TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL,
+    body BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed);
+"""
+
+LOCAL_ENTRIES = 256
+
+
+class RenderCache:
+
+    def __init__(self, path, max_bytes, ttl):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._local = threading.local()
+        self._memory = {}  # key -> (version, created, body)
+        self._memory_lock = threading.Lock()
+        self._pid = None
+
+    # ----------------- KẾT NỐI -----------------
+    def _conn(self):
+        # Mỗi luồng (và mỗi tiến trình sau fork) một kết nối riêng
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._pid = os.getpid()
+        return conn
+
+    # ----------------- DATA VERSION -----------------
+    def data_version(self):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'data_version'").fetchone()
+        return row[0] if row else 0
+
+    def bump(self):
+        """Tăng data version: mọi trang đã cache trước đó hết hiệu lực"""
+        self._conn().execute(
+            "INSERT INTO meta (key, value) VALUES ('data_version', 1) "
+            "ON CONFLICT(key) DO UPDATE SET value = value + 1")
+
+    # ----------------- ĐỌC / GHI -----------------
+    def get(self, key, version):
+        now = time.time()
+        with self._memory_lock:
+            entry = self._memory.get(key)
+        if entry and entry[0] == version and now - entry[1] < self.ttl:
+            return entry[2]
+        conn = self._conn()
+        row = conn.execute("SELECT version, created, body FROM pages WHERE key = ?", (key,)).fetchone()
+        if row is None or row[0] != version or now - row[1] >= self.ttl:
+            return None
+        conn.execute("UPDATE pages SET accessed = ? WHERE key = ?", (now, key))
+        body = bytes(row[2])
+        self._remember(key, (version, row[1], body))
+        return body
+
+    def set(self, key, version, body):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO pages (key, version, created, accessed, size, body) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", (key, version, now, now, len(body), body))
+        self._remember(key, (version, now, body))
+        self._evict(conn)
+
+    def _remember(self, key, entry):
+        with self._memory_lock:
+            if key not in self._memory and len(self._memory) >= LOCAL_ENTRIES:
+                self._memory.pop(next(iter(self._memory)))
+            self._memory[key] = entry
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Xóa bản cũ version trước, rồi tới bản lâu không dùng cho đến khi còn ~90% giới hạn
+        conn.execute("DELETE FROM pages WHERE version < ?", (self.data_version(),))
+        excess = conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0] - int(self.max_bytes * 0.9)
+        if excess <= 0:
+            return
+        removed = 0
+        keys = []
+        for key, size in conn.execute("SELECT key, size FROM pages ORDER BY accessed"):
+            keys.append((key,))
+            removed += size
+            if removed >= excess:
+                break
+        conn.executemany("DELETE FROM pages WHERE key = ?", keys)
+
+    def clear(self):
+        self._conn().execute("DELETE FROM pages")
+        with self._memory_lock:
+            self._memory.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_render_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RenderCache(config.RENDER_CACHE_PATH, config.RENDER_CACHE_MAX_MB * 1024 * 1024,
+                                     config.RENDER_CACHE_TTL)
+    return _cache
+
+
+def bump_data_version():
+    """Gọi sau mỗi lần ghi mùa vụ (thêm/sửa/xóa/cập nhật năng suất)"""
+    if not config.RENDER_CACHE_ENABLED:
+        return
+    try:
+        get_render_cache().bump()
+    except sqlite3.Error as e:
+        print(f"⚠️ Không cập nhật được data version của render cache: {e}")
+
+
+# ----------------- FLASK -----------------
+_page_source = None
+
+
+def set_page_source(fn):
+    """fn() -> tên nguồn dữ liệu hiện tại của các trang (vd. "firestore" / "csv"), thêm vào khóa cache"""
+    global _page_source
+    _page_source = fn
+
+
+def _on_flash(sender, message, category, **extra):
+    # Trang có thông báo flash là kết quả của một lần xử lý cụ thể -> không cache
+    metrics.set_request_value("render_cache_skip", True)
+
+
+message_flashed.connect(_on_flash)
+
+
+def cached_page(f):
+    """
+    Decorator cho route GET trả về HTML: trả bản đã render nếu data version chưa đổi.
+    Không cache khi: không phải GET, đang có flash chờ hiển thị, request gặp lỗi Firestore
+    hoặc kết quả không phải HTML (redirect, Response...).
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not config.RENDER_CACHE_ENABLED or request.method != "GET" or session.get("_flashes"):
+            return f(*args, **kwargs)
+        key = f"{request.full_path}|{session.get('user', '')}|{_page_source() if _page_source else ''}"
+        try:
+            cache = get_render_cache()
+            version = cache.data_version()
+            body = cache.get(key, version)
+        except sqlite3.Error as e:
+            print(f"⚠️ Render cache lỗi, bỏ qua: {e}")
+            return f(*args, **kwargs)
+        metrics.record_cache("render", body is not None)
+        if body is not None:
+            mark_cacheable()
+            return Response(body, mimetype="text/html")
+
+        rv = f(*args, **kwargs)
+        if isinstance(rv, str) and not g.get("render_cache_skip") and not g.get("firestore_error"):
+            try:
+                cache.set(key, version, rv.encode("utf-8"))
+                mark_cacheable()
+            except sqlite3.Error as e:
+                print(f"⚠️ Không ghi được render cache: {e}")
+        return rv
+    return decorated_function
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+from compression import encode_array
+from provinces import canonical_province
+
+# =========================================================
+#               KỊCH BẢN WHAT-IF (BỀ MẶT NĂNG SUẤT)
+# =========================================================
+# Đánh giá mô hình năng suất (yield_model.pkl: [TempAvg, RainfallAnnual, HumidityAvg] -> tấn/ha)
+# trên một lưới độ lệch thời tiết quanh khí hậu trung bình của tỉnh (hoặc trung bình cả nước):
+#   nhiệt độ + Δ°C, lượng mưa × (1 + Δ%), độ ẩm + Δ%
+# Toàn bộ lưới × tỉnh được dựng thành một ma trận đầu vào và gọi model.predict MỘT lần.
+# Bề mặt kết quả được nhớ theo (phiên bản mô hình, lưới, danh sách tỉnh).
+
+AXES = ("temp_shift", "rain_pct", "humidity_shift")
+
+DEFAULT_GRID = {
+    "temp_shift": (-2.0, 2.0, 9),        # °C
+    "rain_pct": (-30.0, 30.0, 7),        # %
+    "humidity_shift": (0.0, 0.0, 1),     # điểm %
+}
+
+MAX_STEPS = 101
+MAX_POINTS = 200_000                     # số tỉnh × số điểm lưới
+MAX_SURFACES = 128
+
+
+class ScenarioError(ValueError):
+    """Tham số lưới/tỉnh không hợp lệ"""
+
+
+def model_version(path):
+    """Phiên bản mô hình = băm (đường dẫn, kích thước, mtime) của file; None nếu không có file"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return hashlib.sha1(f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}".encode()).hexdigest()[:12]
+
+
+def parse_axis(name, text):
+    """"start,stop,steps" -> (start, stop, steps); chuỗi rỗng -> mặc định"""
+    if not text:
+        return DEFAULT_GRID[name]
+    parts = [p.strip() for p in str(text).split(",")]
+    try:
+        if len(parts) == 1:
+            value = float(parts[0])
+            return value, value, 1
+        start, stop, steps = float(parts[0]), float(parts[1]), int(parts[2])
+    except (IndexError, ValueError):
+        raise ScenarioError(f"{name} phải có dạng start,stop,steps hoặc một giá trị")
+    if not 1 <= steps <= MAX_STEPS:
+        raise ScenarioError(f"{name}: steps phải trong khoảng 1-{MAX_STEPS}")
+    if not (np.isfinite(start) and np.isfinite(stop)):
+        raise ScenarioError(f"{name}: giá trị không hợp lệ")
+    return start, stop, steps
+
+
+def grid_from_args(args):
+    return tuple(parse_axis(name, args.get(name)) for name in AXES)
+
+
+def _axis_values(spec):
+    start, stop, steps = spec
+    return np.linspace(start, stop, steps) if steps > 1 else np.array([start])
+
+
+def sweep(model, index, grid, provinces=()):
+    """
+    Bề mặt năng suất [số tỉnh (hoặc 1 = cả nước), T, R, H] (tấn/ha).
+    provinces: danh sách tên tỉnh; rỗng -> khí hậu trung bình cả nước.
+    """
+    temp, rain, humid = (_axis_values(spec) for spec in grid)
+    if provinces:
+        rows = index.rows(provinces)
+        unknown = [p for p, r in zip(provinces, rows) if r < 0]
+        if unknown:
+            raise ScenarioError(f"Không có dữ liệu khí hậu cho tỉnh: {', '.join(unknown)}")
+        base = index.normals[rows]
+    else:
+        base = np.nanmean(index.normals, axis=0, keepdims=True)
+
+    n_points = len(base) * len(temp) * len(rain) * len(humid)
+    if n_points > MAX_POINTS:
+        raise ScenarioError(f"Lưới quá lớn ({n_points:,} điểm, tối đa {MAX_POINTS:,})")
+
+    # [P, T, R, H, 3] bằng broadcast, rồi làm phẳng thành ma trận đầu vào cho mô hình
+    shape = (len(base), len(temp), len(rain), len(humid))
+    X = np.empty(shape + (3,))
+    X[..., 0] = base[:, 0, None, None, None] + temp[None, :, None, None]
+    X[..., 1] = base[:, 1, None, None, None] * (1.0 + rain[None, None, :, None] / 100.0)
+    X[..., 2] = np.clip(base[:, 2, None, None, None] + humid[None, None, None, :], 0.0, 100.0)
+    with metrics.MODEL_INFERENCE.time("yield_model_sweep"):
+        yields = np.asarray(model.predict(X.reshape(-1, 3)), dtype=float).reshape(shape)
+    return {
+        "axes": {"temp_shift": temp, "rain_pct": rain, "humidity_shift": humid},
+        "base": base,
+        "yield": yields,
+    }
+
+
+class SurfaceCache:
+    """Nhớ bề mặt đã tính (chuỗi JSON đã serialize) theo (phiên bản mô hình, lưới, tỉnh); LRU có giới hạn"""
+
+    def __init__(self, max_entries=MAX_SURFACES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+        metrics.record_cache("scenario_surface", value is not None)
+        if value is None:
+            value = compute()
+            with self._lock:
+                self._entries[key] = value
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+
+_surfaces = SurfaceCache()
+
+
+def surface_json(model, version, index, grid, provinces=(), encoding="json"):
+    """
+    Bề mặt what-if dạng gọn cho heatmap (chuỗi JSON): các trục, khí hậu nền, shape và mảng yield phẳng
+    (row-major; encoding="f32" -> base64 float32). Lưu sẵn chuỗi JSON -> lần gọi lặp lại không phải serialize lại hàng chục nghìn số.
+    """
+    provinces = tuple(provinces)
+    key = (version, grid, tuple(canonical_province(p) for p in provinces), encoding)
+
+    def compute():
+        result = sweep(model, index, grid, provinces)
+        return json.dumps({
+            "model_version": version,
+            "axes": {name: np.round(values, 4).tolist() for name, values in result["axes"].items()},
+            "provinces": list(provinces) or ["Cả nước"],
+            "base": np.round(result["base"], 2).tolist(),
+            "shape": list(result["yield"].shape),
+            "yield": encode_array(result["yield"].reshape(-1), encoding, precision=3),
+        }, ensure_ascii=False, separators=(",", ":"))
+    return _surfaces.get_or_compute(key, compute)
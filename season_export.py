@@ -0,0 +1,167 @@
+import csv
+import io
+import json
+import math
+from datetime import datetime
+
+import pandas as pd
+
+from provinces import canonical_province
+
+# =========================================================
+#               XUẤT MÙA VỤ (STREAMING)
+# =========================================================
+# Xuất mùa vụ ra CSV hoặc NDJSON dưới dạng generator: Firestore đọc theo trang bằng
+# cursor (start_after), CSV offline đọc theo chunk -> bộ nhớ không tăng theo số mùa vụ,
+# byte đầu tiên được gửi ngay khi có.
+
+EXPORT_COLUMNS = ["id", "farmer_name", "province", "crop", "area", "sow_date", "harvest_date",
+                  "fertilizer", "notes", "actual_yield", "yield_source", "created_at", "user"]
+
+NUMERIC_COLUMNS = {"area", "actual_yield"}
+
+PAGE_SIZE = 500
+CSV_CHUNK_SIZE = 5000
+
+
+class ExportFilters:
+    """Bộ lọc xuất dữ liệu: user, tỉnh, cây trồng, khoảng ngày gieo (YYYY-MM-DD)"""
+
+    def __init__(self, user=None, province=None, crop=None, date_from=None, date_to=None):
+        self.user = user or None
+        self.province = canonical_province(province) if province else None
+        self.crop = crop.strip().lower() if crop else None
+        self.date_from = _check_date(date_from, "date_from")
+        self.date_to = _check_date(date_to, "date_to")
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(args.get("user"), args.get("province"), args.get("crop"),
+                   args.get("date_from"), args.get("date_to"))
+
+    def match(self, record):
+        """Lọc một bản ghi (dict) - dùng cho dữ liệu Firestore"""
+        if self.user and record.get("user") != self.user:
+            return False
+        if self.province and canonical_province(record.get("province")) != self.province:
+            return False
+        crop = record.get("crop")
+        if self.crop and (not isinstance(crop, str) or crop.strip().lower() != self.crop):
+            return False
+        if self.date_from or self.date_to:
+            sow = str(record.get("sow_date") or "")[:10]
+            if not sow or (self.date_from and sow < self.date_from) or (self.date_to and sow > self.date_to):
+                return False
+        return True
+
+    def mask(self, chunk):
+        """Lọc vector hóa trên một DataFrame (chunk đọc từ CSV)"""
+        keep = pd.Series(True, index=chunk.index)
+        if self.user:
+            keep &= chunk.get("user", "") == self.user
+        if self.province:
+            provinces = chunk.get("province", pd.Series("", index=chunk.index))
+            keys = {name: canonical_province(name) for name in provinces.unique()}
+            keep &= provinces.map(keys) == self.province
+        if self.crop:
+            keep &= chunk.get("crop", pd.Series("", index=chunk.index)).str.strip().str.lower() == self.crop
+        if self.date_from or self.date_to:
+            sow = chunk.get("sow_date", pd.Series("", index=chunk.index)).str.slice(0, 10)
+            keep &= sow != ""
+            if self.date_from:
+                keep &= sow >= self.date_from
+            if self.date_to:
+                keep &= sow <= self.date_to
+        return keep
+
+
+def _check_date(value, name):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"{name} phải có dạng YYYY-MM-DD")
+
+
+# ----------------- NGUỒN DỮ LIỆU -----------------
+def iter_firestore(db, filters, page_size=PAGE_SIZE):
+    """Duyệt collection seasons theo trang (order_by __name__ + start_after)"""
+    base = db.collection("seasons")
+    if filters.user:
+        base = base.where("user", "==", filters.user)
+    base = base.order_by("__name__")
+    last = None
+    while True:
+        query = base.start_after(last) if last is not None else base
+        count = 0
+        for doc in query.limit(page_size).stream():
+            count += 1
+            last = doc
+            record = doc.to_dict() or {}
+            record["id"] = doc.id
+            if filters.match(record):
+                yield record
+        if count < page_size:
+            return
+
+
+def iter_csv_chunks(path, filters, chunksize=CSV_CHUNK_SIZE):
+    """Đọc seasons.csv theo chunk; id = chỉ số dòng (giống các route CSV)"""
+    reader = pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunksize)
+    for chunk in reader:
+        chunk.insert(0, "id", chunk.index.astype(str))
+        chunk = chunk[filters.mask(chunk)]
+        if len(chunk):
+            yield chunk
+
+
+# ----------------- ĐỊNH DẠNG -----------------
+def _clean(value):
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _csv_value(value):
+    value = _clean(value)
+    return "" if value is None else value
+
+
+def _csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+
+def export_firestore(db, filters, fmt, page_size=PAGE_SIZE):
+    if fmt == "csv":
+        yield "\ufeff" + _csv_line(EXPORT_COLUMNS)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for i, record in enumerate(iter_firestore(db, filters, page_size), 1):
+            writer.writerow([_csv_value(record.get(c)) for c in EXPORT_COLUMNS])
+            if i % page_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    else:
+        for record in iter_firestore(db, filters, page_size):
+            yield json.dumps({k: _clean(v) for k, v in record.items()}, ensure_ascii=False, default=str) + "\n"
+
+
+def export_csv_file(path, filters, fmt, chunksize=CSV_CHUNK_SIZE):
+    if fmt == "csv":
+        yield "\ufeff" + _csv_line(EXPORT_COLUMNS)
+    for chunk in iter_csv_chunks(path, filters, chunksize):
+        if fmt == "csv":
+            yield chunk.reindex(columns=EXPORT_COLUMNS, fill_value="").to_csv(index=False, header=False)
+        else:
+            for column in NUMERIC_COLUMNS.intersection(chunk.columns):
+                chunk[column] = pd.to_numeric(chunk[column], errors="coerce")
+            lines = chunk.to_json(orient="records", lines=True, force_ascii=False)
+            yield lines if lines.endswith("\n") else lines + "\n"
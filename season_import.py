@@ -0,0 +1,339 @@
+# season_import.py
+# Nhập hàng loạt mùa vụ từ CSV/XLSX (vd. danh sách của cả một hợp tác xã):
+#   - kiểm tra + chuẩn hóa vector hóa: tỉnh (theo data/vietnam_provinces_latlon.csv), ngày, diện tích, cây trồng
+#   - tính năng suất theo lô cho dòng chưa có actual_yield (yield_engine.calculate_yields)
+#   - ghi Firestore theo batch 500 document, hoặc nối vào seasons.csv một lần (chế độ offline)
+#   - id document Firestore cố định theo nội dung dòng (import_doc_ids): batch lỗi giữa chừng thì báo số
+#     document đã ghi + khoảng dòng lỗi (SeasonWriteError), nhập lại cùng file không tạo bản trùng
+#   - trả về báo cáo lỗi theo từng dòng (số dòng tính như trong file, dòng tiêu đề = 1)
+#
+# Dùng qua API: POST /api/seasons/import (multipart, field "file")
+# hoặc CLI:
+#   python season_import.py hop_tac_xa.xlsx --user nongdan@example.com
+#   python season_import.py seasons.csv --user a@b.c --dry-run      # chỉ kiểm tra, không ghi
+#   python season_import.py seasons.csv --user a@b.c --offline      # ghi vào data/seasons.csv
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from provinces import canonical_province, strip_accents
+from season_model import season_columns
+from yield_engine import calculate_yields
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROVINCES_FILE = os.path.join(BASE_DIR, "data", "vietnam_provinces_latlon.csv")
+SEASONS_CSV = os.path.join(BASE_DIR, "data", "seasons.csv")
+
+FIRESTORE_BATCH_SIZE = 500  # giới hạn số thao tác trong một batch của Firestore
+MAX_ERRORS_REPORTED = 1000
+
+REQUIRED_COLUMNS = ["farmer_name", "province", "crop", "area", "sow_date"]
+OPTIONAL_COLUMNS = ["harvest_date", "fertilizer", "notes", "actual_yield"]
+
+# Tên cột hay gặp trong file của hợp tác xã -> tên cột chuẩn
+COLUMN_ALIASES = {
+    "ten nong dan": "farmer_name", "nong dan": "farmer_name", "ho ten": "farmer_name",
+    "tinh": "province", "tinh thanh": "province",
+    "cay trong": "crop", "loai cay": "crop",
+    "dien tich": "area", "dien tich (ha)": "area",
+    "ngay gieo": "sow_date", "ngay trong": "sow_date",
+    "ngay thu hoach": "harvest_date",
+    "phan bon": "fertilizer",
+    "ghi chu": "notes",
+    "nang suat": "actual_yield", "san luong": "actual_yield",
+}
+
+
+class SeasonImportError(ValueError):
+    """File không đọc được hoặc thiếu cột bắt buộc"""
+
+
+class SeasonWriteError(Exception):
+    """Ghi Firestore lỗi giữa chừng; các batch trước batch lỗi đã được commit"""
+
+    def __init__(self, written, failed_rows, error):
+        super().__init__(f"đã ghi {written} mùa vụ, lỗi ở dòng {failed_rows[0]}-{failed_rows[1]}: {error}")
+        self.written = written
+        self.failed_rows = failed_rows  # (dòng đầu, dòng cuối) trong file của batch lỗi
+        self.error = error
+
+
+# =========================================================
+#               ĐỌC FILE
+# =========================================================
+
+def read_table(source, filename=None):
+    """Đọc CSV/XLSX (đường dẫn hoặc file-like) thành DataFrame toàn chuỗi"""
+    name = (filename or str(source)).lower()
+    try:
+        if name.endswith((".xlsx", ".xlsm", ".xls")):
+            df = pd.read_excel(source, dtype=str)
+        else:
+            df = pd.read_csv(source, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    except ImportError as e:
+        raise SeasonImportError(f"Cần cài thêm thư viện để đọc file Excel (pip install openpyxl): {e}")
+    except Exception as e:
+        raise SeasonImportError(f"Không đọc được file: {e}")
+    return df.fillna("")
+
+
+def _normalize_columns(df):
+    renamed = {}
+    for column in df.columns:
+        key = " ".join(strip_accents(str(column)).lower().replace("_", " ").split())
+        renamed[column] = COLUMN_ALIASES.get(key, key.replace(" ", "_"))
+    df = df.rename(columns=renamed)
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise SeasonImportError(f"Thiếu cột bắt buộc: {', '.join(missing)}")
+    for column in OPTIONAL_COLUMNS:
+        if column not in df.columns:
+            df[column] = ""
+    return df
+
+
+def _province_names():
+    """Khóa chuẩn -> tên tỉnh dùng trong app (giống danh sách chọn ở /manage)"""
+    names = pd.read_csv(PROVINCES_FILE)["Province"]
+    return {canonical_province(name): name for name in names}
+
+
+def _parse_dates(values):
+    """Chấp nhận YYYY-MM-DD hoặc DD/MM/YYYY; trả về chuỗi YYYY-MM-DD (NaN nếu lỗi)"""
+    text = values.str.strip()
+    iso = pd.to_datetime(text, format="%Y-%m-%d", errors="coerce")
+    vn = pd.to_datetime(text, format="%d/%m/%Y", errors="coerce")
+    return iso.fillna(vn).dt.strftime("%Y-%m-%d")
+
+
+# =========================================================
+#               KIỂM TRA & CHUẨN HÓA
+# =========================================================
+
+def validate_seasons(df, user):
+    """
+    Kiểm tra và chuẩn hóa toàn bộ bảng bằng phép toán trên cột.
+    Trả về (DataFrame các dòng hợp lệ, list lỗi {"row", "field", "error"}).
+    """
+    df = _normalize_columns(df).copy()
+    for column in REQUIRED_COLUMNS + OPTIONAL_COLUMNS:
+        df[column] = df[column].astype(str).str.strip()
+    line = pd.Series(df.index + 2, index=df.index)  # số dòng trong file (dòng 1 là tiêu đề)
+    errors = []
+
+    def reject(mask, field, message):
+        for row in line[mask].tolist():
+            errors.append({"row": int(row), "field": field, "error": message})
+
+    reject(df["farmer_name"] == "", "farmer_name", "Thiếu tên nông dân")
+
+    names = _province_names()
+    keys = df["province"].map({p: canonical_province(p) for p in df["province"].unique()})
+    province = keys.map(names)
+    reject(province.isna(), "province", "Tỉnh không hợp lệ")
+    df["province"] = province
+
+    df["crop"] = df["crop"].str.lower()
+    reject(df["crop"] == "", "crop", "Thiếu cây trồng")
+
+    area = pd.to_numeric(df["area"].str.replace(",", ".", regex=False), errors="coerce")
+    reject(~(area > 0), "area", "Diện tích phải là số > 0")
+    df["area"] = area
+
+    sow = _parse_dates(df["sow_date"])
+    reject(sow.isna(), "sow_date", "Ngày gieo không hợp lệ (YYYY-MM-DD hoặc DD/MM/YYYY)")
+    harvest = _parse_dates(df["harvest_date"])
+    reject((df["harvest_date"] != "") & harvest.isna(), "harvest_date", "Ngày thu hoạch không hợp lệ")
+    reject(harvest.notna() & sow.notna() & (harvest < sow), "harvest_date", "Ngày thu hoạch trước ngày gieo")
+    df["sow_date"] = sow
+    df["harvest_date"] = harvest.fillna("")
+
+    given_yield = pd.to_numeric(df["actual_yield"].str.replace(",", ".", regex=False), errors="coerce")
+    reject((df["actual_yield"] != "") & ~(given_yield >= 0), "actual_yield", "Năng suất phải là số >= 0")
+    df["actual_yield"] = given_yield
+
+    bad_rows = {e["row"] for e in errors}
+    valid = df[~line.isin(bad_rows)].copy()
+    valid["user"] = user
+    valid["created_at"] = datetime.utcnow().isoformat()
+    errors.sort(key=lambda e: e["row"])
+    return valid, errors
+
+
+def fill_yields(valid):
+    """Tính năng suất theo lô cho các dòng chưa có actual_yield"""
+    valid["yield_source"] = np.where(valid["actual_yield"].notna(), "import", "")
+    pending = valid["actual_yield"].isna()
+    if pending.any():
+        computed = calculate_yields(season_columns(valid.loc[pending]))
+        computed = pd.Series([np.nan if v is None else round(v, 2) for v in computed], index=valid.index[pending])
+        valid.loc[pending, "actual_yield"] = computed
+        valid.loc[pending & computed.reindex(valid.index).notna(), "yield_source"] = "auto_import"
+    valid["yield_calculated_at"] = np.where(valid["yield_source"] != "", valid["created_at"], "")
+    return valid
+
+
+# =========================================================
+#               GHI DỮ LIỆU
+# =========================================================
+
+def _records(valid):
+    columns = ["farmer_name", "province", "crop", "area", "sow_date", "harvest_date", "fertilizer", "notes",
+               "actual_yield", "yield_source", "yield_calculated_at", "created_at", "user"]
+    records = valid[columns].to_dict(orient="records")
+    for record in records:
+        if pd.isna(record["actual_yield"]):
+            record["actual_yield"] = None
+        # Bỏ các trường rỗng giống form /manage (không ghi chuỗi rỗng cho trường năng suất)
+        for key in ("yield_source", "yield_calculated_at"):
+            if not record[key]:
+                del record[key]
+        if record["actual_yield"] is None:
+            del record["actual_yield"]
+    return records
+
+
+IMPORT_KEY_COLUMNS = ["farmer_name", "province", "crop", "area", "sow_date", "harvest_date", "fertilizer", "notes"]
+
+
+def import_doc_ids(valid, user):
+    """
+    Id document cho từng dòng: băm user + nội dung dòng (không tính thời điểm nhập, năng suất tự tính).
+    Dòng trùng nội dung thứ n trong file mang số n -> nhập lại cùng file ghi đè đúng các document cũ.
+    """
+    given_yield = valid["actual_yield"].where(valid["yield_source"] == "import")
+    columns = [valid[column].tolist() for column in IMPORT_KEY_COLUMNS] + [given_yield.tolist()]
+    seen = {}
+    doc_ids = []
+    for values in zip(*columns):
+        key = "\x1f".join(map(str, values))
+        seen[key] = seen.get(key, -1) + 1
+        doc_ids.append(hashlib.sha256(f"{user}\x1f{key}\x1f{seen[key]}".encode("utf-8")).hexdigest()[:20])
+    return doc_ids
+
+
+def write_firestore(db, records, doc_ids=None, lines=None, batch_size=FIRESTORE_BATCH_SIZE):
+    """
+    Ghi theo batch (tối đa 500 thao tác/batch); trả về số document đã ghi.
+    doc_ids: id cố định (None -> id tự sinh); lines: số dòng trong file của từng record (cho báo lỗi).
+    Batch lỗi -> SeasonWriteError kèm số document đã commit.
+    """
+    collection = db.collection("seasons")
+    written = 0
+    for start in range(0, len(records), batch_size):
+        batch = db.batch()
+        chunk = records[start:start + batch_size]
+        ids = doc_ids[start:start + batch_size] if doc_ids is not None else [None] * len(chunk)
+        for record, doc_id in zip(chunk, ids):
+            batch.set(collection.document(doc_id), record)
+        try:
+            batch.commit()
+        except Exception as e:
+            rows = lines[start:start + len(chunk)] if lines is not None else [start + 1, start + len(chunk)]
+            raise SeasonWriteError(written, (rows[0], rows[-1]), e) from e
+        written += len(chunk)
+    return written
+
+
+def append_csv(path, records):
+    """Nối vào seasons.csv một lần (ghi file tạm rồi os.replace để không hỏng file khi lỗi giữa chừng)"""
+    new = pd.DataFrame(records)
+    if os.path.exists(path):
+        df = pd.concat([pd.read_csv(path), new], ignore_index=True)
+    else:
+        df = new
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".csv.tmp")
+    os.close(fd)
+    try:
+        df.to_csv(tmp_path, index=False, encoding="utf-8-sig")
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return len(new)
+
+
+def import_seasons(source, user, filename=None, db=None, csv_path=SEASONS_CSV, dry_run=False):
+    """
+    Toàn bộ quy trình nhập: đọc -> kiểm tra -> tính năng suất -> ghi.
+    db != None -> Firestore, ngược lại ghi csv_path. Trả về báo cáo dạng dict.
+    Ghi Firestore lỗi giữa chừng -> SeasonWriteError (nhập lại cùng file an toàn: id theo nội dung dòng).
+    """
+    t0 = time.perf_counter()
+    df = read_table(source, filename)
+    valid, errors = validate_seasons(df, user)
+    valid = fill_yields(valid)
+    records = _records(valid)
+    t_validate = time.perf_counter() - t0
+
+    written = 0
+    if records and not dry_run:
+        if db is not None:
+            written = write_firestore(db, records, import_doc_ids(valid, user), (valid.index + 2).tolist())
+        else:
+            written = append_csv(csv_path, records)
+    total = time.perf_counter() - t0
+    return {
+        "rows": len(df),
+        "valid": len(records),
+        "invalid": len({e["row"] for e in errors}),
+        "written": written,
+        "auto_yield": int((valid["yield_source"] == "auto_import").sum()),
+        "target": "dry-run" if dry_run else ("firestore" if db is not None else csv_path),
+        "errors": errors[:MAX_ERRORS_REPORTED],
+        "errors_truncated": len(errors) > MAX_ERRORS_REPORTED,
+        "timings": {"validate": round(t_validate, 3), "total": round(total, 3)},
+    }
+
+
+def print_report(report):
+    print(f"📥 {report['rows']:,} dòng: {report['valid']:,} hợp lệ, {report['invalid']:,} lỗi, "
+          f"đã ghi {report['written']:,} ({report['target']})")
+    print(f"   Tự tính năng suất: {report['auto_yield']:,} dòng | "
+          f"kiểm tra {report['timings']['validate']}s, tổng {report['timings']['total']}s")
+    for error in report["errors"][:20]:
+        print(f"   ❌ Dòng {error['row']} [{error['field']}]: {error['error']}")
+    if len(report["errors"]) > 20:
+        print(f"   ... và {len(report['errors']) - 20} lỗi khác")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Nhập hàng loạt mùa vụ từ CSV/XLSX")
+    parser.add_argument("file")
+    parser.add_argument("--user", required=True, help="Email người dùng sở hữu các mùa vụ")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ kiểm tra, không ghi")
+    parser.add_argument("--offline", action="store_true", help="Ghi vào data/seasons.csv thay vì Firestore")
+    parser.add_argument("--csv", default=SEASONS_CSV, help="File CSV đích khi --offline")
+    args = parser.parse_args(argv)
+
+    db = None
+    if not args.offline and not args.dry_run:
+        from firebase_init import init_firebase
+        db = init_firebase()
+    try:
+        report = import_seasons(args.file, args.user, db=db, csv_path=args.csv, dry_run=args.dry_run)
+    except SeasonImportError as e:
+        print(f"❌ {e}")
+        return 1
+    except SeasonWriteError as e:
+        print(f"❌ Lỗi ghi Firestore: {e}. Chạy lại lệnh sẽ không tạo bản trùng.")
+        if e.written:
+            from render_cache import bump_data_version
+            bump_data_version()
+        return 1
+    if report["written"]:
+        from render_cache import bump_data_version
+        bump_data_version()
+    print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,418 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import config
+import metrics
+from circuit_breaker import CircuitOpenError, firestore_breaker, is_outage
+from season_model import Season
+from season_replica import note_season_write
+
+# =========================================================
+#               GHI SAU (WRITE-BEHIND) CHO MÙA VỤ
+# =========================================================
+# Bật SEASON_WRITE_BEHIND: thêm/sửa/xóa mùa vụ chỉ ghi một dòng vào journal SQLite cục bộ (WAL,
+# synchronous=FULL -> bền qua crash) rồi trả response ngay. Một thread nền trong mỗi worker:
+#   - nhận các dòng đang chờ (lease theo document, nhiều worker dùng chung một file journal mà không
+#     commit trùng, đúng thứ tự trong từng document)
+#   - gộp các thay đổi của cùng một document (set + update -> set, ... + delete -> delete)
+#   - commit lên Firestore theo batch (tối đa 500 thao tác), lỗi thì thử lại với backoff lũy thừa;
+#     quá SEASON_WRITE_BEHIND_MAX_ATTEMPTS lần thì chuyển sang trạng thái "dead" và ghi log. Lỗi mất kết
+#     nối / mạch mở không tính là lỗi của thay đổi: journal giữ lại và commit khi Firestore hoạt động lại
+# Đọc: overlay() áp các thay đổi còn chờ lên dữ liệu đọc từ Firestore / bản sao -> người dùng thấy
+# ngay thay đổi của mình. Danh sách thay đổi còn chờ được giữ trong bộ nhớ của tiến trình và cập nhật
+# dần: mỗi lần đọc chỉ nạp (và parse JSON) các dòng có seq mới, dòng đã commit / dead được nhận ra qua
+# COUNT trên chỉ mục -> độ trễ đọc không tăng theo backlog khi Firestore gián đoạn lâu.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS mutations (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    collection TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    op TEXT NOT NULL,
+    data TEXT,
+    created REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS mutations_pending ON mutations (status, seq);
+CREATE INDEX IF NOT EXISTS mutations_doc ON mutations (doc_id, status);
+CREATE INDEX IF NOT EXISTS mutations_collection ON mutations (collection, status, seq);
+"""
+
+OPS = ("set", "update", "delete")
+BATCH_LIMIT = 500           # giới hạn thao tác của một WriteBatch Firestore
+LEASE_SECONDS = 60.0        # worker chết giữa chừng -> dòng được worker khác nhận lại sau ngần này
+MAX_BACKOFF = 60.0
+
+
+def new_doc_id():
+    """Id document 20 ký tự tạo phía client (Firestore cũng tạo id cho add() phía client)"""
+    return uuid.uuid4().hex[:20]
+
+
+def fold(mutations, base=None):
+    """
+    Gộp chuỗi thay đổi [(op, data)] của một document, áp lên `base` (dict / Season hoặc None = chưa có/không biết).
+    Trả về (op, data) tương đương: ("set", dict) | ("update", dict) | ("delete", None).
+    """
+    if isinstance(base, Season):
+        base = base.to_dict()
+    op, data = (None, None) if base is None else ("set", dict(base))
+    for kind, changes in mutations:
+        if kind == "delete":
+            op, data = "delete", None
+        elif kind == "set":
+            op, data = "set", dict(changes)
+        elif op in ("set", "update"):
+            data = {**data, **changes}
+        elif op == "delete":
+            continue  # update sau delete sẽ lỗi NOT_FOUND trên Firestore -> document vẫn không tồn tại
+        else:
+            op, data = "update", dict(changes)
+    return op, data
+
+
+class SeasonJournal:
+
+    def __init__(self, path, collection="seasons"):
+        self.path = path
+        self.collection = collection
+        self._local = threading.local()
+        self._pid = None
+        self._thread = None
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        # Thay đổi còn chờ đã nạp (xem _sync_pending): doc_id -> [(seq, op, data)], theo seq
+        self._pending_lock = threading.Lock()
+        self._pending_docs = {}
+        self._pending_seq = 0       # seq lớn nhất đã nạp
+        self._pending_count = 0     # số dòng trong _pending_docs
+        self._pending_view = {}     # {doc_id: [(op, data)]} trả về từ pending(); thay bằng dict mới khi đổi
+        self._doc_delta = {}        # doc_id -> phần đóng góp vào count_delta()
+        self._pending_delta = 0
+
+    # ----------------- KẾT NỐI -----------------
+    def _conn(self):
+        # Mỗi luồng (và mỗi tiến trình sau fork) một kết nối riêng
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._local.pending_version = None
+            self._pid = os.getpid()
+        return conn
+
+    # ----------------- GHI -----------------
+    def enqueue(self, doc_id, op, data=None):
+        """Ghi một thay đổi vào journal (bền ngay khi hàm trả về); commit lên Firestore chạy nền"""
+        if op not in OPS:
+            raise ValueError(f"op không hợp lệ: {op}")
+        with metrics.JOURNAL_APPEND.time():
+            self._conn().execute(
+                "INSERT INTO mutations (collection, doc_id, op, data, created) VALUES (?, ?, ?, ?, ?)",
+                (self.collection, doc_id, op, None if data is None else json.dumps(data, ensure_ascii=False),
+                 time.time()))
+        self._wake.set()
+        return doc_id
+
+    # ----------------- ĐỌC (OVERLAY) -----------------
+    def _sync_pending(self):
+        """
+        Cập nhật dần bản trong bộ nhớ (gọi khi giữ _pending_lock). Seq tăng theo thứ tự commit của SQLite nên
+        dòng mới luôn có seq > _pending_seq; dòng chỉ rời trạng thái pending (commit xong / dead) -> số dòng
+        pending có seq <= _pending_seq khác số đã nạp thì bỏ các seq không còn (chỉ đọc cột seq, không parse).
+        File không đổi kể từ lần đồng bộ trước của luồng này (data_version: ghi của kết nối khác, total_changes:
+        ghi của chính kết nối) -> không query. Trả về True nếu có thay đổi.
+        """
+        conn = self._conn()
+        version = (conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes)
+        if version == self._local.pending_version:
+            return False
+        self._local.pending_version = version
+        touched = set()
+        rows = conn.execute(
+            "SELECT seq, doc_id, op, data FROM mutations "
+            "WHERE collection = ? AND status = 'pending' AND seq > ? ORDER BY seq",
+            (self.collection, self._pending_seq)).fetchall()
+        for seq, doc_id, op, data in rows:
+            self._pending_docs.setdefault(doc_id, []).append((seq, op, json.loads(data) if data else None))
+            self._pending_seq = seq
+            touched.add(doc_id)
+        self._pending_count += len(rows)
+        (count,) = conn.execute(
+            "SELECT COUNT(*) FROM mutations WHERE collection = ? AND status = 'pending' AND seq <= ?",
+            (self.collection, self._pending_seq)).fetchone()
+        if count != self._pending_count:
+            alive = {seq for (seq,) in conn.execute(
+                "SELECT seq FROM mutations WHERE collection = ? AND status = 'pending' AND seq <= ?",
+                (self.collection, self._pending_seq))}
+            for doc_id, changes in list(self._pending_docs.items()):
+                kept = [change for change in changes if change[0] in alive]
+                if len(kept) != len(changes):
+                    touched.add(doc_id)
+                    if kept:
+                        self._pending_docs[doc_id] = kept
+                    else:
+                        del self._pending_docs[doc_id]
+            self._pending_count = len(alive)
+        if not touched:
+            return False
+        # Dict mới (sao chép nông) -> các lần đọc đang dùng bản cũ không bị đổi giữa chừng
+        view = dict(self._pending_view)
+        for doc_id in touched:
+            self._pending_delta -= self._doc_delta.pop(doc_id, 0)
+            changes = self._pending_docs.get(doc_id)
+            if not changes:
+                view.pop(doc_id, None)
+                continue
+            view[doc_id] = [(op, data) for _, op, data in changes]
+            created = changes[0][1] == "set"
+            deleted = fold(view[doc_id])[0] == "delete"
+            delta = (1 if created and not deleted else 0) - (1 if deleted and not created else 0)
+            self._doc_delta[doc_id] = delta
+            self._pending_delta += delta
+        self._pending_view = view
+        return True
+
+    def pending(self):
+        """
+        {doc_id: [(op, data)]} mọi thay đổi chưa commit (kể cả đang được commit), theo thứ tự ghi.
+        Dùng chung giữa các lần đọc cho tới khi journal đổi -> không sửa kết quả trả về.
+        """
+        with self._pending_lock:
+            metrics.record_cache("season_journal_pending", not self._sync_pending())
+            return self._pending_view
+
+    def overlay_one(self, doc_id, data):
+        """Mùa vụ `doc_id` (Season / dict hoặc None) sau khi áp thay đổi còn chờ; None nếu đã xóa / không tồn tại"""
+        rows = self._conn().execute(
+            "SELECT op, data FROM mutations WHERE collection = ? AND doc_id = ? AND status = 'pending' ORDER BY seq",
+            (self.collection, doc_id)).fetchall()
+        if not rows:
+            return data
+        op, folded = fold([(op, json.loads(changes) if changes else None) for op, changes in rows], data)
+        # update cho document không đọc được (chưa có trên Firestore) -> coi như chưa tồn tại
+        return Season.from_dict(folded, doc_id) if op == "set" else None
+
+    def overlay(self, rows, limit=None, order_by=None):
+        """
+        Áp thay đổi còn chờ lên danh sách [(id, Season / dict)] đã đọc: bỏ mùa vụ đã xóa, gộp bản sửa, thêm
+        mùa vụ mới (mùa vụ có thay đổi được trả về dạng Season).
+        order_by="created_at": sắp lại giảm dần rồi cắt `limit` (như query order_by DESC + limit).
+        """
+        pending = self.pending()
+        if not pending:
+            return rows[:limit] if limit is not None else rows
+        result = []
+        seen = set()
+        for doc_id, data in rows:
+            seen.add(doc_id)
+            if doc_id in pending:
+                op, data = fold(pending[doc_id], data)
+                if op != "set":
+                    continue
+                data = Season.from_dict(data, doc_id)
+            result.append((doc_id, data))
+        for doc_id, changes in pending.items():
+            if doc_id not in seen:
+                op, data = fold(changes)
+                if op == "set":
+                    result.append((doc_id, Season.from_dict(data, doc_id)))
+        if order_by:
+            result = [item for item in result if item[1].get(order_by) is not None]
+            result.sort(key=lambda item: str(item[1][order_by]), reverse=True)
+        return result[:limit] if limit is not None else result
+
+    def count_delta(self):
+        """Số mùa vụ tăng/giảm do thay đổi còn chờ: mùa vụ mới (bắt đầu bằng set) +1, xóa mùa vụ đã có -1"""
+        with self._pending_lock:
+            self._sync_pending()
+            return self._pending_delta
+
+    def backlog(self):
+        """Số thay đổi đang chờ và tuổi (giây) của thay đổi cũ nhất"""
+        count, oldest = self._conn().execute(
+            "SELECT COUNT(*), MIN(created) FROM mutations WHERE status = 'pending'").fetchone()
+        return count, (time.time() - oldest) if oldest else 0.0
+
+    # ----------------- COMMIT NỀN -----------------
+    def _claim(self, limit):
+        """Nhận (lease) các dòng đang chờ của những document chưa bị worker khác nhận"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT seq, doc_id, op, data, attempts FROM mutations "
+                "WHERE status = 'pending' AND lease_until <= ? AND doc_id NOT IN "
+                "(SELECT doc_id FROM mutations WHERE status = 'pending' AND lease_until > ?) "
+                "ORDER BY seq LIMIT ?", (now, now, limit)).fetchall()
+            conn.executemany("UPDATE mutations SET lease_until = ? WHERE seq = ?",
+                             [(now + LEASE_SECONDS, row[0]) for row in rows])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def _group(self, rows):
+        """Dòng đã nhận -> [(doc_id, op, data, [seq], attempts)] mỗi document một thao tác đã gộp"""
+        docs = {}
+        for seq, doc_id, op, data, attempts in rows:
+            entry = docs.setdefault(doc_id, {"changes": [], "seqs": [], "attempts": 0})
+            entry["changes"].append((op, json.loads(data) if data else None))
+            entry["seqs"].append(seq)
+            entry["attempts"] = max(entry["attempts"], attempts)
+        grouped = []
+        for doc_id, entry in docs.items():
+            op, data = fold(entry["changes"])
+            grouped.append((doc_id, op, data, entry["seqs"], entry["attempts"]))
+        return grouped
+
+    def _commit(self, db, grouped):
+        collection = db.collection(self.collection)
+        batch = db.batch()
+        for doc_id, op, data, _, _ in grouped:
+            ref = collection.document(doc_id)
+            if op == "set":
+                batch.set(ref, data)
+            elif op == "update":
+                batch.update(ref, data)
+            else:
+                batch.delete(ref)
+        batch.commit()
+
+    def _finish(self, grouped):
+        seqs = [(seq,) for entry in grouped for seq in entry[3]]
+        self._conn().executemany("DELETE FROM mutations WHERE seq = ?", seqs)
+        # Overlay không còn che thay đổi này -> áp ngay vào bản sao (nếu bật) thay vì chờ snapshot
+        for doc_id, op, data, _, _ in grouped:
+            note_season_write(doc_id, data, merge=op == "update", delete=op == "delete")
+        metrics.JOURNAL_COMMITTED.inc(len(grouped), "ok")
+        metrics.JOURNAL_COALESCED.inc(len(seqs) - len(grouped))
+
+    def _retry_later(self, grouped, error):
+        """Thử lại sau (backoff lũy thừa theo số lần lỗi); lỗi không phải do mất kết nối quá số lần cho phép -> dead"""
+        conn = self._conn()
+        now = time.time()
+        dead = 0
+        outage = is_outage(error)
+        for doc_id, op, _, seqs, attempts in grouped:
+            attempts += 1
+            if attempts >= config.SEASON_WRITE_BEHIND_MAX_ATTEMPTS and not outage:
+                status, lease = "dead", 0
+                dead += 1
+                print(f"❌ Write-behind: bỏ {op} {self.collection}/{doc_id} sau {attempts} lần lỗi: {error}")
+            else:
+                status, lease = "pending", now + min(MAX_BACKOFF, 2 ** attempts)
+            conn.executemany(
+                "UPDATE mutations SET status = ?, attempts = ?, lease_until = ?, last_error = ? WHERE seq = ?",
+                [(status, attempts, lease, str(error)[:500], seq) for seq in seqs])
+        metrics.JOURNAL_COMMITTED.inc(len(grouped) - dead, "retry")
+        if dead:
+            metrics.JOURNAL_COMMITTED.inc(dead, "dead")
+            # Thay đổi đã hiển thị qua overlay nay không còn -> trang đã cache phải render lại
+            from render_cache import bump_data_version
+            bump_data_version()
+
+    def _release(self, grouped):
+        """Trả lại các dòng đã nhận (không tính lần lỗi) - mạch Firestore đang mở"""
+        lease = time.time() + config.SEASON_WRITE_BEHIND_INTERVAL
+        self._conn().executemany("UPDATE mutations SET lease_until = ? WHERE seq = ?",
+                                 [(lease, seq) for entry in grouped for seq in entry[3]])
+
+    def flush(self, db, limit=BATCH_LIMIT):
+        """Commit một lượt; trả về số document đã commit"""
+        rows = self._claim(limit)
+        if not rows:
+            return 0
+        grouped = self._group(rows)
+        try:
+            self._commit(db, grouped)
+        except CircuitOpenError:
+            self._release(grouped)
+            return 0
+        except Exception as e:
+            if len(grouped) == 1 or is_outage(e):
+                self._retry_later(grouped, e)
+                return 0
+            # Một document lỗi làm hỏng cả batch -> commit riêng từng document để cô lập
+            committed = 0
+            for entry in grouped:
+                try:
+                    self._commit(db, [entry])
+                    self._finish([entry])
+                    committed += 1
+                except Exception as single_error:
+                    self._retry_later([entry], single_error)
+            return committed
+        self._finish(grouped)
+        return len(grouped)
+
+    def _run(self, get_db):
+        while not self._stopping.is_set():
+            db = get_db()
+            committed = 0
+            if db is not None and firestore_breaker.allow():
+                try:
+                    committed = self.flush(db)
+                except Exception as e:
+                    print(f"⚠️ Write-behind: lỗi khi commit: {e}")
+            try:
+                metrics.JOURNAL_BACKLOG.set(self.backlog()[0])
+            except sqlite3.Error:
+                pass
+            if committed == 0:
+                self._wake.wait(config.SEASON_WRITE_BEHIND_INTERVAL)
+                self._wake.clear()
+            elif config.SEASON_WRITE_BEHIND_INTERVAL:
+                # chờ một chút để gom thêm thay đổi vào batch kế tiếp
+                self._stopping.wait(min(0.05, config.SEASON_WRITE_BEHIND_INTERVAL))
+
+    def start(self, get_db):
+        """Chạy thread commit nền (gọi sau fork); get_db() trả về Firestore client hiện tại của worker"""
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, args=(get_db,), name="season-journal", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+# ----------------- THEO TIẾN TRÌNH -----------------
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def start_season_journal(get_db):
+    """Mở journal + thread commit cho tiến trình hiện tại; None nếu write-behind tắt (hoặc chế độ CSV)"""
+    global _journal
+    with _journal_lock:
+        if _journal is not None:
+            _journal.stop()
+            _journal = None
+        if config.SEASON_WRITE_BEHIND and config.USE_FIREBASE:
+            _journal = SeasonJournal(config.SEASON_JOURNAL_PATH).start(get_db)
+            count, _ = _journal.backlog()
+            if count:
+                print(f"📝 Write-behind: {count} thay đổi còn chờ trong journal")
+    return _journal
+
+
+def get_season_journal():
+    return _journal
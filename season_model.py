@@ -0,0 +1,295 @@
+import math
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from provinces import canonical_province
+
+# =========================================================
+#               KIỂU DỮ LIỆU MÙA VỤ
+# =========================================================
+# Document mùa vụ (Firestore / dòng CSV / form) được đọc thành Season đúng một lần tại chỗ nạp dữ liệu
+# (bản sao trong bộ nhớ, query Firestore, đọc CSV); phía sau chỉ dùng thuộc tính đã kiểm tra:
+#   - area, actual_yield: float hoặc None (thiếu / không phải số / âm / NaN)
+#   - sow_date, harvest_date: datetime.date hoặc None
+#   - province_key, crop_key: khóa chuẩn (provinces.canonical_province, chữ thường bỏ khoảng trắng thừa)
+#   - các trường khác của document (yield_source, ...) giữ nguyên trong extra
+# Season dùng __slots__ (ít hơn dict khoảng 1/3 bộ nhớ mỗi mùa vụ) và vẫn đọc được như dict (get / []) nên template
+# Jinja ({{ s.area }}) và code cũ không phải đổi.
+# Tổng hợp trên nhiều mùa vụ (thống kê /overview, tính năng suất theo lô) dùng SeasonColumns: mỗi trường
+# là một mảng NumPy; dựng từ list Season hoặc thẳng từ DataFrame CSV mà không tạo đối tượng từng dòng.
+
+FIELDS = ("farmer_name", "province", "crop", "area", "actual_yield", "sow_date", "harvest_date",
+          "fertilizer", "notes", "created_at", "user")
+DATE_FORMAT = "%Y-%m-%d"
+UNKNOWN_PROVINCE = "Chưa xác định"
+UNKNOWN_CROP = "chưa xác định"
+
+# Tên tỉnh gặp lại rất nhiều lần -> nhớ khóa chuẩn (giới hạn để input lạ không làm phình bộ nhớ)
+_province_keys = {}
+MAX_PROVINCE_KEYS = 4096
+
+
+def province_key_of(name):
+    key = _province_keys.get(name)
+    if key is None:
+        key = canonical_province(name)
+        if len(_province_keys) >= MAX_PROVINCE_KEYS:
+            _province_keys.clear()
+        _province_keys[name] = key
+    return key
+
+
+def canonical_crop(name):
+    """Khóa cây trồng: chữ thường, bỏ khoảng trắng đầu/cuối (khóa của BASE_YIELDS, CROP_PRICES...)"""
+    return name.strip().lower() if isinstance(name, str) else ""
+
+
+def _text(value):
+    """Chuỗi hiển thị; None / NaN (ô trống CSV) -> chuỗi rỗng"""
+    if isinstance(value, str):
+        return value.strip()
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    return str(value)
+
+
+def parse_amount(value):
+    """Số không âm (diện tích, sản lượng) hoặc None nếu thiếu / không hợp lệ"""
+    if value is None or value == "":
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) and number >= 0 else None
+
+
+def parse_date(value):
+    """datetime.date từ "YYYY-MM-DD" (hoặc date / datetime); None nếu thiếu / sai định dạng"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if not isinstance(value, str):
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        try:
+            return datetime.strptime(value, DATE_FORMAT).date()
+        except ValueError:
+            return None
+
+
+class Season:
+    __slots__ = ("id", "farmer_name", "province", "province_key", "crop", "crop_key", "area", "actual_yield",
+                 "sow_date", "harvest_date", "fertilizer", "notes", "created_at", "user", "extra")
+
+    def __init__(self, id=None, farmer_name="", province="", crop="", area=None, actual_yield=None,
+                 sow_date=None, harvest_date=None, fertilizer="", notes="", created_at=None, user=None,
+                 extra=None):
+        self.id = id
+        self.farmer_name = farmer_name
+        self.province = province
+        self.province_key = province_key_of(province) if province else ""
+        self.crop = crop
+        self.crop_key = canonical_crop(crop)
+        self.area = area
+        self.actual_yield = actual_yield
+        self.sow_date = sow_date
+        self.harvest_date = harvest_date
+        self.fertilizer = fertilizer
+        self.notes = notes
+        self.created_at = created_at
+        self.user = user
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, data, doc_id=None):
+        """Đọc một document / dòng CSV; giá trị sai kiểu thành None thay vì ném lỗi"""
+        data = data or {}
+        extra = {key: value for key, value in data.items() if key not in FIELDS and key != "id"}
+        created_at = data.get("created_at")
+        return cls(
+            id=doc_id if doc_id is not None else data.get("id"),
+            farmer_name=_text(data.get("farmer_name")),
+            province=_text(data.get("province")),
+            crop=_text(data.get("crop")),
+            area=parse_amount(data.get("area")),
+            actual_yield=parse_amount(data.get("actual_yield")),
+            sow_date=parse_date(data.get("sow_date")),
+            harvest_date=parse_date(data.get("harvest_date")),
+            fertilizer=_text(data.get("fertilizer")),
+            notes=_text(data.get("notes")),
+            created_at=None if isinstance(created_at, float) and math.isnan(created_at) else created_at,
+            user=_text(data.get("user")) or None,
+            extra=extra or None,
+        )
+
+    def to_dict(self):
+        """Dạng lưu trữ (ngày -> "YYYY-MM-DD"); dùng khi cần trộn với thay đổi chưa ghi"""
+        data = {
+            "farmer_name": self.farmer_name,
+            "province": self.province,
+            "crop": self.crop,
+            "area": self.area,
+            "actual_yield": self.actual_yield,
+            "sow_date": self.sow_date.isoformat() if self.sow_date else None,
+            "harvest_date": self.harvest_date.isoformat() if self.harvest_date else None,
+            "fertilizer": self.fertilizer,
+            "notes": self.notes,
+            "created_at": self.created_at,
+            "user": self.user,
+        }
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    # ----------------- ĐỌC KIỂU DICT -----------------
+    def get(self, key, default=None):
+        if key in self.__slots__ and key != "extra":
+            value = getattr(self, key)
+            return default if value is None else value
+        return self.extra.get(key, default) if self.extra else default
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __repr__(self):
+        return f"Season({self.id!r}, {self.province!r}, {self.crop!r}, area={self.area!r})"
+
+    # ----------------- GIÁ TRỊ SUY RA -----------------
+    @property
+    def growth_days(self):
+        """Số ngày từ gieo tới thu hoạch (chưa giới hạn); None nếu thiếu ngày"""
+        if self.sow_date and self.harvest_date:
+            return (self.harvest_date - self.sow_date).days
+        return None
+
+    @property
+    def year(self):
+        """Năm của mùa vụ: theo ngày gieo, thiếu thì theo ngày thu hoạch"""
+        day = self.sow_date or self.harvest_date
+        return day.year if day else None
+
+    @property
+    def productivity(self):
+        """Năng suất thực tế (tấn/ha); 0 nếu chưa có sản lượng hoặc diện tích"""
+        if self.actual_yield and self.area:
+            return self.actual_yield / self.area
+        return 0.0
+
+
+_MISSING = object()
+
+
+def as_season(data, doc_id=None):
+    """Season giữ nguyên; dict (document, dòng CSV) -> Season.from_dict"""
+    return data if isinstance(data, Season) else Season.from_dict(data, doc_id)
+
+
+def seasons_from_frame(df):
+    """DataFrame seasons.csv -> [Season]; id = chỉ số dòng (giống các route CSV)"""
+    return [Season.from_dict(record, str(index))
+            for index, record in zip(df.index, df.to_dict(orient="records"))]
+
+
+# =========================================================
+#               DẠNG CỘT CHO TỔNG HỢP
+# =========================================================
+
+def _map_unique(values, fn):
+    """fn trên từng giá trị khác nhau (tên tỉnh, cây trồng lặp lại nhiều) -> mảng object"""
+    values = pd.Series(values, dtype=object)
+    uniques = values.unique()
+    return values.map(dict(zip(uniques, map(fn, uniques)))).to_numpy(dtype=object)
+
+
+class SeasonColumns:
+    __slots__ = ("ids", "province", "province_key", "crop_key", "fertilizer", "area", "actual_yield",
+                 "growth_days", "year")
+
+    def __init__(self, ids, province, province_key, crop_key, fertilizer, area, actual_yield, growth_days, year):
+        self.ids = ids
+        self.province = province            # tên hiển thị (object)
+        self.province_key = province_key    # khóa chuẩn (object)
+        self.crop_key = crop_key            # khóa cây trồng (object)
+        self.fertilizer = fertilizer        # chuỗi phân bón (object)
+        self.area = area                    # float, NaN = thiếu
+        self.actual_yield = actual_yield    # float, NaN = thiếu
+        self.growth_days = growth_days      # float, NaN = thiếu ngày
+        self.year = year                    # float, NaN = thiếu ngày
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_seasons(cls, seasons):
+        seasons = [as_season(season) for season in seasons]
+        nan = float("nan")
+
+        def floats(values):
+            return np.fromiter((nan if v is None else v for v in values), dtype=float, count=len(seasons))
+
+        return cls(
+            ids=[s.id for s in seasons],
+            province=np.array([s.province for s in seasons], dtype=object),
+            province_key=np.array([s.province_key for s in seasons], dtype=object),
+            crop_key=np.array([s.crop_key for s in seasons], dtype=object),
+            fertilizer=np.array([s.fertilizer for s in seasons], dtype=object),
+            area=floats(s.area for s in seasons),
+            actual_yield=floats(s.actual_yield for s in seasons),
+            growth_days=floats(s.growth_days for s in seasons),
+            year=floats(s.year for s in seasons),
+        )
+
+    @classmethod
+    def from_frame(cls, df):
+        """Từ DataFrame seasons.csv (vector hóa, cùng quy tắc kiểm tra như Season.from_dict)"""
+        n = len(df)
+
+        def column(name):
+            return df[name] if name in df.columns else pd.Series([None] * n, index=df.index, dtype=object)
+
+        def amounts(name):
+            values = pd.to_numeric(column(name), errors="coerce").to_numpy(dtype=float)
+            return np.where(values >= 0, values, np.nan)
+
+        def dates(name):
+            return pd.to_datetime(column(name), format=DATE_FORMAT, errors="coerce")
+
+        sow, harvest = dates("sow_date"), dates("harvest_date")
+        province = _map_unique(column("province"), _text)
+        return cls(
+            ids=[str(index) for index in df.index],
+            province=province,
+            province_key=_map_unique(province, lambda name: province_key_of(name) if name else ""),
+            crop_key=_map_unique(column("crop"), canonical_crop),
+            fertilizer=_map_unique(column("fertilizer"), _text),
+            area=amounts("area"),
+            actual_yield=amounts("actual_yield"),
+            growth_days=(harvest - sow).dt.days.to_numpy(dtype=float),
+            year=sow.dt.year.fillna(harvest.dt.year).to_numpy(dtype=float),
+        )
+
+    def take(self, rows):
+        """Các dòng được chọn (mảng chỉ số hoặc mask bool)"""
+        rows = np.flatnonzero(rows) if np.asarray(rows).dtype == bool else np.asarray(rows, dtype=np.intp)
+        return SeasonColumns(
+            ids=[self.ids[i] for i in rows],
+            **{name: getattr(self, name)[rows] for name in self.__slots__ if name != "ids"},
+        )
+
+
+def season_columns(seasons):
+    """SeasonColumns giữ nguyên; DataFrame -> from_frame; list Season / dict -> from_seasons"""
+    if isinstance(seasons, SeasonColumns):
+        return seasons
+    if isinstance(seasons, pd.DataFrame):
+        return SeasonColumns.from_frame(seasons)
+    return SeasonColumns.from_seasons(seasons)
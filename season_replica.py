@@ -0,0 +1,206 @@
+import threading
+import time
+
+import config
+import metrics
+from instrumented_firestore import document_size
+from render_cache import bump_data_version
+from season_model import Season
+
+# =========================================================
+#               BẢN SAO SEASONS TRONG BỘ NHỚ
+# =========================================================
+# Mỗi worker giữ một bản sao collection "seasons" đồng bộ qua on_snapshot (change stream của Firestore):
+# lần đầu nhận toàn bộ document, sau đó chỉ nhận thay đổi. index / overview / manage / trang mùa vụ
+# đọc từ bộ nhớ thay vì gửi query.
+#   - độ trễ: read_time của snapshot -> lúc áp vào bản sao (agri_season_replica_lag_seconds)
+#   - độ cũ: 0 khi listener đang chạy; listener ngắt thì tính từ lúc ngắt. Quá SEASON_REPLICA_MAX_STALENESS
+#     -> usable() = False, route quay về đọc Firestore trực tiếp, listener được khởi động lại
+#   - ghi của chính worker được áp ngay (apply_write) để người dùng thấy thay đổi của mình sau redirect;
+#     snapshot tới sau sẽ ghi đè bằng dữ liệu từ server
+#   - snapshot mang thay đổi (của worker khác, console, client ngoài app) -> bump_data_version(): trang đã
+#     cache trong lúc worker này chưa nhận thay đổi (vd. render từ bản sao cũ ngay sau khi worker khác ghi)
+#     hết hiệu lực thay vì được trả lại tới hết TTL
+# Document được đọc thành Season (season_model) ngay khi snapshot tới -> route không phải parse lại mỗi request.
+# Chỉ mục dựng từ bản sao (danh sách theo created_at giảm dần) được dựng lười và nhớ theo phiên bản dữ liệu.
+
+RESTART_INTERVAL = 5.0     # giây giữa hai lần thử khởi động lại listener
+
+
+class SeasonReplica:
+
+    def __init__(self, db, collection="seasons", max_staleness=None):
+        self.db = db
+        self.collection = collection
+        self.max_staleness = config.SEASON_REPLICA_MAX_STALENESS if max_staleness is None else max_staleness
+        self._docs = {}
+        self._version = 0
+        self._by_created = (-1, [])        # (phiên bản, [id theo created_at giảm dần])
+        self._lock = threading.Lock()
+        self._watch = None
+        self._synced = threading.Event()   # đã nhận snapshot đầu tiên
+        self._last_ok = None               # lần cuối biết chắc bản sao còn mới (callback / listener còn chạy)
+        self._last_start = 0.0
+
+    # ----------------- LISTENER -----------------
+    def start(self):
+        """Đăng ký on_snapshot; không chặn - snapshot đầu tiên tới trong thread của listener"""
+        self._last_start = time.monotonic()
+        try:
+            self._watch = self.db.collection(self.collection).on_snapshot(self._on_snapshot)
+            print(f"🔄 Season replica: đang đồng bộ collection '{self.collection}'")
+        except Exception as e:
+            self._watch = None
+            print(f"⚠️ Season replica: không mở được listener: {e}")
+        return self
+
+    def stop(self):
+        watch, self._watch = self._watch, None
+        if watch is not None:
+            try:
+                watch.unsubscribe()
+            except Exception:
+                pass
+
+    def wait_synced(self, timeout):
+        return self._synced.wait(timeout)
+
+    def _on_snapshot(self, _documents, changes, read_time):
+        applied = time.time()
+        nbytes = 0
+        was_synced = self._synced.is_set()
+        with self._lock:
+            if not was_synced:
+                self._docs.clear()  # snapshot đầu tiên (hoặc sau khởi động lại) chứa toàn bộ collection
+            for change in changes:
+                snapshot = change.document
+                if change.type.name == "REMOVED":
+                    self._docs.pop(snapshot.id, None)
+                else:
+                    self._docs[snapshot.id] = Season.from_dict(snapshot.to_dict(), snapshot.id)
+                    nbytes += document_size(snapshot)
+            self._version += 1
+        metrics.record_firestore("read", len(changes), nbytes)
+        if hasattr(read_time, "timestamp"):
+            metrics.SEASON_REPLICA_LAG.observe(max(0.0, applied - read_time.timestamp()))
+        self._last_ok = time.monotonic()
+        if was_synced and changes:
+            bump_data_version()
+        if not was_synced:
+            self._synced.set()
+            print(f"✅ Season replica: {len(self._docs)} mùa vụ")
+
+    def _active(self):
+        watch = self._watch
+        # Watch của google-cloud-firestore có is_active; client giả lập không có thì coi như đang chạy
+        return watch is not None and getattr(watch, "is_active", True)
+
+    def staleness(self):
+        """Số giây bản sao có thể đã cũ (0 khi listener đang chạy); inf nếu chưa đồng bộ"""
+        if not self._synced.is_set():
+            return float("inf")
+        if self._active():
+            self._last_ok = time.monotonic()
+            return 0.0
+        return time.monotonic() - self._last_ok
+
+    def usable(self):
+        """Có đọc từ bản sao được không; listener ngắt quá lâu -> thử khởi động lại"""
+        staleness = self.staleness()
+        metrics.SEASON_REPLICA_STALENESS.set(staleness if staleness != float("inf") else -1)
+        if staleness <= self.max_staleness:
+            return True
+        if not self._active() and time.monotonic() - self._last_start >= RESTART_INTERVAL:
+            print(f"⚠️ Season replica: listener ngắt ({staleness:.0f}s), khởi động lại")
+            self.stop()
+            self._synced.clear()
+            self.start()
+        return False
+
+    # ----------------- ĐỌC -----------------
+    def get(self, doc_id):
+        """Season của mùa vụ; None nếu không có (Season không bị sửa tại chỗ nên trả về luôn, không sao chép)"""
+        with self._lock:
+            return self._docs.get(doc_id)
+
+    def count(self):
+        with self._lock:
+            return len(self._docs)
+
+    def all(self):
+        """[(id, Season)] mọi mùa vụ"""
+        with self._lock:
+            return list(self._docs.items())
+
+    def recent(self, limit):
+        """[(id, Season)] theo created_at giảm dần (như order_by DESC + limit; bỏ document không có created_at)"""
+        with self._lock:
+            version, ids = self._by_created
+            if version != self._version:
+                dated = [(str(season.created_at), doc_id) for doc_id, season in self._docs.items()
+                         if season.created_at is not None]
+                dated.sort(reverse=True)
+                ids = [doc_id for _, doc_id in dated]
+                self._by_created = (self._version, ids)
+            metrics.record_cache("season_replica_index", version == self._version)
+            return [(doc_id, self._docs[doc_id]) for doc_id in ids[:limit]]
+
+    # ----------------- GHI CỦA WORKER NÀY -----------------
+    def apply_write(self, doc_id, data=None, merge=True, delete=False):
+        """
+        Áp ngay một thay đổi vừa ghi thành công lên Firestore (read-your-writes trong worker này).
+        update cho document bản sao chưa có: bỏ qua - chỉ có các trường vừa sửa, không đủ để hiển thị;
+        snapshot sẽ mang tới document đầy đủ.
+        """
+        with self._lock:
+            if delete:
+                self._docs.pop(doc_id, None)
+            elif merge:
+                if doc_id not in self._docs:
+                    return
+                self._docs[doc_id] = Season.from_dict({**self._docs[doc_id].to_dict(), **data}, doc_id)
+            else:
+                self._docs[doc_id] = Season.from_dict(data, doc_id)
+            self._version += 1
+
+
+# ----------------- THEO TIẾN TRÌNH -----------------
+_replica = None
+_replica_lock = threading.Lock()
+
+
+def start_season_replica(db):
+    """Khởi động bản sao cho tiến trình hiện tại (gọi sau fork, khi có Firestore client); None nếu tắt"""
+    global _replica
+    with _replica_lock:
+        if _replica is not None:
+            _replica.stop()
+            _replica = None
+        if config.SEASON_REPLICA_ENABLED and db is not None:
+            _replica = SeasonReplica(db).start()
+    return _replica
+
+
+def get_season_replica():
+    """Bản sao dùng được để đọc ngay bây giờ, hoặc None (tắt / chưa đồng bộ / quá cũ)"""
+    replica = _replica
+    return replica if replica is not None and replica.usable() else None
+
+
+def season_replica_status():
+    """Trạng thái cho /api/health: None nếu tắt"""
+    replica = _replica
+    if replica is None:
+        return None
+    staleness = replica.staleness()
+    return {
+        "synced": staleness != float("inf"),
+        "staleness_seconds": None if staleness == float("inf") else round(staleness, 1),
+        "documents": replica.count(),
+    }
+
+
+def note_season_write(doc_id, data=None, merge=True, delete=False):
+    """Gọi sau khi ghi Firestore thành công; không làm gì nếu bản sao tắt"""
+    if _replica is not None and doc_id:
+        _replica.apply_write(doc_id, data, merge=merge, delete=delete)
@@ -1,20 +1,263 @@
+# seed_data.py
+# Sinh dữ liệu mùa vụ giả lập có seed (tái lập được) để seed môi trường, load test và ước lượng dung lượng.
+#   - 63 tỉnh trong data/vietnam_provinces_latlon.csv × các cây trồng trong yield_engine.BASE_YIELDS
+#   - phân bố tỉnh/cây trồng cấu hình được (--crop-weights "lúa=4,ngô=2", --province-weights "AnGiang=3")
+#   - sinh theo chunk (mỗi chunk có seed riêng = (seed, số thứ tự chunk)) -> hàng triệu dòng mà bộ nhớ không tăng,
+#     và cùng tham số luôn cho cùng dữ liệu bất kể số luồng ghi
+#   - đích ghi: firestore, emulator (Firestore Emulator), sqlite, parquet (cần pyarrow), csv (data/seasons.csv)
+#
+# Cách dùng:
+#   python seed_data.py                                        # 10 mùa vụ + tài khoản admin vào Firestore (nếu trống)
+#   python seed_data.py --seasons 1000000 --target sqlite --out data/seed.sqlite
+#   python seed_data.py --seasons 200000 --target emulator --emulator 127.0.0.1:8080 --workers 16
+#   python seed_data.py --seasons 5000000 --target parquet --out data/seed_parquet --users 20000
+#   python seed_data.py --seasons 50000 --target csv --out data/seasons.csv --no-yield
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-import firebase_admin
-from firebase_admin import credentials, firestore, auth
-import datetime
-import random
-
-# Khởi tạo Firebase tái sử dụng logic từ các tệp hiện có hoặc khởi tạo trực tiếp
-try:
-    cred = credentials.Certificate("firebase_config.json")
-    firebase_admin.initialize_app(cred)
-    db = firestore.client()
-    print("✅ Connected to Firebase.")
-except Exception as e:
-    print(f"❌ Connection failed: {e}")
-    exit(1)
+import numpy as np
+import pandas as pd
+
+from provinces import canonical_province
+from yield_engine import BASE_YIELDS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROVINCES_FILE = os.path.join(BASE_DIR, "data", "vietnam_provinces_latlon.csv")
+
+FERTILIZERS = ["NPK", "hữu cơ", "vô cơ", "phân chuồng", "NPK, hữu cơ", "không", ""]
+
+SEASON_COLUMNS = ["farmer_name", "province", "crop", "area", "sow_date", "harvest_date",
+                  "fertilizer", "notes", "created_at", "user", "actual_yield"]
+
+# Lúa chiếm tỷ lệ lớn nhất, các cây còn lại chia đều
+DEFAULT_CROP_WEIGHTS = {crop: (4.0 if crop == "lúa" else 1.0) for crop in BASE_YIELDS}
+
+CHUNK_SIZE = 100_000
+FIRESTORE_BATCH_SIZE = 500
+TARGETS = ("firestore", "emulator", "sqlite", "parquet", "csv")
+
+
+# =========================================================
+#               SINH DỮ LIỆU
+# =========================================================
+
+def load_provinces():
+    return pd.read_csv(PROVINCES_FILE)["Province"].tolist()
+
+
+def parse_weights(text):
+    """ "lúa=4, ngô=2" -> {"lúa": 4.0, "ngô": 2.0} """
+    weights = {}
+    for part in (text or "").split(","):
+        if not part.strip():
+            continue
+        name, _, value = part.partition("=")
+        weights[name.strip()] = float(value) if value.strip() else 1.0
+    return weights
+
+
+def _probabilities(names, weights, key=lambda name: name):
+    """Xác suất chọn từng phần tử; phần tử không có trong weights có trọng số 1"""
+    if not weights:
+        return None
+    lookup = {key(k): v for k, v in weights.items()}
+    p = np.array([lookup.get(key(name), 1.0) for name in names], dtype=float)
+    if (p < 0).any() or p.sum() <= 0:
+        raise ValueError("Trọng số phân bố phải không âm và có tổng > 0")
+    return p / p.sum()
+
+
+def generate_seasons(n, seed=42, users=50, with_yield=True, crop_weights=None, province_weights=None, start=0):
+    """
+    Sinh n mùa vụ dưới dạng DataFrame (cột giống dữ liệu thật trong seasons.csv / Firestore).
+    start: số thứ tự mùa vụ đầu tiên (đánh số farmer_name/user khi sinh theo chunk).
+    """
+    rng = np.random.default_rng(seed)
+    provinces = np.array(load_provinces())
+    crops = np.array(list(BASE_YIELDS))
+    crop_p = _probabilities(crops, DEFAULT_CROP_WEIGHTS if crop_weights is None else crop_weights,
+                            key=lambda name: name.strip().lower())
+    province_p = _probabilities(provinces, province_weights, key=canonical_province)
+
+    crop = crops[rng.choice(len(crops), size=n, p=crop_p)]
+    if province_p is None:
+        province = provinces[rng.integers(0, len(provinces), size=n)]
+    else:
+        province = provinces[rng.choice(len(provinces), size=n, p=province_p)]
+    area = np.round(rng.uniform(0.5, 5.0, size=n), 1)
+
+    base_day = np.datetime64("2015-01-01")
+    sow = base_day + rng.integers(0, 365 * 10, size=n).astype("timedelta64[D]")
+    harvest = sow + rng.integers(60, 181, size=n).astype("timedelta64[D]")
+    created = harvest + rng.integers(0, 30, size=n).astype("timedelta64[D]")
+
+    base = pd.Series(crop).map(BASE_YIELDS).to_numpy()
+    actual_yield = np.round(base * area * rng.uniform(0.7, 1.3, size=n), 2)
+
+    ids = np.arange(start, start + n)
+    df = pd.DataFrame({
+        "farmer_name": np.char.add("Nông dân ", (ids + 1).astype(str)),
+        "province": province,
+        "crop": crop,
+        "area": area,
+        "sow_date": np.datetime_as_string(sow, unit="D"),
+        "harvest_date": np.datetime_as_string(harvest, unit="D"),
+        "fertilizer": np.array(FERTILIZERS)[rng.integers(0, len(FERTILIZERS), size=n)],
+        "notes": "",
+        "created_at": np.char.add(np.datetime_as_string(created, unit="D"), "T08:00:00"),
+        "user": np.char.add(np.char.add("user", (ids % max(users, 1)).astype(str)), "@example.com"),
+        "actual_yield": actual_yield if with_yield else np.nan,
+    })
+    return df[SEASON_COLUMNS]
+
+
+def iter_season_chunks(n, seed=42, chunk_size=CHUNK_SIZE, workers=1, **options):
+    """
+    Sinh n mùa vụ theo từng chunk DataFrame (đúng thứ tự). Chunk i dùng seed (seed, i)
+    nên kết quả tái lập được; workers > 1 -> sinh trước vài chunk trên thread pool.
+    """
+    specs = [(i, start, min(chunk_size, n - start)) for i, start in enumerate(range(0, n, chunk_size))]
+
+    def make(spec):
+        i, start, size = spec
+        return generate_seasons(size, seed=[seed, i], start=start, **options)
+
+    if workers <= 1:
+        yield from map(make, specs)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        yield from _bounded(pool, make, specs, workers)
+
+
+def _records(chunk):
+    records = chunk.to_dict(orient="records")
+    if chunk["actual_yield"].isna().any():
+        for record in records:
+            if pd.isna(record["actual_yield"]):
+                del record["actual_yield"]
+    return records
+
+
+# =========================================================
+#               GHI DỮ LIỆU
+# =========================================================
+
+def _bounded(pool, fn, items, window):
+    """Như pool.map nhưng chỉ giữ tối đa `window` tác vụ đang chờ (bộ nhớ không tăng theo số chunk)"""
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def firestore_client(emulator=None, project="demo-agriconnect"):
+    if emulator:
+        os.environ["FIRESTORE_EMULATOR_HOST"] = emulator
+        from google.auth.credentials import AnonymousCredentials
+        from google.cloud import firestore as gcf
+        return gcf.Client(project=project, credentials=AnonymousCredentials())
+    from firebase_init import init_firebase
+    return init_firebase()
+
+
+def write_firestore(db, chunks, workers=8, batch_size=FIRESTORE_BATCH_SIZE):
+    """Ghi song song: mỗi batch 500 document là một tác vụ commit trên thread pool"""
+    collection = db.collection("seasons")
+
+    def commit(records):
+        batch = db.batch()
+        for record in records:
+            batch.set(collection.document(), record)
+        batch.commit()
+        return len(records)
+
+    def batches():
+        for chunk in chunks:
+            records = _records(chunk)
+            for start in range(0, len(records), batch_size):
+                yield records[start:start + batch_size]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return sum(_bounded(pool, commit, batches(), workers * 4))
+
+
+def write_sqlite(path, chunks):
+    """Một transaction cho mỗi chunk (SQLite chỉ có một luồng ghi; chunk sau được sinh song song)"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS seasons (id INTEGER PRIMARY KEY, farmer_name TEXT, province TEXT, "
+                 "crop TEXT, area REAL, sow_date TEXT, harvest_date TEXT, fertilizer TEXT, notes TEXT, "
+                 "created_at TEXT, user TEXT, actual_yield REAL)")
+    placeholders = ", ".join("?" * len(SEASON_COLUMNS))
+    sql = f"INSERT INTO seasons ({', '.join(SEASON_COLUMNS)}) VALUES ({placeholders})"
+    written = 0
+    try:
+        for chunk in chunks:
+            rows = chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None)
+            with conn:
+                conn.executemany(sql, rows)
+            written += len(chunk)
+        conn.execute("CREATE INDEX IF NOT EXISTS seasons_user ON seasons (user)")
+        conn.execute("CREATE INDEX IF NOT EXISTS seasons_created_at ON seasons (created_at)")
+    finally:
+        conn.close()
+    return written
+
+
+def write_parquet(directory, chunks, workers=4):
+    """Mỗi chunk một file part-XXXXX.parquet, ghi song song"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise RuntimeError("Ghi Parquet cần pyarrow (pip install pyarrow)")
+    os.makedirs(directory, exist_ok=True)
+
+    def write(item):
+        i, chunk = item
+        chunk.to_parquet(os.path.join(directory, f"part-{i:05d}.parquet"), index=False)
+        return len(chunk)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return sum(_bounded(pool, write, enumerate(chunks), workers * 2))
+
+
+def write_csv(path, chunks):
+    """
+    Ghi vào file CSV (định dạng data/seasons.csv của chế độ offline), nối tiếp nếu file đã có.
+    Nối tiếp thì theo thứ tự cột trong tiêu đề của file (vd. file do season_import.py ghi có thứ tự khác
+    SEASON_COLUMNS); cột file không có thì bị bỏ (kèm cảnh báo), cột file có mà dữ liệu seed không có để trống.
+    """
+    header = not os.path.exists(path) or os.path.getsize(path) == 0
+    columns = None if header else pd.read_csv(path, nrows=0, encoding="utf-8-sig").columns.tolist()
+    written = 0
+    for chunk in chunks:
+        if columns is not None:
+            dropped = [c for c in chunk.columns if c not in columns]
+            if dropped and not written:
+                print(f"⚠️ {path} không có cột {dropped} - bỏ các cột này khi nối tiếp")
+            chunk = chunk.reindex(columns=columns)
+        chunk.to_csv(path, mode="a", header=header, index=False, encoding="utf-8-sig" if header else "utf-8")
+        header = False
+        written += len(chunk)
+    return written
+
+
+# =========================================================
+#               SEED TÀI KHOẢN
+# =========================================================
 
 def seed_users():
+    from firebase_admin import auth
     print("Creating sample user...")
     try:
         # Check if user exists
@@ -31,48 +274,76 @@ def seed_users():
     except Exception as e:
         print(f"   ❌ Error creating user: {e}")
 
-def seed_seasons():
-    print("Seeding sample seasons...")
-    collection = db.collection("seasons")
-    
-    # Check if empty
-    docs = list(collection.limit(1).stream())
-    if len(docs) > 0:
-        print("   Database already has data. Skipping seed.")
-        return
 
-    crops = ["lúa", "ngô", "cà phê", "tiêu", "điều"]
-    provinces = ["Hà Nội", "Đắk Lắk", "Cần Thơ", "Sóc Trăng", "Đồng Nai"]
-    
-    samples = []
-    for i in range(10):
-        # Random dates in last 6 months
-        sow_date = datetime.datetime.now() - datetime.timedelta(days=random.randint(100, 180))
-        harvest_date = sow_date + datetime.timedelta(days=random.randint(90, 120))
-        
-        doc_data = {
-            "farmer_name": f"Nông dân {i+1}",
-            "province": random.choice(provinces),
-            "crop": random.choice(crops),
-            "area": round(random.uniform(0.5, 5.0), 1),
-            "sow_date": sow_date.strftime("%Y-%m-%d"),
-            "harvest_date": harvest_date.strftime("%Y-%m-%d"),
-            "fertilizer": "NPK, hữu cơ",
-            "created_at": datetime.datetime.now().isoformat(),
-            "user": "admin@example.com",
-            # Add some pre-calculated fields to look good
-            "actual_yield": round(random.uniform(2.0, 8.0), 2)
-        }
-        samples.append(doc_data)
-
-    count = 0
-    for data in samples:
-        collection.add(data)
-        count += 1
-    
-    print(f"   ✅ Added {count} sample seasons.")
+# =========================================================
+#               MAIN
+# =========================================================
 
-if __name__ == "__main__":
-    seed_users()
-    seed_seasons()
+def run(args):
+    options = {
+        "users": args.users,
+        "with_yield": not args.no_yield,
+        "crop_weights": parse_weights(args.crop_weights) or None,
+        "province_weights": parse_weights(args.province_weights) or None,
+    }
+    chunks = iter_season_chunks(args.seasons, seed=args.seed, chunk_size=args.chunk_size,
+                                workers=min(args.workers, 4), **options)
+
+    if args.target in ("firestore", "emulator"):
+        db = firestore_client(args.emulator if args.target == "emulator" else None, args.project)
+        print("✅ Connected to Firebase." if args.target == "firestore" else f"✅ Firestore Emulator: {args.emulator}")
+        if args.target == "firestore" and not args.no_admin:
+            seed_users()
+        if not args.force and list(db.collection("seasons").limit(1).stream()):
+            print("   Database already has data. Skipping seed (dùng --force để ghi thêm).")
+            return 0
+        return write_firestore(db, chunks, workers=args.workers)
+    if args.target == "sqlite":
+        return write_sqlite(args.out, chunks)
+    if args.target == "parquet":
+        return write_parquet(args.out, chunks, workers=args.workers)
+    return write_csv(args.out, chunks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sinh dữ liệu mùa vụ giả lập và ghi song song theo lô")
+    parser.add_argument("--seasons", type=int, default=10, help="Số mùa vụ cần sinh")
+    parser.add_argument("--users", type=int, default=50, help="Số người dùng (mùa vụ chia vòng tròn)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--crop-weights", help='Phân bố cây trồng, vd. "lúa=4,ngô=2" (mặc định lúa=4, còn lại 1)')
+    parser.add_argument("--province-weights", help='Phân bố tỉnh, vd. "AnGiang=3,Hà Nội=2" (mặc định đều)')
+    parser.add_argument("--no-yield", action="store_true", help="Không sinh actual_yield (để app tự tính)")
+    parser.add_argument("--target", choices=TARGETS, default="firestore")
+    parser.add_argument("--out", help="File/thư mục đích cho sqlite, parquet, csv")
+    parser.add_argument("--emulator", default=os.environ.get("FIRESTORE_EMULATOR_HOST"), help="HOST:PORT emulator")
+    parser.add_argument("--project", default="demo-agriconnect", help="Project id khi dùng emulator")
+    parser.add_argument("--workers", type=int, default=8, help="Số luồng ghi song song")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--force", action="store_true", help="Ghi cả khi Firestore đã có dữ liệu")
+    parser.add_argument("--no-admin", action="store_true", help="Không tạo tài khoản admin@example.com")
+    args = parser.parse_args(argv)
+
+    if args.target in ("sqlite", "parquet", "csv") and not args.out:
+        parser.error(f"--target {args.target} cần --out")
+    if args.target == "emulator" and not args.emulator:
+        parser.error("--target emulator cần --emulator HOST:PORT (hoặc biến FIRESTORE_EMULATOR_HOST)")
+
+    print(f"Seeding {args.seasons:,} seasons -> {args.target} ({args.out or args.emulator or 'Firebase'})...")
+    t0 = time.perf_counter()
+    try:
+        written = run(args)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    except Exception as e:
+        print(f"❌ Seed thất bại: {e}")
+        return 1
+    elapsed = time.perf_counter() - t0
+    rate = written / elapsed if elapsed > 0 else 0
+    print(f"   ✅ Added {written:,} seasons in {elapsed:.2f}s ({rate:,.0f} rows/s, {args.workers} workers)")
     print("🎉 Seeding complete!")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
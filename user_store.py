@@ -0,0 +1,236 @@
+# user_store.py
+# Kho người dùng cho chế độ offline (data/users.csv), thay cho pd.read_csv + lọc DataFrame mỗi lần đăng nhập:
+#   - chỉ mục trong bộ nhớ theo username (tra O(1)), chỉ đọc lại file khi file thay đổi (mtime/size)
+#   - đăng ký = nối thêm MỘT dòng vào cuối file (không ghi lại cả file)
+#   - mật khẩu lưu dạng hash có salt (werkzeug.security); file cũ còn cột password dạng chữ được dọn ngay
+#     khi app khởi động (compact_legacy); dòng chữ thêm vào sau đó được dọn ở lần đăng nhập thành công đầu tiên
+#   - file chỉ nối thêm: dòng sau cùng của một username là bản hiện hành
+#   - mọi thao tác ghi (kiểm tra trùng + nối dòng, dọn file) giữ lock của tiến trình và flock trên file
+#     users.csv.lock -> hai worker đăng ký cùng username không thể cùng thành công
+#
+# Dọn file (hash mọi mật khẩu chữ còn lại, bỏ dòng cũ bị thay thế):
+#   python user_store.py --compact
+import argparse
+import csv
+import hmac
+import io
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: chỉ khóa trong tiến trình
+    fcntl = None
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+USERS_CSV = os.path.join(BASE_DIR, "data", "users.csv")
+
+FIELDS = ["username", "password", "password_hash", "fullname", "role", "created_at"]
+
+
+class UserStore:
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._flock_held = False
+        self._users = {}
+        self._signature = None
+
+    # ----------------- ĐỌC -----------------
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except FileNotFoundError:
+            return None
+
+    def _refresh(self):
+        """Đọc lại file nếu mtime/size đã đổi (vd. worker khác vừa đăng ký người dùng)"""
+        signature = self._stat()
+        if signature == self._signature:
+            return
+        with self._lock:
+            signature = self._stat()
+            if signature == self._signature:
+                return
+            users = {}
+            if signature is not None:
+                with open(self.path, newline="", encoding="utf-8-sig") as f:
+                    for row in csv.DictReader(f):
+                        username = (row.get("username") or "").strip()
+                        if username:
+                            users[username] = row
+            self._users = users
+            self._signature = signature
+
+    def get(self, username):
+        self._refresh()
+        return self._users.get(username)
+
+    def __contains__(self, username):
+        return self.get(username) is not None
+
+    def __len__(self):
+        self._refresh()
+        return len(self._users)
+
+    def exists(self):
+        return self._stat() is not None
+
+    # ----------------- XÁC THỰC -----------------
+    def authenticate(self, username, password):
+        """Trả về bản ghi người dùng nếu đúng mật khẩu, ngược lại None"""
+        user = self.get(username)
+        if user is None:
+            return None
+        if user.get("password_hash"):
+            return user if check_password_hash(user["password_hash"], password) else None
+        legacy = user.get("password") or ""
+        if legacy and hmac.compare_digest(legacy.encode("utf-8"), password.encode("utf-8")):
+            # Dòng cũ lưu mật khẩu dạng chữ -> ghi lại file với hash, không để mật khẩu chữ nằm lại trên đĩa
+            self.compact_legacy()
+            return user
+        return None
+
+    # ----------------- GHI -----------------
+    @contextmanager
+    def _locked(self):
+        """Khóa ghi: lock trong tiến trình + flock (file .lock riêng vì _rewrite thay file bằng os.replace).
+        Gọi lồng nhau được (compact_legacy -> compact): chỉ lớp ngoài cùng lấy flock"""
+        with self._lock:
+            if fcntl is None or self._flock_held:
+                yield
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path + ".lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._flock_held = True
+                try:
+                    yield
+                finally:
+                    self._flock_held = False
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _ensure_header(self):
+        """Tạo file hoặc nâng cấp tiêu đề cũ (username,password,...) lên đủ FIELDS - chỉ xảy ra một lần"""
+        if not os.path.exists(self.path):
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "w", newline="", encoding="utf-8-sig") as f:
+                csv.writer(f).writerow(FIELDS)
+            return
+        with open(self.path, newline="", encoding="utf-8-sig") as f:
+            header = next(csv.reader(f), [])
+        if header != FIELDS:
+            self._rewrite(list(self._read_rows()))
+
+    def _read_rows(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                if (row.get("username") or "").strip():
+                    yield row
+
+    def _rewrite(self, rows):
+        directory = os.path.dirname(self.path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".csv.tmp")
+        try:
+            with os.fdopen(fd, "w", newline="", encoding="utf-8-sig") as f:
+                writer = csv.DictWriter(f, fieldnames=FIELDS, extrasaction="ignore")
+                writer.writeheader()
+                for row in rows:
+                    writer.writerow({k: row.get(k) or "" for k in FIELDS})
+            os.replace(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _append(self, row):
+        """Nối một dòng; gọi khi đang giữ _locked()"""
+        self._ensure_header()
+        buffer = io.StringIO()
+        csv.DictWriter(buffer, fieldnames=FIELDS, extrasaction="ignore").writerow(
+            {k: row.get(k) or "" for k in FIELDS})
+        # Một lần write với O_APPEND: dòng không bị cắt ngang dù có tiến trình khác đọc cùng lúc
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        try:
+            os.write(fd, buffer.getvalue().encode("utf-8"))
+        finally:
+            os.close(fd)
+        self._signature = None  # lần đọc sau sẽ nạp lại (kể cả dòng của tiến trình khác)
+
+    def register(self, username, password, fullname="", role="user"):
+        """Thêm người dùng; trả về False nếu username đã tồn tại (kiểm tra và ghi trong cùng một khóa)"""
+        password_hash = generate_password_hash(password)  # chậm (có chủ ý) -> tính trước khi giữ khóa
+        with self._locked():
+            self._signature = None  # đọc lại file: worker khác có thể vừa đăng ký cùng username
+            if username in self:
+                return False
+            self._append({
+                "username": username,
+                "password_hash": password_hash,
+                "fullname": fullname,
+                "role": role,
+                "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            })
+        return True
+
+    def compact_legacy(self):
+        """Dọn file nếu còn dòng có mật khẩu dạng chữ; trả về số dòng như vậy (0 -> không ghi gì)"""
+        if not self.exists():
+            return 0
+        with self._locked():
+            legacy = sum(1 for row in self._read_rows() if row.get("password"))
+            if legacy:
+                self.compact()
+        return legacy
+
+    def compact(self):
+        """Ghi lại file: mỗi username một dòng, mọi mật khẩu dạng chữ được hash. Trả về số người dùng"""
+        with self._locked():
+            latest = {}
+            for row in self._read_rows():
+                latest[row["username"].strip()] = row
+            for row in latest.values():
+                if not row.get("password_hash") and row.get("password"):
+                    row["password_hash"] = generate_password_hash(row["password"])
+                row["password"] = ""
+            self._rewrite(latest.values())
+            self._signature = None
+        return len(latest)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_user_store(path=USERS_CSV):
+    """Một UserStore cho mỗi đường dẫn, dùng chung trong tiến trình"""
+    store = _stores.get(path)
+    if store is None:
+        with _stores_lock:
+            store = _stores.setdefault(path, UserStore(path))
+    return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quản lý file người dùng offline (users.csv)")
+    parser.add_argument("--csv", default=USERS_CSV)
+    parser.add_argument("--compact", action="store_true", help="Hash mật khẩu dạng chữ còn lại và bỏ dòng cũ")
+    args = parser.parse_args(argv)
+    store = get_user_store(args.csv)
+    if args.compact:
+        print(f"✅ Đã dọn {args.csv}: {store.compact()} người dùng, không còn mật khẩu dạng chữ.")
+    else:
+        print(f"{args.csv}: {len(store)} người dùng")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,206 @@
+import glob
+import os
+import threading
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from provinces import canonical_province
+
+# =========================================================
+#               CHỈ MỤC KHÍ HẬU (TỈNH, NĂM)
+# =========================================================
+# Đọc toàn bộ chuỗi NASA theo tỉnh (data/nasa_data/<Tỉnh>_2000-2023.csv) MỘT LẦN
+# lúc khởi động, tính sẵn giá trị trung bình nhiều năm (normal) và độ lệch (anomaly).
+# Trên đường xử lý request chỉ còn tra cứu trong bộ nhớ, không đọc file.
+
+NASA_DIR = os.path.join(os.path.dirname(__file__), "data", "nasa_data")
+# Dự báo các năm sau chuỗi NASA (model/forecast_weather.py sinh ra); không có file thì bỏ qua
+FORECAST_FILE = os.path.join(os.path.dirname(__file__), "data", "weather_all_vn_annual_2000-2030.csv")
+
+WEATHER_VARS = ("TempAvg", "RainfallAnnual", "HumidityAvg")
+
+WeatherFeatures = namedtuple("WeatherFeatures", [
+    "province", "year", "source",
+    "temp", "rain", "humidity",
+    "temp_normal", "rain_normal", "humidity_normal",
+    "temp_anomaly", "rain_anomaly", "humidity_anomaly",
+])
+
+
+def weather_factor(temp_anomaly, rain_anomaly, humidity_anomaly):
+    """
+    Hệ số thời tiết từ độ lệch so với khí hậu trung bình của tỉnh.
+    - temp_anomaly: độ lệch nhiệt độ (°C)
+    - rain_anomaly: độ lệch lượng mưa tương đối (0.2 = nhiều hơn 20%)
+    - humidity_anomaly: độ lệch độ ẩm (%)
+    Năm càng lệch khỏi bình thường thì năng suất càng giảm. Nhận cả số lẫn mảng NumPy.
+    """
+    factor = (1.0
+              - 0.04 * np.abs(temp_anomaly)
+              - 0.15 * np.minimum(np.abs(rain_anomaly), 1.0)
+              - 0.004 * np.abs(humidity_anomaly))
+    return np.clip(factor, 0.75, 1.0)
+
+
+class WeatherIndex:
+    """
+    Bảng tra (tỉnh, năm) -> đặc trưng khí hậu, dựng sẵn trong bộ nhớ.
+    - values:    mảng [số tỉnh, số năm, 3] (NaN nếu thiếu năm)
+    - normals:   mảng [số tỉnh, 3] trung bình nhiều năm
+    - anomalies: mảng [số tỉnh, số năm, 3]; lượng mưa tính theo tỷ lệ so với normal
+    Nếu có `forecast` (các năm sau chuỗi NASA), values kéo dài tới năm dự báo cuối cùng;
+    normal vẫn chỉ tính trên số liệu quan trắc. forecast_from = năm dự báo đầu tiên.
+    """
+
+    def __init__(self, frame, forecast=None):
+        frame = frame.dropna(subset=["Province", "Year"])
+        keys = sorted({canonical_province(p) for p in frame["Province"]})
+        self.provinces = keys
+        self._row = {k: i for i, k in enumerate(keys)}
+
+        years = frame["Year"].astype(int)
+        self.year_min = int(years.min()) if len(frame) else 0
+        self.year_max = int(years.max()) if len(frame) else -1
+        self.forecast_from = self.year_max + 1
+        if forecast is not None and len(frame):
+            forecast = forecast.dropna(subset=["Province", "Year"])
+            forecast = forecast[(forecast["Year"].astype(int) > self.year_max)
+                                & forecast["Province"].map(canonical_province).isin(self._row)]
+            if len(forecast):
+                self.year_max = int(forecast["Year"].max())
+        n_years = self.year_max - self.year_min + 1
+
+        values = np.full((len(keys), max(n_years, 0), len(WEATHER_VARS)), np.nan)
+        rows = np.array([self._row[canonical_province(p)] for p in frame["Province"]], dtype=np.intp)
+        cols = (years.to_numpy() - self.year_min).astype(np.intp)
+        values[rows, cols] = frame[list(WEATHER_VARS)].to_numpy(dtype=float)
+
+        with np.errstate(invalid="ignore"):
+            self.normals = np.nanmean(values, axis=1) if n_years > 0 else np.zeros((len(keys), 3))
+        if forecast is not None and len(forecast):
+            rows = np.array([self._row[canonical_province(p)] for p in forecast["Province"]], dtype=np.intp)
+            cols = (forecast["Year"].astype(int).to_numpy() - self.year_min).astype(np.intp)
+            values[rows, cols] = forecast[list(WEATHER_VARS)].to_numpy(dtype=float)
+        self.values = values
+        anomalies = values - self.normals[:, None, :]
+        rain_normal = self.normals[:, None, 1]
+        anomalies[:, :, 1] = np.where(rain_normal > 0, values[:, :, 1] / rain_normal - 1.0, 0.0)
+        self.anomalies = anomalies
+
+        # Bảng tra vô hướng dựng sẵn -> mỗi lần tra là một phép băm dict
+        self._features = {}
+        for key, i in self._row.items():
+            for offset in range(n_years):
+                if np.isnan(values[i, offset, 0]):
+                    continue
+                year = self.year_min + offset
+                source = "nasa" if year < self.forecast_from else "forecast"
+                self._features[(key, year)] = self._make(key, i, year, source, values[i, offset], anomalies[i, offset])
+
+    def _make(self, key, i, year, source, value, anomaly):
+        n = self.normals[i]
+        return WeatherFeatures(key, year, source,
+                               float(value[0]), float(value[1]), float(value[2]),
+                               float(n[0]), float(n[1]), float(n[2]),
+                               float(anomaly[0]), float(anomaly[1]), float(anomaly[2]))
+
+    def __len__(self):
+        return len(self._features)
+
+    def lookup(self, province, year):
+        """
+        Tra đặc trưng khí hậu cho một mùa vụ.
+        Năm ngoài dữ liệu NASA -> dùng khí hậu trung bình (anomaly = 0, source = "normal").
+        Tỉnh không có trong dữ liệu -> None.
+        """
+        key = province if province in self._row else canonical_province(province)
+        if key not in self._row:
+            return None
+        try:
+            year = int(year)
+        except (TypeError, ValueError):
+            year = None
+        features = self._features.get((key, year))
+        metrics.record_cache("weather_index", features is not None)
+        if features is not None:
+            return features
+        i = self._row[key]
+        return self._make(key, i, year, "normal", self.normals[i], np.zeros(3))
+
+    def rows(self, provinces):
+        """
+        Chỉ số dòng trong values/normals cho từng tỉnh (-1 nếu tỉnh không có chuỗi NASA).
+        Nhận tên tỉnh hoặc khóa chuẩn (Season.province_key: tra thẳng, không chuẩn hóa lại).
+        """
+        row = self._row
+        return np.fromiter((row[p] if p in row else row.get(canonical_province(p), -1) for p in provinces),
+                           dtype=np.intp, count=len(provinces))
+
+    def lookup_many(self, provinces, years):
+        """
+        Tra theo lô. Trả về dict các mảng NumPy cùng độ dài với đầu vào:
+        values [n, 3], normals [n, 3], anomalies [n, 3], found [n] (bool).
+        Dòng không tìm thấy tỉnh có anomaly = 0 để hệ số thời tiết bằng 1.
+        """
+        n = len(provinces)
+        rows = self.rows(provinces)
+        years = pd.to_numeric(pd.Series(years, dtype=object), errors="coerce").to_numpy(dtype=float)
+        offsets = np.where(np.isnan(years), -1, years - self.year_min).astype(np.intp)
+
+        found = rows >= 0
+        in_range = found & (offsets >= 0) & (offsets < self.values.shape[1])
+        safe_rows = np.where(found, rows, 0)
+        safe_offsets = np.where(in_range, offsets, 0)
+        hits = int(in_range.sum())
+        metrics.record_cache("weather_index", True, hits)
+        metrics.record_cache("weather_index", False, n - hits)
+
+        normals = np.where(found[:, None], self.normals[safe_rows] if len(self.provinces) else 0.0, np.nan)
+        values = np.where(in_range[:, None], self.values[safe_rows, safe_offsets], normals)
+        anomalies = np.where(in_range[:, None], self.anomalies[safe_rows, safe_offsets], 0.0)
+        # Năm có trong khoảng nhưng thiếu số liệu -> coi như năm bình thường
+        values = np.where(np.isnan(values), normals, values)
+        anomalies = np.nan_to_num(anomalies, nan=0.0)
+        return {"values": values, "normals": normals, "anomalies": anomalies, "found": found}
+
+    @classmethod
+    def from_directory(cls, directory=NASA_DIR, forecast_path=FORECAST_FILE):
+        """Đọc tất cả file <Tỉnh>_<năm đầu>-<năm cuối>.csv trong thư mục NASA (+ file dự báo nếu có)"""
+        frames = []
+        for path in sorted(glob.glob(os.path.join(directory, "*_*-*.csv"))):
+            try:
+                df = pd.read_csv(path, usecols=["Province", "Year", *WEATHER_VARS])
+                frames.append(df)
+            except Exception as e:
+                print(f"⚠️ Bỏ qua file thời tiết {os.path.basename(path)}: {e}")
+        if frames:
+            frame = pd.concat(frames, ignore_index=True)
+        else:
+            frame = pd.DataFrame(columns=["Province", "Year", *WEATHER_VARS])
+        forecast = None
+        if forecast_path and os.path.exists(forecast_path):
+            try:
+                forecast = pd.read_csv(forecast_path, usecols=["Province", "Year", "Source", *WEATHER_VARS])
+                forecast = forecast[forecast["Source"] == "forecast"]
+            except Exception as e:
+                print(f"⚠️ Bỏ qua file dự báo thời tiết {os.path.basename(forecast_path)}: {e}")
+                forecast = None
+        return cls(frame, forecast)
+
+
+# ----------------- SINGLETON -----------------
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_weather_index():
+    """Trả về chỉ mục dùng chung; chỉ dựng một lần cho cả tiến trình"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = WeatherIndex.from_directory()
+    return _index
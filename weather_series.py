@@ -0,0 +1,210 @@
+import math
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from compression import encode_array, parse_encoding
+from province_locator import get_province_locator
+from provinces import canonical_province
+from weather_index import WEATHER_VARS, get_weather_index
+
+# =========================================================
+#               CHUỖI THỜI TIẾT CHO BIỂU ĐỒ
+# =========================================================
+# Mỗi tỉnh (và chuỗi toàn quốc) giữ sẵn trong bộ nhớ hai mảng NumPy đã sắp theo năm:
+# years [n] và values [n, 3] (+ cờ năm dự báo). Truy vấn (tỉnh, khoảng năm, biến, gộp theo
+# nhóm năm) chỉ là np.searchsorted để cắt khoảng + np.add.reduceat để gộp -> không đọc file.
+
+NATIONAL_FILE = os.path.join(os.path.dirname(__file__), "data", "weather_all_vn_annual_2000-2023.csv")
+NATIONAL = ""
+
+# Tên biến trong API (giữ như /api/weather_chart_home) -> cột
+VARIABLES = {"temp": 0, "rain": 1, "humidity": 2}
+VARIABLE_ALIASES = {name.lower(): short for short, name in zip(VARIABLES, WEATHER_VARS)}
+
+MAX_BUCKET = 50
+
+
+class SeriesQueryError(ValueError):
+    """Tham số truy vấn biểu đồ không hợp lệ"""
+
+
+class Series:
+    __slots__ = ("name", "years", "values", "forecast")
+
+    def __init__(self, name, years, values, forecast=None):
+        order = np.argsort(years, kind="stable")
+        self.name = name
+        self.years = np.asarray(years, dtype=np.int32)[order]
+        self.values = np.asarray(values, dtype=float)[order]
+        self.forecast = (np.zeros(len(order), dtype=bool) if forecast is None
+                         else np.asarray(forecast, dtype=bool)[order])
+
+
+def parse_variables(text):
+    """"temp,rain" / "TempAvg" -> ["temp", "rain"]; rỗng -> cả 3 biến"""
+    if not text:
+        return list(VARIABLES)
+    names = []
+    for part in str(text).split(","):
+        part = part.strip().lower()
+        short = part if part in VARIABLES else VARIABLE_ALIASES.get(part)
+        if short is None:
+            raise SeriesQueryError(f"Biến không hợp lệ: {part} (dùng {', '.join(VARIABLES)})")
+        if short not in names:
+            names.append(short)
+    return names
+
+
+def _int_arg(value, name):
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise SeriesQueryError(f"{name} phải là số nguyên")
+
+
+class SeriesStore:
+
+    def __init__(self):
+        self._series = {}
+
+    def add(self, key, series):
+        self._series[key] = series
+
+    def __contains__(self, province):
+        return self._key(province) in self._series
+
+    def __len__(self):
+        return len(self._series)
+
+    @staticmethod
+    def _key(province):
+        return canonical_province(province) if province else NATIONAL
+
+    def query(self, province=None, year_from=None, year_to=None, variables=None, bucket=1, max_points=None,
+              last=None, encoding="json"):
+        """
+        Cắt chuỗi của một tỉnh (None/"" = toàn quốc) theo [year_from, year_to].
+        - bucket: gộp mỗi `bucket` năm thành một điểm (trung bình, bỏ qua NaN)
+        - max_points: tự chọn bucket nhỏ nhất để số điểm không vượt quá max_points
+        - last: chỉ lấy `last` năm cuối của khoảng (sau khi cắt)
+        - encoding: "json" (list số đã làm tròn) hoặc "f32" (base64 float32, xem compression.encode_array)
+        Trả về dict: province, years (năm đầu mỗi nhóm), year_to (năm cuối mỗi nhóm nếu bucket > 1),
+        forecast (nhóm có năm dự báo), và một mảng cho mỗi biến (NaN -> None).
+        """
+        series = self._series.get(self._key(province))
+        if series is None:
+            raise KeyError(province)
+        variables = list(VARIABLES) if variables is None else variables
+        bucket = int(bucket or 1)
+        if not 1 <= bucket <= MAX_BUCKET:
+            raise SeriesQueryError(f"bucket phải trong khoảng 1-{MAX_BUCKET}")
+
+        # Cắt khoảng năm bằng tìm kiếm nhị phân trên mảng năm đã sắp xếp
+        lo = 0 if year_from is None else int(np.searchsorted(series.years, year_from, side="left"))
+        hi = len(series.years) if year_to is None else int(np.searchsorted(series.years, year_to, side="right"))
+        if last is not None and last > 0:
+            lo = max(lo, hi - int(last))
+        years = series.years[lo:hi]
+        values = series.values[lo:hi][:, [VARIABLES[v] for v in variables]]
+        forecast = series.forecast[lo:hi]
+
+        if max_points and len(years) > max_points > 0:
+            span = int(years[-1]) - int(years[0]) + 1
+            bucket = max(bucket, math.ceil(span / max_points))
+
+        result = {"province": series.name, "bucket": bucket}
+        if bucket > 1 and len(years):
+            # Biên nhóm: năm đầu mỗi nhóm tính từ năm đầu khoảng -> vị trí bắt đầu nhóm trong mảng
+            groups = (years - years[0]) // bucket
+            starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+            valid = ~np.isnan(values)
+            sums = np.add.reduceat(np.where(valid, values, 0.0), starts, axis=0)
+            counts = np.add.reduceat(valid.astype(np.int64), starts, axis=0)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                values = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+            ends = np.r_[starts[1:], len(years)] - 1
+            result["year_to"] = years[ends].tolist()
+            forecast = np.logical_or.reduceat(forecast, starts)
+            years = years[starts]
+
+        result["years"] = years.tolist()
+        result["forecast"] = forecast.tolist()
+        for i, name in enumerate(variables):
+            result[name] = encode_array(values[:, i], encoding, precision=2)
+        return result
+
+    def query_args(self, args, default_last=None):
+        """Truy vấn từ tham số request: province, from, to, vars, bucket, max_points, last, encoding"""
+        try:
+            encoding = parse_encoding(args.get("encoding"))
+        except ValueError as e:
+            raise SeriesQueryError(str(e))
+        last = _int_arg(args.get("last"), "last")
+        year_from = _int_arg(args.get("from"), "from")
+        year_to = _int_arg(args.get("to"), "to")
+        if last is None and year_from is None and year_to is None:
+            last = default_last
+        return self.query(
+            province=(args.get("province") or "").strip() or None,
+            year_from=year_from,
+            year_to=year_to,
+            variables=parse_variables(args.get("vars")),
+            bucket=_int_arg(args.get("bucket"), "bucket") or 1,
+            max_points=_int_arg(args.get("max_points"), "max_points"),
+            last=last,
+            encoding=encoding,
+        )
+
+    @classmethod
+    def from_index(cls, index, national_path=NATIONAL_FILE, names=None):
+        """
+        Dựng từ chỉ mục NASA theo tỉnh (kể cả năm dự báo) + file toàn quốc không header
+        (Year, TempAvg, RainfallAnnual, HumidityAvg). Thiếu file toàn quốc -> trung bình các tỉnh.
+        """
+        store = cls()
+        names = names or {}
+        years = np.arange(index.year_min, index.year_max + 1)
+        forecast = years >= index.forecast_from
+        for row, key in enumerate(index.provinces):
+            observed = ~np.isnan(index.values[row]).all(axis=1)
+            store.add(key, Series(names.get(key, key), years[observed], index.values[row][observed],
+                                  forecast[observed]))
+
+        national = None
+        if national_path and os.path.exists(national_path):
+            try:
+                frame = pd.read_csv(national_path, header=None, names=["Year", *WEATHER_VARS]).dropna(subset=["Year"])
+                national = Series("Cả nước", frame["Year"].astype(int).to_numpy(),
+                                  frame[list(WEATHER_VARS)].to_numpy(dtype=float))
+            except Exception as e:
+                print(f"⚠️ Bỏ qua file thời tiết toàn quốc {os.path.basename(national_path)}: {e}")
+        if national is None and len(index.provinces):
+            with np.errstate(invalid="ignore"):
+                means = np.nanmean(index.values, axis=0)
+            observed = ~np.isnan(means).all(axis=1)
+            national = Series("Cả nước", years[observed], means[observed], forecast[observed])
+        if national is not None:
+            store.add(NATIONAL, national)
+        return store
+
+
+# ----------------- SINGLETON -----------------
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_series_store():
+    """Kho chuỗi dùng chung; dựng một lần từ chỉ mục khí hậu đã nạp"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                locator = get_province_locator()
+                names = {key: name for key, name in zip(locator.keys, locator.names)}
+                _store = SeriesStore.from_index(get_weather_index(), names=names)
+    return _store
@@ -0,0 +1,9 @@
+# wsgi.py
+# Điểm vào WSGI cho production nhiều tiến trình:
+#   gunicorn -c gunicorn.conf.py wsgi:app
+# Module được nạp MỘT lần ở master (preload_app): mô hình + chỉ mục thời tiết nằm sẵn trong bộ nhớ trước fork
+# và được các worker dùng chung (copy-on-write). Firestore chưa kết nối ở đây -> mỗi worker tự kết nối
+# trong hook post_fork.
+from app import create_app
+
+app = create_app(storage=False)
@@ -0,0 +1,311 @@
+import numpy as np
+import pandas as pd
+
+from season_model import as_season, season_columns
+from weather_index import get_weather_index, weather_factor
+
+# =========================================================
+#               THAM SỐ MÔ HÌNH NĂNG SUẤT
+# =========================================================
+
+# Base yield by crop type (tấn/ha)
+BASE_YIELDS = {
+    "lúa": 5.5,
+    "ngô": 4.8,
+    "hoa hướng dương": 2.5,
+    "cà phê": 2.2,
+    "cao su": 1.8,
+    "chè": 3.2,
+    "tiêu": 3.0,
+    "điều": 1.5,
+    "mía": 60.0,
+    "lạc": 2.2,
+    "đậu tương": 2.0
+}
+DEFAULT_BASE_YIELD = 4.0
+
+# Hệ số phân bón (so khớp theo thứ tự, chuỗi con)
+FERTILIZER_FACTORS = {
+    "hữu cơ": 1.2,
+    "vô cơ": 1.1,
+    "npk": 1.15,
+    "phân chuồng": 1.18,
+    "không": 0.8
+}
+
+# Hệ số vùng miền (theo khóa tỉnh chuẩn, xem provinces.canonical_province)
+REGION_FACTORS = {
+    "angiang": 1.3, "dongthap": 1.25, "longan": 1.2,
+    "hanoi": 1.1, "bacninh": 1.05, "hungyen": 1.05,
+    "daklak": 1.0, "daknong": 0.95, "gialai": 0.95,
+    "backan": 0.9, "caobang": 0.85, "hagiang": 0.85
+}
+
+DEFAULT_GROWTH_DAYS = 90
+
+# Giá bán (VND/kg) và chi phí (VND/ha) cho phân tích lợi nhuận
+CROP_PRICES = {
+    "lúa": 7000, "ngô": 6000, "cà phê": 45000, "cao su": 35000,
+    "chè": 25000, "tiêu": 80000, "điều": 30000, "mía": 1000,
+    "lạc": 20000, "đậu tương": 15000
+}
+DEFAULT_PRICE = 10000
+
+COST_PER_HA = {
+    "lúa": 15000000, "ngô": 18000000, "cà phê": 25000000,
+    "cao su": 15000000, "chè": 20000000, "default": 15000000
+}
+
+
+# =========================================================
+#               HỆ SỐ THÀNH PHẦN
+# =========================================================
+
+def _text(value):
+    """Chuỗi đã chuẩn hóa (ô trống đọc từ CSV là NaN -> chuỗi rỗng)"""
+    return value.strip().lower() if isinstance(value, str) else ""
+
+
+def growth_days_of(season):
+    """Số ngày sinh trưởng (giới hạn 60-180), mặc định 90 ngày"""
+    days = as_season(season).growth_days
+    return DEFAULT_GROWTH_DAYS if days is None else max(60, min(180, days))
+
+
+def growth_factor_of(growth_days):
+    """Hệ số thời gian sinh trưởng (nhận số hoặc mảng NumPy)"""
+    return np.select(
+        [growth_days < 80, growth_days < 100, growth_days < 120, growth_days < 150],
+        [0.7, 0.9, 1.0, 1.1],
+        default=1.2,
+    )
+
+
+def fertilizer_factor_of(fertilizer):
+    fertilizer = _text(fertilizer)
+    for fert_type, factor in FERTILIZER_FACTORS.items():
+        if fert_type in fertilizer:
+            return factor
+    return 1.0
+
+
+def region_factor_of(province_key):
+    """Hệ số vùng theo khóa tỉnh chuẩn (Season.province_key)"""
+    return REGION_FACTORS.get(province_key, 1.0)
+
+
+def season_year(season):
+    """Năm của mùa vụ: lấy theo ngày gieo, nếu thiếu thì theo ngày thu hoạch"""
+    return as_season(season).year
+
+
+def weather_contribution(season):
+    """
+    Đóng góp của thời tiết cho một mùa vụ (tra trong chỉ mục khí hậu đã nạp sẵn).
+    Trả về None nếu tỉnh không có dữ liệu NASA.
+    """
+    season = as_season(season)
+    features = get_weather_index().lookup(season.province_key, season.year)
+    if features is None:
+        return None
+    factor = float(weather_factor(features.temp_anomaly, features.rain_anomaly, features.humidity_anomaly))
+    return {
+        "features": features,
+        "factor": round(factor, 3),
+        "contribution_pct": round((factor - 1.0) * 100, 1),
+    }
+
+
+def _lookup(keys, fn):
+    """fn(khóa) cho mảng khóa (tên cây trồng, phân bón... lặp lại nhiều): mỗi giá trị khác nhau tính một lần"""
+    keys = pd.Series(keys, dtype=object)
+    uniques = keys.unique()
+    return keys.map(dict(zip(uniques, map(fn, uniques)))).to_numpy(dtype=float)
+
+
+# =========================================================
+#               TÍNH NĂNG SUẤT
+# =========================================================
+
+# ----------------- YIELD CALCULATION FUNCTION -----------------
+def calculate_yield(season_data):
+    """
+    Tính toán năng suất tự động dựa trên:
+    - Giống cây trồng (crop)
+    - Diện tích (area)
+    - Thời gian trồng (sow_date, harvest_date)
+    - Phân bón (fertilizer)
+    - Tỉnh thành (province) - hệ số vùng miền
+    - Thời tiết năm gieo trồng (độ lệch so với khí hậu trung bình của tỉnh, dữ liệu NASA)
+    """
+    try:
+        season = as_season(season_data)
+        if season.area is None:
+            print(f"Lỗi tính năng suất: thiếu diện tích ({season.id})")
+            return None
+
+        base_yield = BASE_YIELDS.get(season.crop_key, DEFAULT_BASE_YIELD)
+        growth_factor = float(growth_factor_of(growth_days_of(season)))
+        fertilizer_factor = fertilizer_factor_of(season.fertilizer)
+        region_factor = region_factor_of(season.province_key)
+
+        weather = weather_contribution(season)
+        weather_mult = weather["factor"] if weather else 1.0
+
+        # Tính năng suất cuối cùng (tấn/ha)
+        final_yield_per_ha = base_yield * growth_factor * fertilizer_factor * region_factor * weather_mult
+
+        # Áp dụng cho diện tích cụ thể (tổng sản lượng)
+        total_yield = final_yield_per_ha * season.area
+
+        return round(total_yield, 2)
+
+    except Exception as e:
+        print(f"Lỗi tính năng suất: {e}")
+        return None
+
+
+def calculate_yields(seasons):
+    """
+    Tính năng suất cho nhiều mùa vụ cùng lúc (kết quả giống calculate_yield từng dòng).
+    Nhận list Season / dict hoặc SeasonColumns (season_model); thời tiết được nối theo lô với chỉ mục khí hậu.
+    Trả về list (None nếu dòng thiếu diện tích).
+    """
+    columns = season_columns(seasons)
+    if len(columns) == 0:
+        return []
+
+    base = _lookup(columns.crop_key, lambda crop: BASE_YIELDS.get(crop, DEFAULT_BASE_YIELD))
+    growth_days = np.where(np.isnan(columns.growth_days), DEFAULT_GROWTH_DAYS,
+                           np.clip(columns.growth_days, 60, 180))
+    fertilizer = _lookup(columns.fertilizer, fertilizer_factor_of)
+    region = _lookup(columns.province_key, region_factor_of)
+
+    anomalies = get_weather_index().lookup_many(columns.province_key, columns.year)["anomalies"]
+    weather = weather_factor(anomalies[:, 0], anomalies[:, 1], anomalies[:, 2])
+
+    totals = base * growth_factor_of(growth_days) * fertilizer * region * np.round(weather, 3) * columns.area
+    return [None if np.isnan(t) else round(float(t), 2) for t in totals]
+
+
+# ----------------- DECISION SUPPORT FUNCTION -----------------
+def generate_decision_support(season_data, predicted_yield):
+    """
+    Tạo dữ liệu hỗ trợ ra quyết định với báo cáo, khuyến nghị và phân tích
+    """
+    try:
+        season = as_season(season_data)
+        crop = season.crop_key
+        area = season.area or 0.0
+        fertilizer = _text(season.fertilizer)
+
+        # Tính toán các chỉ số
+        yield_per_ha = predicted_yield / area if area > 0 else 0
+
+        # Phân loại năng suất
+        if yield_per_ha >= 6:
+            yield_category = "Rất cao"
+            yield_color = "text-green-600"
+            yield_bg = "bg-green-100"
+        elif yield_per_ha >= 4:
+            yield_category = "Cao"
+            yield_color = "text-green-500"
+            yield_bg = "bg-green-50"
+        elif yield_per_ha >= 2:
+            yield_category = "Trung bình"
+            yield_color = "text-yellow-600"
+            yield_bg = "bg-yellow-50"
+        else:
+            yield_category = "Thấp"
+            yield_color = "text-red-600"
+            yield_bg = "bg-red-50"
+
+        # Khuyến nghị theo loại cây trồng
+        crop_recommendations = {
+            "lúa": [
+                "🌾 Bón thúc đợt 1: 7-10 ngày sau sạ",
+                "💧 Duy trì mực nước 3-5cm trong giai đoạn đẻ nhánh",
+                "🛡️ Phòng trừ sâu bệnh: đạo ôn, rầy nâu",
+                "📅 Thu hoạch khi 85-90% hạt chín vàng"
+            ],
+            "ngô": [
+                "🌱 Bón lót phân chuồng + lân trước khi gieo",
+                "💦 Tưới đủ ẩm giai đoạn trỗ cờ phun râu",
+                "🪲 Phòng trừ sâu đục thân, bệnh khô vằn",
+                "🌽 Thu hoạch khi hạt cứng, râu chuyển nâu"
+            ],
+            "cà phê": [
+                "🌿 Tỉa cành tạo tán sau thu hoạch",
+                "💧 Tưới nước đầy đủ mùa khô",
+                "🍂 Bón phân NPK cân đối theo giai đoạn",
+                "☀️ Che bóng hợp lý tránh nắng gắt"
+            ]
+        }
+
+        # Khuyến nghị chung
+        general_recommendations = [
+            "📊 Theo dõi thời tiết thường xuyên để điều chỉnh lịch chăm sóc",
+            "🌱 Kiểm tra độ ẩm đất trước khi tưới nước",
+            "🔍 Thăm đồng thường xuyên để phát hiện sâu bệnh sớm",
+            "📝 Ghi chép nhật ký đồng ruộng để cải thiện vụ sau"
+        ]
+
+        # Cảnh báo dựa trên điều kiện
+        warnings = []
+        if not fertilizer or "không" in fertilizer.lower():
+            warnings.append("⚠️ Chưa sử dụng phân bón - có thể ảnh hưởng năng suất")
+
+        # Đóng góp của thời tiết (từ chỉ mục khí hậu NASA)
+        weather = weather_contribution(season)
+        if weather:
+            features = weather["features"]
+            if features.temp_anomaly >= 1.0:
+                warnings.append(f"🌡️ Nhiệt độ năm {features.year} cao hơn trung bình {features.temp_anomaly:.1f}°C")
+            elif features.temp_anomaly <= -1.0:
+                warnings.append(f"🌡️ Nhiệt độ năm {features.year} thấp hơn trung bình {-features.temp_anomaly:.1f}°C")
+            if features.rain_anomaly <= -0.2:
+                warnings.append(f"🌵 Lượng mưa năm {features.year} thấp hơn trung bình {-features.rain_anomaly * 100:.0f}% - chú ý tưới nước")
+            elif features.rain_anomaly >= 0.2:
+                warnings.append(f"🌧️ Lượng mưa năm {features.year} cao hơn trung bình {features.rain_anomaly * 100:.0f}% - chú ý thoát nước")
+
+        # Phân tích lợi nhuận ước tính
+        price_per_kg = CROP_PRICES.get(crop, DEFAULT_PRICE)
+        estimated_revenue = predicted_yield * 1000 * price_per_kg
+
+        # Chi phí ước tính (VND/ha)
+        cost = COST_PER_HA.get(crop, COST_PER_HA["default"]) * area
+        estimated_profit = estimated_revenue - cost
+
+        # Tạo dữ liệu biểu đồ (mẫu)
+        growth_stages = [
+            {"stage": "Gieo trồng", "progress": 100, "tasks": ["Làm đất", "Gieo hạt"]},
+            {"stage": "Phát triển", "progress": 65, "tasks": ["Bón thúc", "Tưới nước"]},
+            {"stage": "Ra hoa", "progress": 30, "tasks": ["Bón phân", "Phun thuốc"]},
+            {"stage": "Thu hoạch", "progress": 0, "tasks": ["Chuẩn bị thu", "Bảo quản"]}
+        ]
+
+        return {
+            "yield_per_ha": round(yield_per_ha, 2),
+            "yield_category": yield_category,
+            "yield_color": yield_color,
+            "yield_bg": yield_bg,
+            "crop_recommendations": crop_recommendations.get(crop, general_recommendations),
+            "general_recommendations": general_recommendations,
+            "warnings": warnings,
+            "estimated_revenue": f"{estimated_revenue:,.0f}",
+            "estimated_profit": f"{estimated_profit:,.0f}",
+            "cost": f"{cost:,.0f}",
+            "growth_stages": growth_stages,
+            "profit_margin": round((estimated_profit / estimated_revenue * 100) if estimated_revenue > 0 else 0, 1),
+            "price_per_kg": f"{price_per_kg:,.0f}",
+            "weather": {
+                **{k: round(v, 3) if isinstance(v, float) else v
+                   for k, v in weather["features"]._asdict().items()},
+                "factor": weather["factor"],
+                "contribution_pct": weather["contribution_pct"],
+            } if weather else None
+        }
+
+    except Exception as e:
+        print(f"Lỗi tạo hỗ trợ quyết định: {e}")
+        return None
@@ -0,0 +1,153 @@
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+from season_model import as_season, canonical_crop, province_key_of
+from weather_index import get_weather_index, weather_factor
+from yield_engine import (BASE_YIELDS, COST_PER_HA, CROP_PRICES, DEFAULT_BASE_YIELD, DEFAULT_PRICE,
+                          fertilizer_factor_of, growth_days_of, growth_factor_of, region_factor_of)
+
+# =========================================================
+#               RỦI RO NĂNG SUẤT (MONTE CARLO)
+# =========================================================
+# calculate_yield cho một con số; ở đây mô phỏng N kịch bản để có phân phối năng suất và lợi nhuận:
+#   - thời tiết: độ lệch (nhiệt độ, mưa, độ ẩm) lấy mẫu từ phân phối chuẩn nhiều chiều khớp trên
+#     chuỗi NASA quan trắc của tỉnh (giữ tương quan giữa 3 biến) -> weather_factor
+#   - sai số mô hình: nhiễu log-normal cho phần năng suất không giải thích bởi thời tiết
+#   - giá bán: nhiễu log-normal quanh CROP_PRICES
+# Ma trận mẫu [N, 2] (hệ số năng suất, giá) chỉ phụ thuộc (tỉnh, cây trồng) nên được tính một lần và
+# nhớ lại; mỗi mùa vụ chỉ còn nhân với phần xác định (giống, phân bón, thời gian, vùng, diện tích).
+
+N_SAMPLES = 10_000
+MODEL_CV = 0.08          # độ biến động năng suất ngoài thời tiết (sâu bệnh, canh tác...)
+PRICE_CV = 0.15          # độ biến động giá bán
+PERCENTILES = (5, 25, 50, 75, 95)
+HISTOGRAM_BINS = 20
+MAX_MATRICES = 512
+
+
+def _lognormal(rng, cv, size):
+    """Nhiễu nhân có trung bình 1 và hệ số biến thiên cv"""
+    sigma = np.sqrt(np.log1p(cv ** 2))
+    return rng.lognormal(-sigma ** 2 / 2, sigma, size)
+
+
+class RiskSimulator:
+
+    def __init__(self, index, n_samples=N_SAMPLES, max_matrices=MAX_MATRICES):
+        self.index = index
+        self.n_samples = int(n_samples)
+        self.max_matrices = int(max_matrices)
+        self._matrices = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _anomaly_samples(self, rng, province_key):
+        """Độ lệch thời tiết [N, 3] theo phân phối quan trắc của tỉnh; None nếu tỉnh không có dữ liệu"""
+        row = self.index.rows([province_key])[0]
+        if row < 0:
+            return None
+        observed = self.index.anomalies[row, :self.index.forecast_from - self.index.year_min]
+        observed = observed[~np.isnan(observed).any(axis=1)]
+        if len(observed) < 3:
+            return None
+        cov = np.cov(observed, rowvar=False)
+        return rng.multivariate_normal(observed.mean(axis=0), cov, size=self.n_samples, method="eigh")
+
+    def _build(self, province_key, crop):
+        rng = np.random.default_rng(zlib.crc32(f"{province_key}|{crop}".encode("utf-8")))
+        anomalies = self._anomaly_samples(rng, province_key)
+        if anomalies is None:
+            weather = np.ones(self.n_samples)
+        else:
+            weather = np.round(weather_factor(anomalies[:, 0], anomalies[:, 1], anomalies[:, 2]), 3)
+        matrix = np.column_stack([
+            weather * _lognormal(rng, MODEL_CV, self.n_samples),
+            CROP_PRICES.get(crop, DEFAULT_PRICE) * _lognormal(rng, PRICE_CV, self.n_samples),
+        ])
+        matrix.setflags(write=False)
+        return matrix
+
+    def sample_matrix(self, province, crop):
+        """Ma trận mẫu [N, 2] = (hệ số năng suất, giá VND/kg) dùng chung cho mọi mùa vụ cùng (tỉnh, cây trồng)"""
+        key = (province_key_of(province), canonical_crop(crop))
+        with self._lock:
+            matrix = self._matrices.get(key)
+            if matrix is not None:
+                self._matrices.move_to_end(key)
+        metrics.record_cache("risk_samples", matrix is not None)
+        if matrix is None:
+            matrix = self._build(*key)
+            with self._lock:
+                self._matrices[key] = matrix
+                while len(self._matrices) > self.max_matrices:
+                    self._matrices.popitem(last=False)
+        return matrix
+
+    def simulate(self, season_data):
+        """
+        Phân phối năng suất và lợi nhuận cho một mùa vụ.
+        Trả về dict: phân vị năng suất (tổng, tấn/ha), phân vị lợi nhuận, xác suất lỗ, histogram lợi nhuận.
+        """
+        season = as_season(season_data)
+        crop = season.crop_key
+        area = season.area
+        if area is None:
+            raise ValueError(f"Mùa vụ {season.id} thiếu diện tích")
+        deterministic = (BASE_YIELDS.get(crop, DEFAULT_BASE_YIELD)
+                         * float(growth_factor_of(growth_days_of(season)))
+                         * fertilizer_factor_of(season.fertilizer)
+                         * region_factor_of(season.province_key))
+
+        matrix = self.sample_matrix(season.province_key, crop)
+        yield_per_ha = deterministic * matrix[:, 0]
+        total_yield = yield_per_ha * area
+        cost = COST_PER_HA.get(crop, COST_PER_HA["default"]) * area
+        profit = total_yield * 1000 * matrix[:, 1] - cost
+
+        yield_q = np.percentile(total_yield, PERCENTILES)
+        per_ha_q = np.percentile(yield_per_ha, PERCENTILES)
+        profit_q = np.percentile(profit, PERCENTILES)
+        counts, edges = np.histogram(profit, bins=HISTOGRAM_BINS)
+        return {
+            "n_samples": len(matrix),
+            "percentiles": list(PERCENTILES),
+            "yield": {f"p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, yield_q)},
+            "yield_per_ha": {f"p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, per_ha_q)},
+            "profit": {f"p{p}": round(float(v)) for p, v in zip(PERCENTILES, profit_q)},
+            "expected_profit": round(float(profit.mean())),
+            "loss_probability": round(float((profit < 0).mean()), 4),
+            "profit_histogram": {
+                "edges": np.round(edges).tolist(),
+                "counts": counts.tolist(),
+            },
+        }
+
+    def clear(self):
+        with self._lock:
+            self._matrices.clear()
+
+
+# ----------------- SINGLETON -----------------
+_simulator = None
+_simulator_lock = threading.Lock()
+
+
+def get_risk_simulator():
+    global _simulator
+    if _simulator is None:
+        with _simulator_lock:
+            if _simulator is None:
+                _simulator = RiskSimulator(get_weather_index())
+    return _simulator
+
+
+def simulate_risk(season_data):
+    """Như RiskSimulator.simulate; trả về None nếu dữ liệu mùa vụ lỗi (giống calculate_yield)"""
+    try:
+        return get_risk_simulator().simulate(season_data)
+    except Exception as e:
+        print(f"Lỗi mô phỏng rủi ro: {e}")
+        return None